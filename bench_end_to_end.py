@@ -0,0 +1,101 @@
+import argparse
+import time
+
+from capture_pipeline import CapturePipeline
+from fake_camera import FakeCamera
+from fake_hololens import FakeHoloLens
+from gaze_server import GazeServer
+from image_encoding import PROFILES
+from instrumentation import METRICS
+from zmq_transport import TRANSPORT_PROFILES
+
+
+def bench(args: argparse.Namespace) -> None:
+    """
+    Runs the PC side end to end against simulated hardware: a FakeCamera
+    feeds a CapturePipeline, GazeServer publishes the frames and serves
+    gaze from FakeHoloLenses that connect through UDP discovery, subscribe
+    to the images and answer gaze requests with the configured link
+    behaviour. Reports the stage timings of the PC side and what every
+    fake HoloLens received.
+    """
+    hololenses = [
+        FakeHoloLens(latency=args.latency, jitter=args.jitter, loss=args.loss, sample_hz=args.sample_hz,
+                     host=f"127.0.0.{i + 1}", discover=True, subscribe=True, seed=args.seed + i)
+        for i in range(args.clients)
+    ]
+    # without the address cache, a benchmark must not leave loopback addresses in it
+    server = GazeServer(async_gaze=True, encoding=args.encoding, transport=args.transport, address_cache=None)
+    for hololens in hololenses:
+        hololens.start()
+    try:
+        server.setup_connection(timeout=10.0)
+    except TimeoutError:
+        print("[BENCH] no fake HoloLens connected, is the discovery port in use?")
+        for hololens in hololenses:
+            hololens.stop()
+        server.close()
+        return
+    deadline = time.time() + 10.0
+    while len(server.clients) < args.clients and time.time() < deadline:
+        time.sleep(0.05)
+    if len(server.clients) < args.clients:
+        print(f"[BENCH] only {len(server.clients)} of {args.clients} fake HoloLenses connected")
+
+    camera = FakeCamera(args.size, args.size, fps=args.fps, seed=args.seed)
+    camera.connect()
+    pipeline = CapturePipeline(camera, server)
+    pipeline.start()
+
+    consumed = 0
+    start = time.time()
+    while time.time() - start < args.duration:
+        try:
+            pipeline.latest()
+        except RuntimeError:
+            continue
+        consumed += 1
+    elapsed = time.time() - start
+
+    pipeline.stop()
+    camera.close()
+    for hololens in hololenses:
+        hololens.stop()
+    server.close()
+
+    print(f"[BENCH] {args.clients} HoloLens(es), {args.size}x{args.size} @ {args.fps:g} fps, "
+          f"encoding={args.encoding}, transport={args.transport}, latency={args.latency * 1000:.0f} ms, "
+          f"jitter={args.jitter * 1000:.0f} ms, loss={args.loss:.0%}")
+    print(f"[BENCH] captured {pipeline.frames_captured / elapsed:6.1f} fps | "
+          f"published {pipeline.frames_published / elapsed:6.1f} fps | consumed {consumed / elapsed:6.1f} fps")
+    for hololens in hololenses:
+        stats = hololens.stats()
+        print(f"[BENCH] {stats['host']:>11} | frames {stats['frames_received'] / elapsed:6.1f} fps | "
+              f"image age p50={stats['image_latency_p50_ms']:7.1f} ms p99={stats['image_latency_p99_ms']:7.1f} ms | "
+              f"gaze served {stats['requests_served']:6d} dropped {stats['requests_dropped']:5d}")
+    print(f"[BENCH] stage timings:\n{METRICS.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='End-to-end throughput and latency of the PC side with a fake camera and fake HoloLenses',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--duration', '-d', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--clients', '-c', type=int, default=1,
+                        help='Number of fake HoloLenses, on 127.0.0.1, 127.0.0.2, ... (Linux)')
+    parser.add_argument('--fps', type=float, default=30.0, help='Fake camera frame rate, 0 for unthrottled')
+    parser.add_argument('--size', type=int, default=512, help='Frame width and height')
+    parser.add_argument('--encoding', choices=list(PROFILES), default='default', help='Image encoding profile')
+    parser.add_argument('--transport', choices=list(TRANSPORT_PROFILES), default='latest', help='ZMQ socket profile')
+    parser.add_argument('--latency', '-l', type=float, default=0.005, help='Gaze reply delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.005, help='Additional random gaze reply delay in seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Probability that a gaze request is not answered')
+    parser.add_argument('--sample-hz', type=float, default=90.0, help='Simulated eye tracker rate')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the camera noise and the link simulation')
+    args = parser.parse_args()
+    bench(args)
+
+
+if __name__ == "__main__":
+    main()
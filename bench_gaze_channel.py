@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from fake_hololens import FakeHoloLens
+from gaze_server import GazeServer
+
+
+def bench(async_gaze: bool, latency: float, duration: float) -> None:
+    """
+    Calls zmq_get_gaze in a tight loop against a local FakeHoloLens and
+    reports the achieved call rate and how many distinct samples were seen.
+    """
+    hololens = FakeHoloLens(latency=latency)
+    hololens.start()
+
+    server = GazeServer(async_gaze=async_gaze)
+    server.hololens_address = "127.0.0.1"
+    server._init_gaze_socket()
+
+    server.zmq_get_gaze()  # wait for the channel to come up
+    calls: int = 0
+    timestamps = set()
+    call_times = []
+    start = time.time()
+    while time.time() - start < duration:
+        t0 = time.perf_counter()
+        gaze = server.zmq_get_gaze()
+        call_times.append(time.perf_counter() - t0)
+        timestamps.add(gaze['time'])
+        calls += 1
+    elapsed = time.time() - start
+
+    server._close_img()
+    hololens.stop()
+
+    call_times.sort()
+    mode = "async" if async_gaze else "lock-step"
+    print(f"[BENCH] {mode:>9} | latency={latency * 1000:.1f} ms | "
+          f"calls/s={calls / elapsed:10.1f} | fresh samples/s={len(timestamps) / elapsed:7.1f} | "
+          f"median call={call_times[len(call_times) // 2] * 1e6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark lock-step vs. async gaze retrieval on loopback',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--latency', '-l', type=float, nargs='+', default=[0.0, 0.005, 0.02],
+                        help='Simulated HoloLens reply delays in seconds')
+    parser.add_argument('--duration', '-d', type=float, default=3.0, help='Seconds per run')
+    args = parser.parse_args()
+
+    for latency in args.latency:
+        bench(False, latency, args.duration)
+        bench(True, latency, args.duration)
+
+
+if __name__ == "__main__":
+    main()
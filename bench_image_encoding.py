@@ -0,0 +1,34 @@
+import argparse
+import sys
+
+import cv2
+
+from image_encoding import PROFILES, ImageEncoder, measure_profile
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark encode time and frame size of the image encoding profiles',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--image', '-i', type=str, default='sehtest.jpg', help='Test image')
+    parser.add_argument('--size', type=int, default=512, help='Resize the test image to size x size (camera resolution)')
+    parser.add_argument('--repeats', '-r', type=int, default=100, help='Encodes per profile')
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"[ERROR] Image '{args.image}' could not be loaded.")
+        sys.exit(1)
+    image = cv2.resize(image, (args.size, args.size), interpolation=cv2.INTER_AREA)
+
+    print(f"[BENCH] {args.size}x{args.size} frame, {args.repeats} encodes per profile")
+    for name, profile in PROFILES.items():
+        result = measure_profile(profile, image, args.repeats)
+        backend = ImageEncoder(profile).backend
+        print(f"[BENCH] {name:>14} ({backend:>9}) | encode={result['encode_ms']:7.2f} ms | "
+              f"size={result['bytes'] / 1024:8.1f} KB/frame")
+
+
+if __name__ == "__main__":
+    main()
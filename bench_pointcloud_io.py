@@ -0,0 +1,71 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pointcloud_io import load_points, read_points_txt, save_points
+
+
+def synthetic_cloud(size: int) -> np.ndarray:
+    """
+    Points of a size x size depth image in millimetres: a tilted plane with
+    noise, and 10 % invalid (zero) points like a real stereo depth map.
+    """
+    rng = np.random.default_rng(0)
+    v, u = np.mgrid[0:size, 0:size].astype(np.float64)
+    z = 800.0 + 0.5 * u + 0.3 * v + rng.normal(0.0, 2.0, (size, size))
+    x = (u - size / 2) * z / 500.0
+    y = (v - size / 2) * z / 500.0
+    points = np.stack([x, y, z], axis=-1).reshape(-1, 3)
+    points[rng.random(len(points)) < 0.1] = 0.0
+    return points
+
+
+def time_load(load, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        points = load()
+        # touch every point, so memory-mapped reads are measured too
+        float(points[:, 2].sum())
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark load time and file size of the point-cloud storage formats',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--txt', type=str, default=None, help='Recorded .txt point cloud, default a synthetic one')
+    parser.add_argument('--size', type=int, default=512, help='Side of the synthetic depth image')
+    parser.add_argument('--repeats', '-r', type=int, default=5, help='Loads per format')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        txt_path = args.txt
+        if txt_path is None:
+            txt_path = os.path.join(directory, 'cloud.txt')
+            np.savetxt(txt_path, synthetic_cloud(args.size))
+        points = read_points_txt(txt_path)
+        print(f"[BENCH] {len(points)} points, {args.repeats} loads per format")
+
+        cases = [
+            ('txt loadtxt', txt_path, lambda: np.loadtxt(txt_path, dtype=np.float64)),
+            ('txt parsed', txt_path, lambda: read_points_txt(txt_path)),
+        ]
+        for dtype in ('float32', 'int16'):
+            for compress in (False, True):
+                path = save_points(os.path.join(directory, f'{dtype}_{int(compress)}'), points, dtype, compress)
+                name = f"{dtype} {'npz' if compress else 'npy'}"
+                cases.append((name, path, lambda path=path: load_points(path)))
+                if not compress:
+                    cases.append((name + ' mmap', path, lambda path=path: load_points(path, mmap=True, as_float=False)))
+
+        for name, path, load in cases:
+            load_ms = time_load(load, args.repeats)
+            print(f"[BENCH] {name:>18} | load={load_ms:9.2f} ms | size={os.path.getsize(path) / 2 ** 20:7.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from zmq_transport import TRANSPORT_PROFILES, ZmqTransport
+
+
+def bench(profile: str, port: int, frame_bytes: int, publish_hz: float, consume_ms: float, duration: float) -> None:
+    """
+    Publishes frames over loopback to a subscriber that needs consume_ms per
+    frame (a slow HoloLens) and reports how old the frames are when they
+    are consumed.
+    """
+    transport = ZmqTransport(profile)
+    pub = transport.socket(zmq.PUB)
+    pub.bind(f"tcp://127.0.0.1:{port}")
+    sub = transport.socket(zmq.SUB)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    sub.setsockopt(zmq.RCVTIMEO, 200)
+    sub.connect(f"tcp://127.0.0.1:{port}")
+    time.sleep(0.2)  # slow joiner
+
+    latencies = []
+    stop = threading.Event()
+
+    def consume() -> None:
+        while not stop.is_set():
+            try:
+                stamp, _ = sub.recv_multipart()
+            except zmq.Again:
+                continue
+            latencies.append(time.perf_counter() - float(stamp))
+            time.sleep(consume_ms / 1000.0)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+
+    payload = np.random.default_rng(0).integers(0, 255, frame_bytes, dtype=np.uint8).tobytes()
+    sent = 0
+    start = time.perf_counter()
+    next_frame = start
+    while time.perf_counter() - start < duration:
+        pub.send_multipart([repr(time.perf_counter()).encode(), payload], copy=False)
+        sent += 1
+        next_frame += 1.0 / publish_hz
+        time.sleep(max(0.0, next_frame - time.perf_counter()))
+    stop.set()
+    consumer.join()
+    transport.close()
+
+    ms = np.array(latencies) * 1000.0
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99]) if len(ms) else (np.nan,) * 3
+    print(f"[BENCH] {profile:>9} | delivered {len(ms):5d} / {sent:5d} | "
+          f"latency p50={p50:8.1f} ms p90={p90:8.1f} ms p99={p99:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Loopback end-to-end frame latency of the ZMQ transport profiles',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--port', type=int, default=5606, help='Loopback port')
+    parser.add_argument('--frame-kb', type=int, default=100, help='Frame size in KiB (a 512x512 JPEG is ~100)')
+    parser.add_argument('--publish-hz', type=float, default=30.0, help='Camera frame rate')
+    parser.add_argument('--consume-ms', type=float, default=50.0,
+                        help='Time the subscriber needs per frame, above 1000 / publish-hz it falls behind')
+    parser.add_argument('--duration', '-d', type=float, default=5.0, help='Seconds per profile')
+    args = parser.parse_args()
+
+    for profile in TRANSPORT_PROFILES:
+        bench(profile, args.port, args.frame_kb * 1024, args.publish_hz, args.consume_ms, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from gaze_alignment import GazeAligner
+from gaze_logging import get_logger
+from instrumentation import METRICS, Counter
+
+
+log = get_logger('GazeTrackerDevice')
+
+
+class DropOldestQueue(object):
+    """
+    Bounded FIFO that never blocks the producer: when full, the oldest item
+    is discarded to make room. Used between pipeline stages so a slow
+    consumer always works on the freshest data.
+    """
+
+    def __init__(self, maxsize: int = 2, drops: Optional[Counter] = None) -> None:
+        """
+        Args:
+            maxsize: number of queued items
+            drops: metrics counter incremented along with `dropped`
+        """
+        self._items: Deque[Any] = deque(maxlen=maxsize)
+        self._not_empty = threading.Condition()
+        self.dropped: int = 0
+        self._drops = drops
+
+    def put(self, item: Any) -> None:
+        with self._not_empty:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                if self._drops is not None:
+                    self._drops.inc()
+            self._items.append(item)
+            self._not_empty.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Returns the oldest queued item, or None if nothing arrived within timeout.
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: len(self._items) > 0, timeout):
+                return None
+            return self._items.popleft()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class CapturePipeline(object):
+    """
+    Runs camera capture and image encoding/publishing as independent threads.
+
+    The capture stage grabs a frame, pairs it with the newest gaze sample
+    (served from the GazeServer's background receiver) and hands the frame
+    to the publish stage through a DropOldestQueue. Consumers only read the
+    newest matched pair, so neither the encode nor the network hop is on
+    their critical path.
+
+    With an aligner, the gaze returned for a frame is not simply the newest
+    sample but the one interpolated at the frame's timestamp (after mapping
+    it onto the HoloLens clock).
+    """
+
+    def __init__(
+        self,
+        camera,
+        gaze_server,
+        publish_queue_size: int = 2,
+        aligner: Optional[GazeAligner] = None,
+        align_wait: float = 0.05,
+    ) -> None:
+        """
+        Args:
+            camera: connected camera device providing get_sensors() -> {'rgb', 'time'}
+            gaze_server: connected GazeServer
+            publish_queue_size: frames buffered for the publish stage before dropping
+            aligner: timestamp aligner, requires the GazeServer's async gaze receiver
+            align_wait: seconds latest() waits for a gaze sample newer than the frame
+        """
+        self.camera = camera
+        self.gaze_server = gaze_server
+        self.publish_queue = DropOldestQueue(
+            publish_queue_size, drops=METRICS.counter('publish_dropped', 'Frames replaced before the publish stage took them'))
+        METRICS.gauge('publish_queue_depth', lambda: len(self.publish_queue), 'Frames waiting for the publish stage')
+        self._grab_time = METRICS.histogram('camera_grab', 'Reading one frame from the camera')
+        self.aligner = aligner
+        self.align_wait = align_wait
+
+        self.frames_captured: int = 0
+        self.frames_published: int = 0
+        self.frames_unaligned: int = 0
+
+        self._gaze_total: int = 0
+        self._gaze_ring = None
+        self._gaze_lock = threading.Lock()
+
+        self._latest: Optional[Tuple[Dict[str, Any], Dict[str, Any]]] = None
+        self._latest_seq: int = 0
+        self._returned_seq: int = 0
+        self._latest_cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="CapturePipeline-capture", daemon=True),
+            threading.Thread(target=self._publish_loop, name="CapturePipeline-publish", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        log.info("Capture pipeline started.")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def latest(self, wait_for_new: bool = True, timeout: float = 1.0) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Returns the newest (camera_data, gaze) pair.
+
+        Args:
+            wait_for_new: wait until a pair newer than the last returned one is available
+            timeout: seconds to wait before raising
+        """
+        with self._latest_cond:
+            min_seq = self._returned_seq + 1 if wait_for_new else 1
+            if not self._latest_cond.wait_for(lambda: self._latest_seq >= min_seq, timeout):
+                raise RuntimeError("No new camera frame within timeout. Is the capture pipeline running?")
+            self._returned_seq = self._latest_seq
+            camera_data, gaze = self._latest
+        if self.aligner is not None:
+            gaze = self._aligned_gaze(float(camera_data['time']), gaze)
+        return camera_data, gaze
+
+    def _sync_gaze(self) -> None:
+        """
+        Moves gaze samples that arrived since the last call from the receiver's ring into the aligner.
+        """
+        with self._gaze_lock:
+            receiver = self.gaze_server.gaze_receiver
+            if receiver is None:
+                return
+            if receiver.ring is not self._gaze_ring:
+                # the primary HoloLens changed: its ring counts from zero and its clock differs
+                self._gaze_ring = receiver.ring
+                self._gaze_total = 0
+                self.aligner.reset()
+            samples, self._gaze_total = receiver.ring.since(self._gaze_total)
+            self.aligner.add_gaze(samples)
+
+    def _aligned_gaze(self, frame_time: float, fallback: Dict[str, Any]) -> Dict[str, Any]:
+        deadline = time.time() + self.align_wait
+        while True:
+            self._sync_gaze()
+            newest = self.aligner.newest_gaze_time()
+            if (newest is not None and newest >= frame_time) or time.time() >= deadline:
+                break
+            time.sleep(0.001)
+
+        aligned = self.aligner.lookup([frame_time])
+        if not aligned['valid'][0]:
+            self.frames_unaligned += 1
+            return fallback
+        return {'x': float(aligned['x'][0]), 'y': float(aligned['y'][0]), 'time': float(aligned['time'][0])}
+
+    def _capture_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                with self._grab_time.time():
+                    camera_data = self.camera.get_sensors()
+                if camera_data["rgb"] is None:
+                    time.sleep(0.001)
+                    continue
+                camera_data['time'] = str(camera_data['time'])
+                gaze = self.gaze_server.zmq_get_gaze()
+            except Exception as e:
+                log.error("Exception in capture stage: %s", e)
+                time.sleep(0.1)
+                continue
+
+            if self.aligner is not None:
+                self._sync_gaze()
+            self.publish_queue.put(camera_data)
+            with self._latest_cond:
+                self._latest = (camera_data, gaze)
+                self._latest_seq += 1
+                self._latest_cond.notify_all()
+            self.frames_captured += 1
+
+    def _publish_loop(self) -> None:
+        while not self._stop_event.is_set():
+            camera_data = self.publish_queue.get(timeout=0.1)
+            if camera_data is None:
+                continue
+            self.gaze_server.zmq_publish_image(camera_data['time'], camera_data['rgb'])
+            self.frames_published += 1
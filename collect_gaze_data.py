@@ -1,9 +1,10 @@
 import sys
 import threading
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Union
 
 import cv2
+import numpy as np
 from gaze_server import GazeServer
 
 PUBLISH_HZ: float = 1.0
@@ -35,7 +36,7 @@ def gaze_rec(server: GazeServer) -> None:
     """
     while True:
         try:
-            gaze_data: Dict[str, Any] = server.zmq_get_gaze()
+            gaze_data: Union[Dict[str, Any], np.void] = server.zmq_get_gaze()
             print(f"[PC] Gaze data received: {gaze_data}")
             time.sleep(1.0 / REC_HZ)
         except Exception as e:
@@ -0,0 +1,80 @@
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+class FakeCamera(object):
+    """
+    Synthetic camera with the interface GazeTrackerDevice and
+    CapturePipeline use (connect, get_sensors, close), for tests and
+    benchmarks without an OAK-D.
+
+    get_sensors() blocks until the next frame is due, like a camera waiting
+    for its next exposure, and returns {'rgb': frame, 'time': capture time}.
+    Frames are a moving colour gradient with noise, so they compress about
+    as well as camera images; a fixed set of them is generated on connect()
+    and cycled, so producing frames costs nothing during a benchmark.
+    """
+
+    def __init__(
+        self,
+        height: int = 512,
+        width: int = 512,
+        fps: float = 30.0,
+        variants: int = 30,
+        noise: int = 8,
+        seed: int = 0,
+        name: str = "fake_cam",
+    ) -> None:
+        """
+        Args:
+            height: frame height in pixels
+            width: frame width in pixels
+            fps: frame rate, 0 returns frames as fast as they are requested
+            variants: number of distinct frames cycled through
+            noise: amplitude of the per-pixel noise, 0 for smooth frames
+            seed: seed of the noise
+            name: camera name, like the DepthAI camera's
+        """
+        self.height = height
+        self.width = width
+        self.fps = fps
+        self.variants = variants
+        self.noise = noise
+        self.seed = seed
+        self.name = name
+        self.frames_served: int = 0
+        self._frames: List[np.ndarray] = []
+        self._next_frame: float = 0.0
+
+    def connect(self) -> bool:
+        rng = np.random.default_rng(self.seed)
+        y, x = np.mgrid[0:self.height, 0:self.width]
+        self._frames = []
+        for k in range(self.variants):
+            shift = k * 256 // max(1, self.variants)
+            frame = np.stack([(x + shift) % 256, (y + shift) % 256, (x + y) // 4 % 256], axis=-1)
+            if self.noise > 0:
+                frame = frame + rng.integers(-self.noise, self.noise + 1, frame.shape)
+            self._frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+        self._next_frame = time.time()
+        return True
+
+    def get_sensors(self) -> Dict[str, Any]:
+        if not self._frames:
+            return {'rgb': None, 'time': time.time()}
+        if self.fps > 0:
+            now = time.time()
+            if now < self._next_frame:
+                time.sleep(self._next_frame - now)
+            # a consumer that fell behind gets the current frame, not a backlog
+            self._next_frame = max(self._next_frame, time.time()) + 1.0 / self.fps
+        frame = self._frames[self.frames_served % len(self._frames)]
+        self.frames_served += 1
+        # consumers may draw into the frame
+        return {'rgb': frame.copy(), 'time': time.time()}
+
+    def close(self) -> bool:
+        self._frames = []
+        return True
@@ -0,0 +1,315 @@
+import argparse
+import heapq
+import json
+import math
+import random
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from gaze_server import GazeServer
+from gaze_wire import GAZE_WIRE_DTYPE, GAZE_WIRE_MAGIC, decode_request, encode_gaze
+from instrumentation import Histogram
+
+
+class FakeHoloLens(object):
+    """
+    Local stand-in for the HoloLens, so the PC side can be tested and
+    benchmarked without a headset.
+
+    Gaze: answers every request with a gaze sample like the headset does.
+    Requests that announce the binary format get a binary reply unless
+    json_only is set, which mimics a HoloLens build without binary support.
+    Like the eye tracker, samples are produced at a fixed rate independent
+    of the request rate; batch requests get every buffered sample since the
+    requested sequence number. Replies can be delayed (latency, jitter) and
+    dropped (loss). Delayed replies are queued, not slept on, so requests in
+    flight overlap like on a real link and keep their order.
+
+    The delay models a symmetric link: the reply carries the samples as of
+    half the delay after the request arrived, so the PC's clock offset
+    estimate (send + recv) / 2 sees no offset from the simulated latency.
+
+    Discovery and images: with discover, the PC is found through the UDP
+    discovery protocol (DISCOVER_PC / PC_HERE) and, with subscribe, the
+    image PUB of the answering PC is subscribed to and the age of every
+    received frame recorded.
+
+    Every 127.x.y.z address is loopback on Linux, so several fake HoloLenses
+    with different `host` addresses appear to the PC as separate headsets.
+    """
+
+    HISTORY_SIZE: int = 512
+    # seconds between discovery broadcasts until the PC answers
+    DISCOVERY_INTERVAL: float = 1.0
+
+    def __init__(
+        self,
+        port: int = GazeServer.ZMQ_GAZE_PORT,
+        latency: float = 0.0,
+        json_only: bool = False,
+        sample_hz: float = 90.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        host: str = "127.0.0.1",
+        discover: bool = False,
+        subscribe: bool = False,
+        pc_address: str = "127.0.0.1",
+        discovery_port: int = GazeServer.DISCOVERY_PORT,
+        image_port: int = GazeServer.ZMQ_IMG_PORT,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            port: TCP port of the gaze socket
+            latency: seconds to wait before answering each request (simulated RTT)
+            json_only: always answer with JSON
+            sample_hz: simulated eye tracker rate
+            jitter: additional random reply delay, uniform in 0..jitter seconds
+            loss: probability that a request is never answered
+            host: address the gaze and discovery sockets bind to, i.e. the IP the PC sees
+            discover: announce this HoloLens with discovery broadcasts until the PC answers
+            subscribe: subscribe to the PC's image PUB (the discovered PC, or pc_address)
+            pc_address: where discovery messages are sent ('<broadcast>' like the headset)
+                and, without discover, the PC whose images are subscribed to
+            discovery_port: UDP discovery port of the PC
+            image_port: image PUB port of the PC
+            seed: seed of the jitter and loss draws, for reproducible runs
+        """
+        self.port = port
+        self.latency = latency
+        self.json_only = json_only
+        self.sample_period: float = 1.0 / sample_hz
+        self.jitter = jitter
+        self.loss = loss
+        self.host = host
+        self.discover = discover
+        self.subscribe = subscribe
+        self.pc_address = pc_address
+        self.discovery_port = discovery_port
+        self.image_port = image_port
+        self._random = random.Random(seed)
+
+        self.requests_received: int = 0
+        self.requests_served: int = 0
+        self.requests_dropped: int = 0
+        self.frames_received: int = 0
+        self.bytes_received: int = 0
+        # age of the received frames: receive time minus the frame timestamp
+        self.image_latency = Histogram('image_latency')
+        # address of the PC once discovered
+        self.discovered_pc: Optional[str] = None
+        self.discovered = threading.Event()
+
+        self.seq: int = 0
+        self._history: Deque[tuple] = deque(maxlen=self.HISTORY_SIZE)
+        self._next_sample_time: float = 0.0
+        # (due, order, sample time, envelope, request) of replies waiting for their delay
+        self._replies: List[Tuple[float, int, float, List[bytes], bytes]] = []
+        self._last_due: float = 0.0
+        self._context: Optional[zmq.Context] = None
+        self._stop_event = threading.Event()
+        self._ready_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._ready_event.clear()
+        self._context = zmq.Context()
+        self._threads = [threading.Thread(target=self._run, name="FakeHoloLens", daemon=True)]
+        if self.discover or self.subscribe:
+            self._threads.append(threading.Thread(target=self._run_images, name="FakeHoloLens-images", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        self._ready_event.wait()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._context is not None:
+            self._context.term()
+            self._context = None
+
+    def stats(self) -> Dict[str, Any]:
+        latency = self.image_latency.read().to_dict()
+        return {
+            'host': self.host,
+            'requests_received': self.requests_received,
+            'requests_served': self.requests_served,
+            'requests_dropped': self.requests_dropped,
+            'frames_received': self.frames_received,
+            'bytes_received': self.bytes_received,
+            'image_latency_p50_ms': latency['p50_ms'],
+            'image_latency_p99_ms': latency['p99_ms'],
+        }
+
+    def _produce_samples(self) -> None:
+        """
+        Generates the samples the eye tracker would have produced up to now.
+        """
+        now = time.time()
+        if self._next_sample_time == 0.0:
+            self._next_sample_time = now
+        while self._next_sample_time <= now:
+            t = self._next_sample_time
+            self.seq += 1
+            # slow circular motion in normalized image coordinates
+            self._history.append((0.5 + 0.25 * math.cos(t), 0.5 + 0.25 * math.sin(t), t, 1, self.seq))
+            self._next_sample_time += self.sample_period
+
+    def _reply(self, request: bytes, sample_time: float) -> bytes:
+        """
+        Answers a request with the samples produced up to sample_time.
+        """
+        self._produce_samples()
+        history = [sample for sample in self._history if sample[2] <= sample_time] or [self._history[0]]
+        x, y, t, _, _ = history[-1]
+        if self.json_only or not request.startswith(GAZE_WIRE_MAGIC):
+            return json.dumps({'x': x, 'y': y, 'time': t}).encode('utf-8')
+        since_seq = decode_request(request)
+        if since_seq is None:
+            samples = [history[-1]]
+        else:
+            samples = [sample for sample in history if sample[4] > since_seq]
+        return encode_gaze(np.array(samples, dtype=GAZE_WIRE_DTYPE))
+
+    def _schedule(self, frames: List[bytes]) -> None:
+        self.requests_received += 1
+        if self.loss > 0 and self._random.random() < self.loss:
+            self.requests_dropped += 1
+            return
+        delay = self.latency + (self._random.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0)
+        arrival = time.time()
+        # at least one sample exists by the time the request is answered
+        self._produce_samples()
+        # one TCP stream: a reply never overtakes an earlier one
+        due = max(arrival + delay, self._last_due)
+        self._last_due = due
+        heapq.heappush(self._replies, (due, self.requests_received, arrival + 0.5 * delay, frames[:-1], frames[-1]))
+
+    def _run(self) -> None:
+        # ROUTER instead of REP: replies can be delayed or dropped without wedging the socket.
+        # Requests of REQ and DEALER clients arrive as [identity, b"", body].
+        router = self._context.socket(zmq.ROUTER)
+        router.setsockopt(zmq.LINGER, 0)
+        router.bind(f"tcp://{self.host}:{self.port}")
+        print(f"[FakeHL][ZMQ] Gaze socket bound on tcp://{self.host}:{self.port}")
+        self._ready_event.set()
+        try:
+            while not self._stop_event.is_set():
+                wait_ms = 100.0
+                if self._replies:
+                    wait_ms = min(wait_ms, max(0.0, (self._replies[0][0] - time.time()) * 1000.0))
+                if router.poll(wait_ms):
+                    while True:
+                        try:
+                            self._schedule(router.recv_multipart(zmq.NOBLOCK))
+                        except zmq.Again:
+                            break
+                now = time.time()
+                while self._replies and self._replies[0][0] <= now:
+                    _, _, sample_time, envelope, request = heapq.heappop(self._replies)
+                    router.send_multipart(envelope + [self._reply(request, sample_time)])
+                    self.requests_served += 1
+        finally:
+            router.close()
+
+    def _discover_pc(self) -> Optional[str]:
+        """
+        Broadcasts DISCOVER_PC until a PC_HERE arrives, returns the PC address.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind((self.host, 0))
+        sock.settimeout(0.1)
+        try:
+            next_ping = 0.0
+            while not self._stop_event.is_set():
+                if time.time() >= next_ping:
+                    sock.sendto(GazeServer.DISCOVERY_MESSAGE, (self.pc_address, self.discovery_port))
+                    next_ping = time.time() + self.DISCOVERY_INTERVAL
+                try:
+                    data, addr = sock.recvfrom(GazeServer.BUFFER_SIZE)
+                except socket.timeout:
+                    continue
+                if data == GazeServer.DISCOVERY_REPLY:
+                    print(f"[FakeHL][UDP] {self.host} discovered PC @ {addr[0]}")
+                    return addr[0]
+        finally:
+            sock.close()
+        return None
+
+    def _run_images(self) -> None:
+        pc_address = self.pc_address
+        if self.discover:
+            pc_address = self._discover_pc()
+            if pc_address is None:
+                return
+            self.discovered_pc = pc_address
+            self.discovered.set()
+        if not self.subscribe:
+            return
+
+        sub = self._context.socket(zmq.SUB)
+        sub.setsockopt(zmq.LINGER, 0)
+        sub.setsockopt(zmq.SUBSCRIBE, b"")
+        sub.connect(f"tcp://{pc_address}:{self.image_port}")
+        try:
+            while not self._stop_event.is_set():
+                if not sub.poll(100):
+                    continue
+                frames = sub.recv_multipart()
+                received = time.time()
+                self.frames_received += 1
+                self.bytes_received += len(frames[1])
+                try:
+                    # the camera timestamp is the capture time on the PC clock
+                    self.image_latency.record(max(0.0, received - float(frames[0])))
+                except ValueError:
+                    pass
+        finally:
+            sub.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fake HoloLens for loopback tests: discovery, image subscriber and gaze responder',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--port', '-p', type=int, default=GazeServer.ZMQ_GAZE_PORT, help='Gaze REP port')
+    parser.add_argument('--latency', '-l', type=float, default=0.0, help='Artificial reply delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Additional random reply delay up to this many seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Probability that a gaze request is not answered')
+    parser.add_argument('--json-only', action='store_true', help='Never answer with the binary gaze format')
+    parser.add_argument('--sample-hz', type=float, default=90.0, help='Simulated eye tracker rate')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address of this fake HoloLens, other 127.x.y.z addresses simulate further headsets')
+    parser.add_argument('--discover', action='store_true', help='Find the PC with discovery broadcasts')
+    parser.add_argument('--subscribe', action='store_true', help='Subscribe to the image stream of the PC')
+    parser.add_argument('--pc-address', type=str, default='127.0.0.1',
+                        help="Discovery destination ('<broadcast>' like the headset) and image source")
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the jitter and loss draws')
+    args = parser.parse_args()
+
+    hololens = FakeHoloLens(port=args.port, latency=args.latency, json_only=args.json_only,
+                            sample_hz=args.sample_hz, jitter=args.jitter, loss=args.loss, host=args.host,
+                            discover=args.discover, subscribe=args.subscribe, pc_address=args.pc_address,
+                            seed=args.seed)
+    hololens.start()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print(f"\n[FakeHL] {hololens.stats()}, shutting down.")
+    hololens.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator
+
+
+class FPSCounter:
+    """
+    Frame rate of a loop, plus the time spent in each named stage of it.
+
+    The frame rate is updated every `window` ticks. Stage times are averaged
+    over the last `window` measurements of each stage:
+
+        with fpsCounter.stage("convert"):
+            ...
+        fps = fpsCounter.tick()
+    """
+
+    def __init__(self, window: int = 10):
+        self.window = window
+        self.frameCount = 0
+        self.totalFrames = 0
+        self.fps = 0
+        self.startTime = time.time()
+        self._stages: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+
+    def tick(self):
+        self.frameCount += 1
+        self.totalFrames += 1
+        if self.frameCount % self.window == 0:
+            elapsedTime = time.time() - self.startTime
+            self.fps = self.frameCount / elapsedTime
+            self.frameCount = 0
+            self.startTime = time.time()
+        return self.fps
+
+    def add(self, stage: str, seconds: float) -> None:
+        self._stages[stage].append(seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timings(self) -> Dict[str, float]:
+        """
+        Returns the average time per stage in milliseconds, in the order the stages were first seen.
+        """
+        return {name: sum(times) / len(times) * 1000.0 for name, times in self._stages.items() if len(times) > 0}
+
+    def summary(self) -> str:
+        timings = self.timings()
+        stages = " | ".join(f"{name}={ms:.1f}ms" for name, ms in timings.items())
+        return f"{self.fps:.1f} fps | {stages} | total={sum(timings.values()):.1f}ms"
@@ -0,0 +1,64 @@
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector(object):
+    """
+    Cheap gate that decides whether a frame differs enough from the last
+    published one to be worth encoding and sending.
+
+    Frames are reduced to a small grayscale thumbnail (INTER_AREA averages
+    out sensor noise) and compared by mean absolute difference. A keyframe
+    is let through periodically even if nothing changed, so a HoloLens that
+    connects late or lost a frame still gets a current image.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 2.0,
+        keyframe_interval: float = 1.0,
+        thumbnail_size: Tuple[int, int] = (32, 32),
+    ) -> None:
+        """
+        Args:
+            threshold: minimum mean absolute thumbnail difference (0-255 scale) to publish a frame
+            keyframe_interval: seconds after which a frame is published regardless of change
+            thumbnail_size: (width, height) of the comparison thumbnail
+        """
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.thumbnail_size = thumbnail_size
+
+        self.frames_checked: int = 0
+        self.frames_skipped: int = 0
+
+        self._reference: Optional[np.ndarray] = None
+        self._last_publish: float = 0.0
+
+    def _thumbnail(self, image: np.ndarray) -> np.ndarray:
+        small = cv2.resize(image, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def should_publish(self, image: np.ndarray, now: Optional[float] = None) -> bool:
+        """
+        Returns True if the frame should be sent, and then takes it as the new reference.
+        """
+        now = time.time() if now is None else now
+        self.frames_checked += 1
+        thumbnail = self._thumbnail(image)
+        changed = (
+            self._reference is None
+            or now - self._last_publish >= self.keyframe_interval
+            or np.mean(np.abs(thumbnail - self._reference)) >= self.threshold
+        )
+        if not changed:
+            self.frames_skipped += 1
+            return False
+        self._reference = thumbnail
+        self._last_publish = now
+        return True
@@ -0,0 +1,100 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from recording import Trajectory
+
+
+def _load(trajectory: Trajectory, i: int) -> Tuple[np.ndarray, Dict[str, float]]:
+    return trajectory.read_image(i), trajectory.read_gaze(i)
+
+
+def iter_frames(
+    trajectory: Trajectory,
+    indices: Optional[Iterable[int]] = None,
+    skip_amount: int = 1,
+    prefetch: int = 8,
+    workers: int = 4,
+) -> Iterator[Tuple[int, np.ndarray, Dict[str, float]]]:
+    """
+    Yields (index, image, gaze) in order while the next `prefetch` frames are
+    read and decoded on a thread pool (cv2 decoding releases the GIL).
+
+    Args:
+        trajectory: trajectory to read
+        indices: frame indices to read, default every skip_amount-th frame
+        skip_amount: step between frames if indices is not given
+        prefetch: number of frames decoded ahead of the consumer
+        workers: decoder threads
+    """
+    if indices is None:
+        indices = range(0, len(trajectory), skip_amount)
+    remaining = iter(indices)
+    pending: Deque[Tuple[int, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in remaining:
+            pending.append((i, executor.submit(_load, trajectory, i)))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            i, future = pending.popleft()
+            next_i = next(remaining, None)
+            if next_i is not None:
+                pending.append((next_i, executor.submit(_load, trajectory, next_i)))
+            image, gaze = future.result()
+            yield i, image, gaze
+
+
+class PrefetchingFrameReader(object):
+    """
+    Random access to a trajectory for interactive viewers. Every get()
+    schedules the neighbouring frames in both directions on a thread pool,
+    so stepping forward or back is served from memory.
+    """
+
+    def __init__(self, trajectory: Trajectory, ahead: int = 8, behind: int = 2, workers: int = 4,
+                 cache_size: int = 64) -> None:
+        """
+        Args:
+            trajectory: trajectory to read
+            ahead: frames after the current one to prefetch
+            behind: frames before the current one to prefetch
+            workers: decoder threads
+            cache_size: decoded frames kept in memory
+        """
+        self.trajectory = trajectory
+        self.ahead = ahead
+        self.behind = behind
+        self.cache_size = max(cache_size, ahead + behind + 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._cache: "OrderedDict[int, Future]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.trajectory)
+
+    def _schedule(self, i: int) -> Future:
+        future = self._cache.get(i)
+        if future is None:
+            future = self._cache[i] = self._executor.submit(_load, self.trajectory, i)
+        self._cache.move_to_end(i)
+        return future
+
+    def get(self, i: int) -> Tuple[np.ndarray, Dict[str, float]]:
+        """
+        Returns (image, gaze) of frame i.
+        """
+        future = self._schedule(i)
+        for j in list(range(i + 1, min(i + 1 + self.ahead, len(self)))) + \
+                list(range(max(0, i - self.behind), i)):
+            self._schedule(j)
+        # the requested frame is the most recently used one
+        self._cache.move_to_end(i)
+        while len(self._cache) > self.cache_size:
+            _, evicted = self._cache.popitem(last=False)
+            evicted.cancel()
+        return future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
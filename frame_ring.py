@@ -0,0 +1,136 @@
+import queue
+from multiprocessing import Queue, resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing segment without taking ownership of it, so it
+    is only freed by the creating ring's close().
+
+    Before Python 3.13 attaching always registers the segment with the
+    resource tracker. Processes started by multiprocessing share the
+    parent's tracker, which keeps one entry per segment, so the second
+    registration is harmless and must stay: unregistering it would drop
+    the parent's entry too. A process with a tracker of its own would
+    unlink the segment and warn about a leak when it exits, there the
+    registration is undone.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        pass
+    own_tracker = resource_tracker._resource_tracker._fd is None
+    shm = shared_memory.SharedMemory(name=name)
+    if own_tracker:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedFrameRing(object):
+    """
+    Preallocated frame slots in shared memory, used to hand frames from the
+    capture process to the writer processes without pickling them.
+
+    The producer acquires a free slot, copies the frame into it and passes
+    only the slot index on. The consumer reads the frame in place and
+    releases the slot once it is on disk. Free slot indices travel through
+    a multiprocessing queue, so the number of slots also bounds the number
+    of frames in flight.
+
+    Child processes get a worker_handle() as Process argument, which works
+    with fork and spawn alike; only the ring that created the segment frees it.
+    """
+
+    def __init__(self, slots: int, frame_shape: Tuple[int, ...], dtype=np.uint8) -> None:
+        """
+        Args:
+            slots: number of frame slots
+            frame_shape: shape of every frame, e.g. (512, 512, 3)
+            dtype: frame dtype
+        """
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * frame_bytes)
+        self._owner: bool = True
+        self._free: Queue = Queue(maxsize=slots)
+        for slot in range(slots):
+            self._free.put(slot)
+        self._frames = self._map()
+
+    def _map(self) -> np.ndarray:
+        return np.ndarray((self.slots,) + self.frame_shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    def __getstate__(self) -> dict:
+        return {
+            'slots': self.slots,
+            'frame_shape': self.frame_shape,
+            'dtype': self.dtype,
+            'name': self._shm.name,
+            'free': self._free,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.slots = state['slots']
+        self.frame_shape = state['frame_shape']
+        self.dtype = state['dtype']
+        self._free = state['free']
+        self._shm = _attach(state['name'])
+        self._owner = False
+        self._frames = self._map()
+
+    def worker_handle(self) -> 'SharedFrameRing':
+        """
+        Returns a handle on the same slots for a child process. Closing it
+        only unmaps the segment. Forked children inherit the mapping, and
+        spawned ones attach to the segment when the handle is unpickled.
+        """
+        handle = SharedFrameRing.__new__(SharedFrameRing)
+        handle.slots = self.slots
+        handle.frame_shape = self.frame_shape
+        handle.dtype = self.dtype
+        handle._free = self._free
+        handle._shm = self._shm
+        handle._owner = False
+        handle._frames = self._frames
+        return handle
+
+    def fits(self, frame: np.ndarray) -> bool:
+        return frame.shape == self.frame_shape and frame.dtype == self.dtype
+
+    def put(self, frame: np.ndarray, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Copies the frame into a free slot and returns its index, or None if
+        no slot became free within timeout.
+        """
+        try:
+            slot = self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        np.copyto(self._frames[slot], frame)
+        return slot
+
+    def view(self, slot: int) -> np.ndarray:
+        """
+        Returns the frame in `slot` without copying. Only valid until release().
+        """
+        return self._frames[slot]
+
+    def release(self, slot: int) -> None:
+        self._free.put(slot)
+
+    def close(self) -> None:
+        """
+        Unmaps the segment; the creating process also frees it.
+        """
+        self._frames = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,216 @@
+import json
+import queue
+import time
+from multiprocessing import Process, Queue, Value
+from typing import Dict, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from frame_ring import SharedFrameRing
+from gaze_logging import get_logger
+from instrumentation import METRICS, ProcessShard
+from recording import IMAGE_EXTENSIONS, ChunkedRecordingWriter, finalize_recording
+
+
+log = get_logger('GazeTrackerDevice')
+
+
+def encode_params(codec: str, png_compression: int) -> List[int]:
+    if codec == '.png':
+        return [int(cv2.IMWRITE_PNG_COMPRESSION), png_compression]
+    return []
+
+
+class FrameWriterPool(object):
+    """
+    Pool of writer processes that encode and store recorded frames.
+
+    Frames are handed over through a bounded queue. When all workers are
+    busy and the queue is full, submit() waits up to put_timeout and then
+    drops the frame, so a slow disk degrades into counted drops instead of
+    stalling the capture loop indefinitely.
+
+    Items are tuples (img, img_path, frame_time, gaze, gaze_path, gaze_time, stream, stream_path),
+    where img_path is the trajectory directory for the 'chunked' format.
+
+    With a frame_shape, frames are copied into a SharedFrameRing and only
+    the slot index goes through the queue; frames of another shape fall
+    back to being pickled.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 64,
+        recording_format: str = 'png',
+        codec: str = '.png',
+        png_compression: int = 1,
+        put_timeout: float = 0.5,
+        frame_shape: Optional[Tuple[int, ...]] = None,
+    ) -> None:
+        """
+        Args:
+            workers: number of writer processes
+            queue_size: frames buffered before submit() applies backpressure
+            recording_format: 'png' (one image + JSON file per frame) or 'chunked'
+            codec: lossless image format, one of recording.IMAGE_EXTENSIONS
+            png_compression: PNG compression level 0-9, lower is faster and larger
+            put_timeout: seconds submit() waits for queue space before dropping the frame
+            frame_shape: shape of the recorded frames; enables the shared-memory handoff
+        """
+        if codec not in IMAGE_EXTENSIONS:
+            raise ValueError(f"Unsupported frame codec '{codec}', expected one of {IMAGE_EXTENSIONS}")
+        self.workers = workers
+        self.recording_format = recording_format
+        self.codec = codec
+        self.encode_params = encode_params(codec, png_compression)
+        self.put_timeout = put_timeout
+
+        self.queue: Queue = Queue(maxsize=queue_size)
+        # one slot per queued frame plus one being written by each worker
+        self.ring: Optional[SharedFrameRing] = None
+        if frame_shape is not None:
+            self.ring = SharedFrameRing(queue_size + workers, frame_shape)
+        self.written = Value('L', 0)
+        self.dropped: int = 0
+        self.max_queue_depth: int = 0
+        self._directories: Set[str] = set()
+        self._processes: List[Process] = []
+
+        # handing a frame to the workers (ring copy + queue put) and writing it, see instrumentation
+        self._submit_time = METRICS.histogram('writer_submit', 'Handing a frame to the writer processes')
+        self._drops = METRICS.counter('writer_dropped', 'Frames dropped because the writers fell behind')
+        self._write_shards = METRICS.histogram('disk_write', 'Encoding and writing one frame in a writer process') \
+            .add_process_shards(workers)
+        METRICS.gauge('writer_queue_depth', self.queue_depth, 'Frames queued for the writer processes')
+
+    def start(self) -> None:
+        # workers only unmap the ring, the segment is freed by stop()
+        ring = self.ring.worker_handle() if self.ring is not None else None
+        self._processes = [
+            Process(
+                target=self._work,
+                args=(worker_id, self.queue, ring, self.written, self.recording_format, self.codec,
+                      self.encode_params, self._write_shards[worker_id]),
+                daemon=True,
+            )
+            for worker_id in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+    def submit(self, item: tuple) -> bool:
+        """
+        Queues a frame for writing. Returns False if it had to be dropped.
+        """
+        start = time.perf_counter()
+        img = item[0]
+        if self.ring is not None and self.ring.fits(img):
+            slot = self.ring.put(img, timeout=self.put_timeout)
+            if slot is None:
+                self.dropped += 1
+                self._drops.inc()
+                return False
+            item = (slot,) + item[1:]
+        try:
+            self.queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            if not isinstance(item[0], np.ndarray):
+                self.ring.release(item[0])
+            self.dropped += 1
+            self._drops.inc()
+            return False
+        self._submit_time.record(time.perf_counter() - start)
+        if self.recording_format == 'chunked':
+            self._directories.add(item[1])
+        depth = self.queue_depth()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def queue_depth(self) -> int:
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:  # macOS
+            return -1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queue_depth': self.queue_depth(),
+            'max_queue_depth': self.max_queue_depth,
+            'written': self.written.value,
+            'dropped': self.dropped,
+        }
+
+    def stop(self) -> None:
+        """
+        Lets the workers write everything still queued, then stops them.
+        """
+        for _ in self._processes:
+            self.queue.put(None)
+        for process in self._processes:
+            process.join()
+            process.close()
+        self._processes = []
+        for directory in self._directories:
+            finalize_recording(directory)
+        self._directories = set()
+        self.queue.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        log.info("Frame writers stopped: %s", self.stats())
+
+    @staticmethod
+    def _work(
+        worker_id: int,
+        frame_queue: Queue,
+        ring: Optional[SharedFrameRing],
+        written,
+        recording_format: str,
+        codec: str,
+        params: List[int],
+        write_times=None,
+    ) -> None:
+        write_shard = ProcessShard(write_times) if write_times is not None else None
+        chunk_writers: Dict[str, ChunkedRecordingWriter] = {}
+        try:
+            while True:
+                item: Optional[tuple] = frame_queue.get()
+                if item is None:
+                    break
+                (img, img_path, frame_time, gaze, gaze_path, gaze_time, stream, stream_path) = item
+                start = time.perf_counter()
+                slot: Optional[int] = None
+                if not isinstance(img, np.ndarray):
+                    slot = img
+                    img = ring.view(slot)
+                try:
+                    if recording_format == 'chunked':
+                        chunk_writer = chunk_writers.get(img_path)
+                        if chunk_writer is None:
+                            chunk_writer = chunk_writers[img_path] = ChunkedRecordingWriter(
+                                img_path, codec=codec, encode_params=params, writer_id=worker_id)
+                        chunk_writer.append(img, frame_time, gaze, gaze_time)
+                    else:
+                        cv2.imwrite(img_path, img, params)
+                        with open(gaze_path, 'w') as handle:
+                            json.dump(gaze, handle)
+                finally:
+                    if slot is not None:
+                        img = None
+                        ring.release(slot)
+                if len(stream) > 0:
+                    # a single unbuffered O_APPEND write, so concurrent workers do not interleave records
+                    with open(stream_path, 'ab', buffering=0) as handle:
+                        handle.write(stream.tobytes())
+                if write_shard is not None:
+                    write_shard.record(time.perf_counter() - start)
+                with written.get_lock():
+                    written.value += 1
+        finally:
+            for chunk_writer in chunk_writers.values():
+                chunk_writer.close()
+            if ring is not None:
+                ring.close()
@@ -0,0 +1,210 @@
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class ClockOffsetEstimator(object):
+    """
+    NTP-style estimate of the HoloLens-to-PC clock offset from gaze request
+    round-trips. For every reply, offset = hololens_time - (send + recv) / 2
+    and the error of that estimate is bounded by half the round-trip time,
+    so only the round-trips with the smallest RTT in a sliding window are
+    trusted.
+    """
+
+    def __init__(self, window: int = 256, best_fraction: float = 0.25) -> None:
+        """
+        Args:
+            window: number of most recent round-trips considered
+            best_fraction: fraction of the window with the lowest RTT used for the estimate
+        """
+        self.window = window
+        self.best_fraction = best_fraction
+        self._offsets: np.ndarray = np.empty(window, dtype=np.float64)
+        self._rtts: np.ndarray = np.empty(window, dtype=np.float64)
+        self._count: int = 0
+
+    def add(self, hololens_time: np.ndarray, send_time: np.ndarray, recv_time: np.ndarray) -> None:
+        hololens_time = np.atleast_1d(np.asarray(hololens_time, dtype=np.float64))
+        send_time = np.atleast_1d(np.asarray(send_time, dtype=np.float64))
+        recv_time = np.atleast_1d(np.asarray(recv_time, dtype=np.float64))
+        offsets = hololens_time - 0.5 * (send_time + recv_time)
+        rtts = recv_time - send_time
+        if len(offsets) >= self.window:
+            self._offsets[:] = offsets[-self.window:]
+            self._rtts[:] = rtts[-self.window:]
+            self._count = self.window
+            return
+        # shift out the oldest entries, append the new ones at the end
+        n = len(offsets)
+        keep = min(self._count, self.window - n)
+        self._offsets[:keep] = self._offsets[self._count - keep:self._count]
+        self._rtts[:keep] = self._rtts[self._count - keep:self._count]
+        self._offsets[keep:keep + n] = offsets
+        self._rtts[keep:keep + n] = rtts
+        self._count = keep + n
+
+    def reset(self) -> None:
+        self._count = 0
+
+    @property
+    def offset(self) -> Optional[float]:
+        """
+        Estimated hololens_time - pc_time in seconds, or None without data.
+        """
+        if self._count == 0:
+            return None
+        k = max(1, int(self._count * self.best_fraction))
+        best = np.argpartition(self._rtts[:self._count], k - 1)[:k]
+        return float(np.median(self._offsets[best]))
+
+    @property
+    def min_rtt(self) -> Optional[float]:
+        if self._count == 0:
+            return None
+        return float(self._rtts[:self._count].min())
+
+
+class GazeAligner(object):
+    """
+    Assigns gaze to camera frames by timestamp.
+
+    Gaze samples are kept in sorted, array-backed buffers on the HoloLens
+    clock; frame timestamps (PC clock) are mapped onto that clock with the
+    estimated offset and looked up with np.searchsorted, so aligning a batch
+    of frames is a single vectorized pass.
+    """
+
+    def __init__(
+        self,
+        clock: Optional[ClockOffsetEstimator] = None,
+        capacity: int = 4096,
+        max_gap: float = 0.1,
+        method: str = 'linear',
+    ) -> None:
+        """
+        Args:
+            clock: offset estimator, a new one is created if None
+            capacity: number of gaze samples kept
+            max_gap: a frame is only labelled valid if a gaze sample lies within this many seconds
+            method: 'linear' to interpolate between neighbouring samples, 'nearest' to pick one
+        """
+        if method not in ('linear', 'nearest'):
+            raise ValueError(f"Unknown alignment method '{method}'")
+        self.clock = clock if clock is not None else ClockOffsetEstimator()
+        self.capacity = capacity
+        self.max_gap = max_gap
+        self.method = method
+
+        self._times: np.ndarray = np.empty(capacity, dtype=np.float64)
+        self._xy: np.ndarray = np.empty((capacity, 2), dtype=np.float64)
+        self._count: int = 0
+        self._lock = threading.Lock()
+
+    def add_gaze(self, samples: np.ndarray) -> None:
+        """
+        Adds gaze samples (structured array with x, y, time, send_time, recv_time fields).
+
+        All samples of a batch reply carry that reply's send/recv times, but
+        only its newest one was taken while the request was in flight; the
+        older ones would pass for fresh and bias the offset by up to the
+        batch span. So only the last sample of every reply feeds the clock.
+        """
+        if len(samples) == 0:
+            return
+        send_time, recv_time = samples['send_time'], samples['recv_time']
+        # a reply is copied into the ring in one piece, so its last sample ends a run of equal times
+        newest = np.ones(len(samples), dtype=bool)
+        newest[:-1] = (send_time[1:] != send_time[:-1]) | (recv_time[1:] != recv_time[:-1])
+        self.clock.add(samples['time'][newest], send_time[newest], recv_time[newest])
+        times = samples['time'].astype(np.float64)
+        xy = np.stack((samples['x'], samples['y']), axis=1).astype(np.float64)
+        with self._lock:
+            n = self._count
+            if n and times.min() < self._times[n - 1]:
+                # out of order arrival, merge and re-sort (rare)
+                times = np.concatenate((self._times[:n], times))
+                xy = np.concatenate((self._xy[:n], xy))
+                order = np.argsort(times, kind='stable')
+                times, xy = times[order], xy[order]
+                n = 0
+            elif not np.all(np.diff(times) >= 0):
+                order = np.argsort(times, kind='stable')
+                times, xy = times[order], xy[order]
+            self._count = self._store(self._times, self._xy, n, times, xy)
+
+    def reset(self) -> None:
+        """
+        Forgets all gaze samples and the clock offset, e.g.
+        when gaze starts coming from another HoloLens with its own clock.
+        """
+        with self._lock:
+            self._count = 0
+            self.clock.reset()
+
+    def lookup(self, frame_times: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Aligns gaze to the given frame timestamps (PC clock).
+
+        Returns:
+            dict of arrays 'x', 'y', 'time' (HoloLens clock of the aligned gaze) and 'valid'
+        """
+        frame_times = np.atleast_1d(np.asarray(frame_times, dtype=np.float64))
+        offset = self.clock.offset
+        with self._lock:
+            n = self._count
+            times = self._times[:n].copy()
+            xy = self._xy[:n].copy()
+        if n == 0 or offset is None:
+            nan = np.full(len(frame_times), np.nan)
+            return {'x': nan, 'y': nan.copy(), 'time': nan.copy(), 'valid': np.zeros(len(frame_times), dtype=bool)}
+
+        t = frame_times + offset
+        idx = np.searchsorted(times, t)
+        lo = np.clip(idx - 1, 0, n - 1)
+        hi = np.clip(idx, 0, n - 1)
+        gap_lo = np.abs(t - times[lo])
+        gap_hi = np.abs(times[hi] - t)
+        nearest = np.where(gap_lo <= gap_hi, lo, hi)
+        valid = np.minimum(gap_lo, gap_hi) <= self.max_gap
+
+        if self.method == 'nearest':
+            out_xy = xy[nearest]
+            out_t = times[nearest]
+        else:
+            span = times[hi] - times[lo]
+            bracketed = (idx > 0) & (idx < n) & (span > 0)
+            w = np.where(bracketed, (t - times[lo]) / np.where(span > 0, span, 1.0), 0.0)
+            out_xy = np.where(bracketed[:, None], xy[lo] * (1.0 - w)[:, None] + xy[hi] * w[:, None], xy[nearest])
+            out_t = np.where(bracketed, t, times[nearest])
+            # interpolating across a dropout would invent gaze that was never measured
+            valid &= ~bracketed | (span <= 2 * self.max_gap)
+
+        return {'x': out_xy[:, 0], 'y': out_xy[:, 1], 'time': out_t, 'valid': valid}
+
+    def newest_gaze_time(self) -> Optional[float]:
+        """
+        Timestamp of the newest buffered gaze sample, mapped to the PC clock.
+        """
+        offset = self.clock.offset
+        with self._lock:
+            if offset is None or self._count == 0:
+                return None
+            return float(self._times[self._count - 1] - offset)
+
+    def _store(self, buf_t: np.ndarray, buf_xy: np.ndarray, n: int, times: np.ndarray, xy: np.ndarray) -> int:
+        total = n + len(times)
+        if total > self.capacity:
+            # keep only the newest `capacity` samples
+            drop = total - self.capacity
+            if drop >= n:
+                times, xy = times[drop - n:], xy[drop - n:]
+                n = 0
+            else:
+                buf_t[:n - drop] = buf_t[drop:n]
+                buf_xy[:n - drop] = buf_xy[drop:n]
+                n -= drop
+        buf_t[n:n + len(times)] = times
+        buf_xy[n:n + len(times)] = xy
+        return n + len(times)
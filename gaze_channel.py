@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from gaze_wire import decode_gaze, encode_batch_request, is_binary_gaze
+from gaze_logging import get_logger
+from instrumentation import METRICS
+
+
+log = get_logger('PC.ZMQ')
+
+
+# One row per received gaze sample. 'time' is the HoloLens timestamp, the
+# send/recv times are taken on the PC clock around the request round-trip.
+# 'seq' is the HoloLens sample counter; JSON replies carry none, so the
+# receiver numbers them itself.
+GAZE_SAMPLE_DTYPE = np.dtype([
+    ('x', np.float64),
+    ('y', np.float64),
+    ('time', np.float64),
+    ('valid', np.uint8),
+    ('seq', np.uint32),
+    ('send_time', np.float64),
+    ('recv_time', np.float64),
+])
+WIRE_FIELDS = ('x', 'y', 'time', 'valid', 'seq')
+
+# full-rate gaze stream written next to recorded frames, raw GAZE_SAMPLE_DTYPE rows
+GAZE_STREAM_FILENAME: str = "gaze_stream.bin"
+
+
+def load_gaze_stream(path: str) -> np.ndarray:
+    """
+    Loads a recorded gaze stream, `path` being the file or its directory.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, GAZE_STREAM_FILENAME)
+    stream = np.fromfile(path, dtype=GAZE_SAMPLE_DTYPE)
+    # several writer processes append batches, restore arrival order
+    return stream[np.argsort(stream['recv_time'], kind='stable')]
+
+
+class GazeRing(object):
+    """
+    Fixed-capacity ring of the most recent gaze samples, backed by a
+    preallocated NumPy structured array. Safe to use from one writer thread
+    and any number of reader threads.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._buffer: np.ndarray = np.zeros(capacity, dtype=GAZE_SAMPLE_DTYPE)
+        self._capacity: int = capacity
+        self._written: int = 0
+        self._lock = threading.Lock()
+        self._new_sample = threading.Condition(self._lock)
+
+    def append(
+        self,
+        x: float,
+        y: float,
+        timestamp: float,
+        send_time: float,
+        recv_time: float,
+        valid: int = 1,
+        seq: int = 0,
+    ) -> None:
+        with self._lock:
+            self._buffer[self._written % self._capacity] = (x, y, timestamp, valid, seq, send_time, recv_time)
+            self._written += 1
+            self._new_sample.notify_all()
+
+    def extend(self, records: np.ndarray, send_time: float, recv_time: float) -> None:
+        """
+        Copies decoded wire records (see gaze_wire.GAZE_WIRE_DTYPE) straight
+        into the ring slots, field by field, without building Python objects.
+        All records get the send/recv times of the reply they came in; only
+        the last one was sampled during that round-trip (see GazeAligner.add_gaze).
+        """
+        records = records[-self._capacity:]
+        n = len(records)
+        if n == 0:
+            return
+        with self._lock:
+            idx = (self._written + np.arange(n)) % self._capacity
+            for name in WIRE_FIELDS:
+                self._buffer[name][idx] = records[name]
+            self._buffer['send_time'][idx] = send_time
+            self._buffer['recv_time'][idx] = recv_time
+            self._written += n
+            self._new_sample.notify_all()
+
+    def latest(self) -> Optional[np.void]:
+        """
+        Returns a copy of the newest sample, or None if nothing was received yet.
+        """
+        with self._lock:
+            if self._written == 0:
+                return None
+            return self._buffer[(self._written - 1) % self._capacity].copy()
+
+    def wait_for_sample(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until at least one sample is in the ring. Returns False on timeout.
+        """
+        with self._lock:
+            return self._new_sample.wait_for(lambda: self._written > 0, timeout)
+
+    def snapshot(self) -> np.ndarray:
+        """
+        Returns a copy of all buffered samples in arrival order (oldest first).
+        """
+        with self._lock:
+            if self._written <= self._capacity:
+                return self._buffer[:self._written].copy()
+            start = self._written % self._capacity
+            return np.concatenate((self._buffer[start:], self._buffer[:start]))
+
+    def since_seq(self, seq: int) -> np.ndarray:
+        """
+        Returns a copy of all buffered samples with a sequence number above `seq`.
+        """
+        samples = self.snapshot()
+        return samples[samples['seq'] > seq]
+
+    def since(self, total: int) -> Tuple[np.ndarray, int]:
+        """
+        Returns the samples appended after the ring had seen `total` samples
+        (as far as they are still buffered) and the new total to pass next time.
+        """
+        with self._lock:
+            first = max(total, self._written - self._capacity)
+            idx = np.arange(first, self._written) % self._capacity
+            return self._buffer[idx], self._written
+
+    @property
+    def total_received(self) -> int:
+        return self._written
+
+    def __len__(self) -> int:
+        return min(self._written, self._capacity)
+
+
+class GazeReceiver(object):
+    """
+    Background gaze channel towards the HoloLens REP socket.
+
+    A DEALER socket is used instead of REQ so several requests can be in
+    flight at once (the REP side answers them in order) and a lost reply does
+    not wedge the channel: stale requests are detected by timeout and the
+    socket is rebuilt. Replies are stored in a GazeRing, so callers only ever
+    read the newest sample and never wait on the network.
+    """
+
+    def __init__(
+        self,
+        context: zmq.Context,
+        address: str,
+        request_hz: Optional[float] = 60.0,
+        max_in_flight: int = 4,
+        reply_timeout: float = 1.0,
+        ring_capacity: int = 1024,
+        binary: bool = True,
+        socket_options: Optional[Dict[int, int]] = None,
+    ) -> None:
+        """
+        Args:
+            context: ZMQ context the DEALER socket is created in
+            address: endpoint of the HoloLens gaze REP socket, e.g. tcp://1.2.3.4:5007
+            request_hz: request rate; None keeps max_in_flight requests outstanding at all times
+            max_in_flight: maximum number of unanswered requests
+            reply_timeout: seconds after which the oldest unanswered request counts as lost
+            ring_capacity: number of samples kept in the ring
+            binary: ask for the binary gaze format (gaze_wire); JSON replies are still accepted.
+                Binary requests are batched: each asks for all samples since the newest seq
+                received, so the ring holds the full-rate stream rather than one sample per poll.
+            socket_options: extra {zmq option: value} for the DEALER socket, e.g. TCP keepalive
+                (see zmq_transport.TransportOptions.socket_options)
+        """
+        self.context = context
+        self.address = address
+        self.request_period: float = 0.0 if not request_hz else 1.0 / request_hz
+        self.max_in_flight = max_in_flight
+        self.reply_timeout = reply_timeout
+        self.ring = GazeRing(ring_capacity)
+        self.binary = binary
+        self.socket_options: Dict[int, int] = socket_options or {}
+        self.last_seq: int = 0
+        self._last_time: float = 0.0
+        # format of the last reply, 'binary' or 'json'; None before the first one
+        self.wire_format: Optional[str] = None
+
+        self.requests_sent: int = 0
+        self.replies_lost: int = 0
+        self.reconnects: int = 0
+        # time of the last reply, 0.0 before the first; serves as heartbeat of the HoloLens
+        self.last_reply: float = 0.0
+        # shared by all receivers of the process
+        self._rtt = METRICS.histogram('gaze_rtt', 'Round-trip time of a gaze request to the HoloLens')
+        self._lost = METRICS.counter('gaze_replies_lost', 'Gaze requests whose reply never arrived')
+
+        self._pending: Deque[float] = deque()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="GazeReceiver", daemon=True)
+        self._thread.start()
+        log.info("Gaze receiver connected to %s", self.address)
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def latest(self) -> Optional[np.void]:
+        """
+        Returns the newest gaze sample as a GAZE_SAMPLE_DTYPE record, which is
+        indexed like the HoloLens message (sample['x'], sample['y'], sample['time']),
+        or None if no sample has arrived yet.
+        """
+        return self.ring.latest()
+
+    def _open_socket(self) -> zmq.Socket:
+        sock = self.context.socket(zmq.DEALER)
+        sock.setsockopt(zmq.LINGER, 0)
+        for option, value in self.socket_options.items():
+            sock.setsockopt(option, value)
+        sock.connect(self.address)
+        return sock
+
+    def _run(self) -> None:
+        sock = self._open_socket()
+        poller = zmq.Poller()
+        poller.register(sock, zmq.POLLIN)
+        next_request: float = time.time()
+        try:
+            while not self._stop_event.is_set():
+                now = time.time()
+                while len(self._pending) < self.max_in_flight and now >= next_request:
+                    # empty delimiter frame, so the REP side sees a regular request envelope
+                    request_body = encode_batch_request(self.last_seq) if self.binary else b""
+                    sock.send_multipart([b"", request_body])
+                    self._pending.append(now)
+                    self.requests_sent += 1
+                    next_request = now + self.request_period
+
+                if len(self._pending) >= self.max_in_flight:
+                    wait_ms = 100.0  # woken up early by the next reply
+                else:
+                    wait_ms = min(max(0.0, (next_request - time.time()) * 1000.0), 100.0)
+                events = dict(poller.poll(wait_ms))
+
+                if sock in events:
+                    while True:
+                        try:
+                            frames = sock.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self._handle_reply(frames[-1], time.time())
+
+                if self._pending and time.time() - self._pending[0] > self.reply_timeout:
+                    # The reply is gone (e.g. HoloLens app restarted). Replies on a fresh
+                    # connection can not be matched to old requests, so start over.
+                    self.replies_lost += len(self._pending)
+                    self._lost.inc(len(self._pending))
+                    self._pending.clear()
+                    poller.unregister(sock)
+                    sock.close()
+                    sock = self._open_socket()
+                    poller.register(sock, zmq.POLLIN)
+                    self.reconnects += 1
+                    next_request = time.time()
+                    log.warning("Gaze reply timed out, reconnected to %s", self.address)
+        finally:
+            sock.close()
+
+    def _handle_reply(self, payload: bytes, recv_time: float) -> None:
+        send_time = self._pending.popleft() if self._pending else recv_time
+        self.last_reply = recv_time
+        self._rtt.record(recv_time - send_time)
+        try:
+            if is_binary_gaze(payload):
+                records = decode_gaze(payload)
+                self.wire_format = 'binary'
+                if len(records) == 0:
+                    return
+                if records['seq'][-1] < self.last_seq and records['time'][-1] > self._last_time:
+                    # the HoloLens app restarted and its counter with it
+                    self.last_seq = 0
+                # requests in flight overlap, keep only samples not seen yet
+                records = records[records['seq'] > self.last_seq]
+                if len(records) == 0:
+                    return
+                self.ring.extend(records, send_time, recv_time)
+                self.last_seq = int(records['seq'][-1])
+                self._last_time = float(records['time'][-1])
+                return
+            gaze = json.loads(payload)
+            self.last_seq += 1
+            self.ring.append(float(gaze['x']), float(gaze['y']), float(gaze['time']), send_time, recv_time,
+                             seq=self.last_seq)
+            self.wire_format = 'json'
+        except (ValueError, KeyError, TypeError) as e:
+            log.error("Malformed gaze reply: %s", e)
@@ -1,21 +1,143 @@
 import json
-import cv2
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 from alive_progress import alive_bar
-import imageio
-from PIL import Image 
+from recording import open_trajectory
+from frame_reader import iter_frames
+from gif_export import EXPORT_FORMATS, ExportTimer, open_exporter
+from gaze_overlay import GazeOverlay
 
 
-def process_gaze_gif(source_dir, target_dir, task, skip_amount=10):
+MANIFEST_FILENAME = '.gaze_gif_manifest.json'
+# frames rendered by one GazeOverlay.render_batch call
+RENDER_BATCH = 16
+
+
+def load_manifest(target_dir):
+    """
+    Load the manifest of completed GIFs, {target path relative to target_dir: info}.
+    """
+    manifest_path = os.path.join(target_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as handle:
+        return json.load(handle)
+
+
+def save_manifest(target_dir, manifest):
+    manifest_path = os.path.join(target_dir, MANIFEST_FILENAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_done(target_dir, manifest, target_gif_path):
+    """
+    A GIF counts as done only if the manifest lists it and the file on disk matches.
+    """
+    entry = manifest.get(os.path.relpath(target_gif_path, target_dir))
+    return (entry is not None and os.path.exists(target_gif_path)
+            and os.path.getsize(target_gif_path) == entry['bytes'])
+
+
+def write_batch(writer, overlay, frames, indices):
+    rendered = overlay.render_batch(np.stack(frames), indices)
+    # BGR -> RGB for the whole batch
+    for image in np.ascontiguousarray(rendered[..., ::-1]):
+        writer.append(image)
+
+
+def render_gaze_gif(traj_dir, target_gif_path, skip_amount=10, fps=10.0, scale=1.0, colors=256, max_bytes=None,
+                    trail=0, heatmap_alpha=0.0):
+    """
+    Render one trajectory to a GIF, or to an MP4/WebM video if target_gif_path
+    has that extension.
+
+    The output is written to a temporary file first and moved into place when
+    complete, so an interrupted run never leaves a truncated file behind.
+
+    Args:
+        traj_dir (str): trajectory directory
+        target_gif_path (str): output path, '.gif', '.mp4' or '.webm'
+        skip_amount (int): Number of frames to skip between each processed frame
+        fps (float): playback frame rate
+        scale (float): resize factor of the output frames
+        colors (int): GIF palette size
+        max_bytes (int): upper bound on the GIF size, None for no bound
+        trail (int): number of previous gaze points drawn as a trail
+        heatmap_alpha (float): opacity of the trajectory gaze heatmap, 0 for none
+
+    Returns:
+        dict: manifest entry for the trajectory
+    """
+    trajectory = open_trajectory(traj_dir)
+
+    print(f'[INFO] found {len(trajectory)} frames with gaze in {traj_dir}')
+
+    # create gif from images and gaze points
+    target_folder = os.path.dirname(target_gif_path)
+    if not os.path.exists(target_folder):
+        print(f'[INFO] target folder {target_folder} does not exist, creating it')
+        os.makedirs(target_folder, exist_ok=True)
+
+    root, ext = os.path.splitext(target_gif_path)
+    part_path = f'{root}.part{ext}'
+    writer = ExportTimer(open_exporter(part_path, fps=fps, scale=scale, colors=colors, max_bytes=max_bytes))
+    try:
+        # gaze of the rendered frames and their trail only; the heatmap is then built from these frames too
+        shown = np.arange(0, len(trajectory), skip_amount)
+        needed = np.unique((shown[:, None] - np.arange(trail + 1)[None, :]).ravel())
+        gaze_xy = trajectory.gaze_array(needed[needed >= 0])
+        overlay = None
+        frames, indices = [], []
+        # the next frames are read and decoded in the background while this batch is drawn and encoded
+        for i, image, _ in iter_frames(trajectory, skip_amount=skip_amount):
+            if overlay is None:
+                # rotates the frames by 180 degrees and draws the gaze point
+                overlay = GazeOverlay(gaze_xy, image.shape[1], image.shape[0], color=(0, 0, 255),
+                                      trail=trail, heatmap_alpha=heatmap_alpha)
+            frames.append(image)
+            indices.append(i)
+            if len(frames) == RENDER_BATCH:
+                write_batch(writer, overlay, frames, indices)
+                frames, indices = [], []
+        if frames:
+            write_batch(writer, overlay, frames, indices)
+        stats = writer.close()
+    finally:
+        trajectory.close()
+    os.replace(part_path, target_gif_path)
+    print(f'[INFO] wrote {target_gif_path}: {stats["frames"]} frames {stats["width"]}x{stats["height"]}, '
+          f'{stats["bytes"] / 1024:.0f} KiB, encoded in {stats["encode_seconds"]:.2f}s')
+
+    stats.update({'source': traj_dir, 'skip_amount': skip_amount})
+    return stats
+
+
+def process_gaze_gif(source_dir, target_dir, task, skip_amount=10, jobs=1, output_format='gif', fps=10.0,
+                     scale=1.0, colors=256, max_bytes=None, trail=0, heatmap_alpha=0.0):
     """
     Process gaze data and images to create GIF files.
+
+    Finished GIFs are recorded in a manifest in target_dir, so an
+    interrupted run resumes with the trajectories that are not done yet.
     
     Args:
         source_dir (str): Source directory containing the data
         target_dir (str): Target directory for output GIFs
         task (str): Task name to process ('all' for all tasks)
         skip_amount (int): Number of frames to skip between each processed frame
+        jobs (int): Number of trajectories rendered in parallel processes
+        output_format (str): 'gif', 'mp4' or 'webm'
+        fps (float): playback frame rate
+        scale (float): resize factor of the output frames
+        colors (int): GIF palette size
+        max_bytes (int): upper bound on the size of every GIF, None for no bound
+        trail (int): number of previous gaze points drawn as a trail
+        heatmap_alpha (float): opacity of the trajectory gaze heatmap, 0 for none
     """
     if not os.path.exists(source_dir):
         print(f'[ERROR] directory {source_dir} does not exist, exiting')
@@ -30,6 +152,7 @@ def process_gaze_gif(source_dir, target_dir, task, skip_amount=10):
         print(f'[ERROR] no task directories found in {source_dir}, exiting')
         return False
 
+    manifest = load_manifest(target_dir)
     traj_src_dir = []
     traj_target_dir = []
 
@@ -45,71 +168,51 @@ def process_gaze_gif(source_dir, target_dir, task, skip_amount=10):
                 print(f'[WARN] {traj_dir} is not a directory, skipping')
                 continue
 
-            target_gif_path = os.path.join(target_dir, task_name, f"{traj_folder}.gif")
-            if os.path.exists(target_gif_path):
-                print(f'[WARN] target file {target_gif_path} already exists, skipping')
+            target_gif_path = os.path.join(target_dir, task_name, f"{traj_folder}.{output_format}")
+            if is_done(target_dir, manifest, target_gif_path):
+                print(f'[WARN] target file {target_gif_path} already done, skipping')
                 continue
+            if os.path.exists(target_gif_path):
+                print(f'[WARN] target file {target_gif_path} is not in the manifest, rendering it again')
             traj_target_dir.append(target_gif_path)
             traj_src_dir.append(traj_dir)
 
     print(f'[INFO] found {len(traj_src_dir)} trajectories to process')
-    
+    failed = 0
+    render_args = (skip_amount, fps, scale, colors, max_bytes, trail, heatmap_alpha)
+
     with alive_bar(len(traj_src_dir), title='Processing trajectories') as bar:
-        for traj_dir, target_gif_path in zip(traj_src_dir, traj_target_dir):
-            bar.text(f'Processing {traj_dir} -> {target_gif_path}')
+        def on_done(target_gif_path, entry):
+            manifest[os.path.relpath(target_gif_path, target_dir)] = entry
+            save_manifest(target_dir, manifest)
+            bar.text(f'Done {target_gif_path}')
             bar()
 
-            files = sorted(os.listdir(traj_dir))
-
-            # get union of image and gaze files that have the same name, ignore the extension
-            paired_files = []
-            for f in files:
-                if f.endswith('.png'):
-                    gaze_file = f.replace('.png', '.json')
-                    if gaze_file in files:
-                        paired_files.append(f.replace('.png', ''))
-                
-            # sort paired files by their float value in the name
-            paired_files = sorted(paired_files, key=lambda x: int(x))
-
-            image_files = [os.path.join(traj_dir, f"{f}.png") for f in paired_files]
-            gaze_files = [os.path.join(traj_dir, f"{f}.json") for f in paired_files]
-
-            print(f'[INFO] found {len(image_files)} image files and {len(gaze_files)} gaze files'
-                f' in {traj_dir}')
-
-            # create gif from images and gaze points
-            target_folder = os.path.dirname(target_gif_path)
-            if not os.path.exists(target_folder):
-                print(f'[INFO] target folder {target_folder} does not exist, creating it')
-                os.makedirs(target_folder)
-                
-            with imageio.get_writer(target_gif_path, mode='I') as writer:
-                palette = None
-                for i in range(0, len(image_files), skip_amount):
-                    image_file_path = image_files[i]
-                    gaze_file_path = gaze_files[i]
-                    image = cv2.imread(image_file_path)
-                    # rotate image 180 degrees
-                    image = cv2.rotate(image, cv2.ROTATE_180)
-
-                    gaze_pos_rel = json.load(open(gaze_file_path, 'r'))
-                    gaze_pos_abs = (gaze_pos_rel['x'] * image.shape[1],
-                                    (1 - gaze_pos_rel['y']) * image.shape[0])
-
-                    # draw gaze point
-                    cv2.circle(image, (int(gaze_pos_abs[0]), int(gaze_pos_abs[1])), 5, (0, 0, 255), -1)
-                    image_coverted = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                    # # Displaying the converted image
-                    # pil_image = Image.fromarray(image_coverted)
-                    # if i == 0: # Quantize the first frame and get the palette
-                    #     pil_image = pil_image.quantize(colors=254, method=Image.Quantize.MAXCOVERAGE)
-                    #     palette = pil_image
-                    # else: # Quantize all other frames to the same palette
-                    #     pil_image = pil_image.quantize(colors=254, palette=palette, method=Image.Quantize.MAXCOVERAGE)
-                    writer.append_data(image_coverted)
+        if jobs <= 1:
+            for traj_dir, target_gif_path in zip(traj_src_dir, traj_target_dir):
+                bar.text(f'Processing {traj_dir} -> {target_gif_path}')
+                try:
+                    on_done(target_gif_path, render_gaze_gif(traj_dir, target_gif_path, *render_args))
+                except Exception as e:
+                    print(f'[ERROR] failed to render {target_gif_path}: {e}')
+                    failed += 1
+                    bar()
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(render_gaze_gif, traj_dir, target_gif_path, *render_args): target_gif_path
+                    for traj_dir, target_gif_path in zip(traj_src_dir, traj_target_dir)
+                }
+                for future in as_completed(futures):
+                    target_gif_path = futures[future]
+                    try:
+                        on_done(target_gif_path, future.result())
+                    except Exception as e:
+                        print(f'[ERROR] failed to render {target_gif_path}: {e}')
+                        failed += 1
+                        bar()
     
-    return True
+    return failed == 0
 
 
 def main():
@@ -146,6 +249,62 @@ def main():
         default=10,
         help='Number of frames to skip between each processed frame'
     )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of trajectories rendered in parallel'
+    )
+
+    parser.add_argument(
+        '--format', '-f',
+        choices=EXPORT_FORMATS,
+        default='gif',
+        help='Output format, mp4/webm are encoded by ffmpeg and much smaller than GIFs'
+    )
+
+    parser.add_argument(
+        '--fps',
+        type=float,
+        default=10.0,
+        help='Playback frame rate of the output'
+    )
+
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=1.0,
+        help='Resize factor of the output frames'
+    )
+
+    parser.add_argument(
+        '--colors',
+        type=int,
+        default=256,
+        help='Size of the palette shared by all frames of a GIF'
+    )
+
+    parser.add_argument(
+        '--max-size-kb',
+        type=int,
+        default=None,
+        help='Upper bound on the size of every GIF, they are downscaled until they fit'
+    )
+
+    parser.add_argument(
+        '--trail',
+        type=int,
+        default=0,
+        help='Number of previous gaze points drawn as a trail'
+    )
+
+    parser.add_argument(
+        '--heatmap-alpha',
+        type=float,
+        default=0.0,
+        help='Opacity of the gaze heatmap of the whole trajectory, 0 disables it'
+    )
     
     args = parser.parse_args()
     
@@ -154,12 +313,22 @@ def main():
     print(f"  Target directory: {args.target_dir}")
     print(f"  Task: {args.task}")
     print(f"  Skip amount: {args.skip_amount}")
+    print(f"  Jobs: {args.jobs}")
+    print(f"  Format: {args.format}, fps {args.fps}, scale {args.scale}")
     
     success = process_gaze_gif(
         source_dir=args.source_dir,
         target_dir=args.target_dir,
         task=args.task,
-        skip_amount=args.skip_amount
+        skip_amount=args.skip_amount,
+        jobs=args.jobs,
+        output_format=args.format,
+        fps=args.fps,
+        scale=args.scale,
+        colors=args.colors,
+        max_bytes=args.max_size_kb * 1024 if args.max_size_kb else None,
+        trail=args.trail,
+        heatmap_alpha=args.heatmap_alpha
     )
     
     if success:
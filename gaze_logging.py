@@ -0,0 +1,192 @@
+"""
+Logging of the PC side.
+
+Loggers are named after the former print tags, 'PC', 'PC.ZMQ', 'PC.UDP',
+'PC.METRICS' and 'GazeTrackerDevice', and records are printed in the old
+form, "[PC][ZMQ] message" with a "[WARN]" / "[ERROR]" tag for those levels.
+
+Per-frame and per-sample messages are logged at DEBUG, which is off by
+default and costs a level check only. Records are not formatted by the
+logging thread: they go through a bounded queue to a background thread
+that formats and writes them (AsyncLogHandler), and every call site is
+rate limited (RateLimitFilter), so a message logged per frame never floods
+the terminal. Pass immutable arguments (numbers, strings) to log calls,
+they are only formatted later.
+
+    log = get_logger('PC.ZMQ')
+    log.debug("Published image %s | size=%d bytes", timestamp, size)
+
+setup_logging() changes the level or rate limit; get_logger() applies the
+defaults if it was not called.
+"""
+import atexit
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO, Tuple, Union
+
+
+# top-level loggers configured by setup_logging(); every logger of this package is below one of them
+LOGGER_ROOTS: Tuple[str, ...] = ('PC', 'GazeTrackerDevice')
+LEVEL_TAGS: Dict[int, str] = {
+    logging.DEBUG: '[DEBUG]',
+    logging.WARNING: '[WARN]',
+    logging.ERROR: '[ERROR]',
+    logging.CRITICAL: '[ERROR]',
+}
+
+
+class TagFormatter(logging.Formatter):
+    """
+    Formats a record of logger 'PC.ZMQ' as "[PC][ZMQ] message".
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        tags = ''.join(f'[{part}]' for part in record.name.split('.'))
+        message = record.getMessage()
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f" ({suppressed} similar messages suppressed)"
+        line = f"{tags}{LEVEL_TAGS.get(record.levelno, '')} {message}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site (logger and source line): up to `burst`
+    records at once, then `rate` records per second. The number of
+    suppressed records is reported with the next record that passes.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 10) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        # call site -> (tokens, time of last update, records suppressed since the last one passed)
+        self._buckets: Dict[Tuple[str, str, int], Tuple[float, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (float(self.burst), now, 0))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1.0, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    Hands records to a background thread that formats and writes them with
+    `handler`. When the queue is full, records are dropped and counted
+    instead of blocking the caller.
+    """
+
+    def __init__(self, handler: logging.Handler, capacity: int = 10000) -> None:
+        super().__init__(queue.Queue(capacity))
+        self.handler = handler
+        self.dropped: int = 0
+        self.listener = QueueListener(self.queue, handler, respect_handler_level=True)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        self.listener.start()
+
+    def stop(self) -> None:
+        """
+        Writes the queued records and stops the background thread.
+        """
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.handler.flush()
+
+
+_handler: Optional[AsyncLogHandler] = None
+_lock = threading.Lock()
+
+
+def setup_logging(
+    level: Union[int, str] = logging.INFO,
+    stream: Optional[TextIO] = None,
+    rate: float = 2.0,
+    burst: int = 10,
+    capacity: int = 10000,
+) -> AsyncLogHandler:
+    """
+    Configures the loggers of LOGGER_ROOTS; replaces an earlier configuration.
+
+    Args:
+        level: lowest level written, e.g. logging.DEBUG or 'DEBUG' to see every published frame
+        stream: output stream, default stdout like the former prints
+        rate: records per second and call site after a burst, 0 disables rate limiting
+        burst: records a call site may log at once
+        capacity: records queued for the writer thread before new ones are dropped
+    Returns:
+        AsyncLogHandler: the installed handler
+    """
+    global _handler
+    with _lock:
+        if _handler is not None:
+            _remove_handler(_handler)
+        target = logging.StreamHandler(stream if stream is not None else sys.stdout)
+        target.setFormatter(TagFormatter())
+        handler = AsyncLogHandler(target, capacity)
+        if rate > 0:
+            handler.addFilter(RateLimitFilter(rate, burst))
+        for name in LOGGER_ROOTS:
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            logger.addHandler(handler)
+            logger.propagate = False
+        handler.start()
+        _handler = handler
+        return handler
+
+
+def _remove_handler(handler: AsyncLogHandler) -> None:
+    for name in LOGGER_ROOTS:
+        logging.getLogger(name).removeHandler(handler)
+    handler.stop()
+
+
+def shutdown_logging() -> None:
+    """
+    Flushes the queued records; called at interpreter exit.
+    """
+    global _handler
+    with _lock:
+        if _handler is not None:
+            _remove_handler(_handler)
+            _handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns the logger `name` (e.g. 'PC.ZMQ'), applying the default configuration on first use.
+    """
+    if _handler is None:
+        setup_logging()
+    return logging.getLogger(name)
+
+
+atexit.register(shutdown_logging)
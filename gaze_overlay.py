@@ -0,0 +1,183 @@
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+def gaze_to_pixels(gaze_xy: np.ndarray, width: int, height: int, rotate_180: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts the normalized gaze of a whole trajectory to pixel coordinates
+    in one pass.
+
+    The HoloLens reports y upwards and relative to the camera image rotated
+    by 180 degrees, so the output frame position is (x * w, (1 - y) * h).
+    Without rotate_180 the same pixels are returned for the unrotated
+    camera image, (w - 1 - u, h - 1 - v), i.e. the rotation is folded into
+    the transform instead of being applied to the image.
+
+    Args:
+        gaze_xy: (N, 2) normalized gaze x, y
+        width: frame width in pixels
+        height: frame height in pixels
+        rotate_180: coordinates for the rotated (displayed) frame
+    Returns:
+        tuple: (N, 2) int32 pixel x, y and (N,) bool mask of samples that can be drawn
+    """
+    gaze_xy = np.asarray(gaze_xy, dtype=np.float64).reshape(-1, 2)
+    pixels = gaze_xy * np.array([width, -height], dtype=np.float64) + np.array([0.0, height], dtype=np.float64)
+    valid = np.isfinite(pixels).all(axis=1)
+    pixels = np.where(valid[:, None], pixels, 0).astype(np.int32)
+    if not rotate_180:
+        # pixel (u, v) of the rotated frame is pixel (w - 1 - u, h - 1 - v) of the unrotated one
+        pixels[valid] = np.array([width - 1, height - 1], dtype=np.int32) - pixels[valid]
+    return pixels, valid
+
+
+def disk_offsets(radius: int) -> np.ndarray:
+    """
+    Returns the (K, 2) dy, dx offsets of a filled disk, used as a stamp for batch drawing.
+    """
+    r = np.arange(-radius, radius + 1)
+    dy, dx = np.meshgrid(r, r, indexing='ij')
+    inside = dy ** 2 + dx ** 2 <= radius ** 2
+    return np.stack([dy[inside], dx[inside]], axis=1)
+
+
+def stamp(frames: np.ndarray, frame_index: np.ndarray, pixels: np.ndarray, offsets: np.ndarray,
+          color: Sequence[int]) -> None:
+    """
+    Draws a disk at every (frame, pixel) pair with a single fancy-indexed assignment.
+
+    Args:
+        frames: (B, H, W, C) frames, drawn into in place
+        frame_index: (M,) frame of every point
+        pixels: (M, 2) pixel x, y of every point
+        offsets: stamp from disk_offsets()
+        color: marker colour in the channel order of frames
+    """
+    _, height, width = frames.shape[:3]
+    ys = pixels[:, 1, None] + offsets[None, :, 0]
+    xs = pixels[:, 0, None] + offsets[None, :, 1]
+    inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+    fs = np.broadcast_to(frame_index[:, None], ys.shape)
+    frames[fs[inside], ys[inside], xs[inside]] = color
+
+
+class GazeOverlay(object):
+    """
+    Draws gaze markers, gaze trails and a gaze heatmap onto the frames of
+    one trajectory. All gaze points are converted once when the overlay is
+    created, and frames are rendered in batches with NumPy indexing instead
+    of per-frame cv2 calls.
+    """
+
+    def __init__(
+        self,
+        gaze_xy: np.ndarray,
+        width: int,
+        height: int,
+        rotate_180: bool = True,
+        radius: int = 5,
+        color: Tuple[int, int, int] = (0, 0, 255),
+        trail: int = 0,
+        trail_radius: int = 2,
+        trail_color: Optional[Tuple[int, int, int]] = None,
+        heatmap_alpha: float = 0.0,
+        heatmap_sigma: float = 15.0,
+    ) -> None:
+        """
+        Args:
+            gaze_xy: (N, 2) normalized gaze of every frame, NaN where unknown, see Trajectory.gaze_array()
+            width: frame width in pixels
+            height: frame height in pixels
+            rotate_180: rotate the frames by 180 degrees, as the camera is mounted upside down
+            radius: marker radius in pixels
+            color: marker colour, BGR like the frames
+            trail: number of previous gaze points drawn as a trail, 0 for none
+            trail_radius: radius of the trail dots
+            trail_color: colour of the trail dots, default the marker colour
+            heatmap_alpha: opacity of the trajectory gaze heatmap, 0 for none
+            heatmap_sigma: blur of the heatmap in pixels
+        """
+        self.width = width
+        self.height = height
+        self.rotate_180 = rotate_180
+        self.color = color
+        self.trail = trail
+        self.trail_color = color if trail_color is None else trail_color
+        self.heatmap_alpha = heatmap_alpha
+        self.pixels, self.valid = gaze_to_pixels(gaze_xy, width, height, rotate_180)
+        self._marker = disk_offsets(radius)
+        self._trail = disk_offsets(trail_radius)
+        self._heat_color: Optional[np.ndarray] = None
+        self._heat_weight: Optional[np.ndarray] = None
+        if heatmap_alpha > 0:
+            self._heat_color, self._heat_weight = self.heatmap(heatmap_sigma)
+
+    def __len__(self) -> int:
+        return len(self.pixels)
+
+    def update_gaze(self, indices: Sequence[int], gaze_xy: np.ndarray) -> None:
+        """
+        Sets the gaze of some frames, e.g. when gaze is read lazily while stepping through a trajectory.
+
+        Args:
+            indices: (K,) trajectory indices
+            gaze_xy: (K, 2) normalized gaze of these frames
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        self.pixels[indices], self.valid[indices] = gaze_to_pixels(gaze_xy, self.width, self.height, self.rotate_180)
+
+    def heatmap(self, sigma: float = 15.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gaze density of the whole trajectory.
+
+        Returns:
+            tuple: (H, W, 3) uint8 colour-mapped heatmap and (H, W) float32 density scaled to 0..1
+        """
+        density = np.zeros((self.height, self.width), dtype=np.float32)
+        inside = self.valid & (self.pixels[:, 0] >= 0) & (self.pixels[:, 0] < self.width) \
+            & (self.pixels[:, 1] >= 0) & (self.pixels[:, 1] < self.height)
+        np.add.at(density, (self.pixels[inside, 1], self.pixels[inside, 0]), 1.0)
+        density = cv2.GaussianBlur(density, (0, 0), sigma)
+        if density.max() > 0:
+            density /= density.max()
+        heat_color = cv2.applyColorMap((density * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        return heat_color, density
+
+    def render_batch(self, frames: np.ndarray, indices: Sequence[int]) -> np.ndarray:
+        """
+        Renders the overlay onto several frames at once.
+
+        Args:
+            frames: (B, H, W, 3) camera frames as read from the trajectory
+            indices: (B,) trajectory index of every frame
+        Returns:
+            np.ndarray: (B, H, W, 3) new frames, rotated if rotate_180
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        out = frames[:, ::-1, ::-1] if self.rotate_180 else frames
+        if self._heat_weight is not None:
+            weight = (self._heat_weight * self.heatmap_alpha)[None, :, :, None]
+            out = (out * (1.0 - weight) + self._heat_color[None] * weight).astype(np.uint8)
+        else:
+            out = np.ascontiguousarray(out)
+
+        if self.trail > 0:
+            # the trail of frame i are the points of frames i - trail .. i - 1
+            history = indices[:, None] - np.arange(self.trail, 0, -1)[None, :]
+            batch = np.broadcast_to(np.arange(len(indices))[:, None], history.shape)
+            keep = history >= 0
+            history, batch = history[keep], batch[keep]
+            keep = self.valid[history]
+            stamp(out, batch[keep], self.pixels[history[keep]], self._trail, self.trail_color)
+
+        keep = self.valid[indices]
+        stamp(out, np.nonzero(keep)[0], self.pixels[indices[keep]], self._marker, self.color)
+        return out
+
+    def render(self, frame: np.ndarray, i: int) -> np.ndarray:
+        """
+        Renders the overlay onto frame i of the trajectory.
+        """
+        return self.render_batch(frame[None], [i])[0]
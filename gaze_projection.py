@@ -0,0 +1,122 @@
+from typing import Tuple
+
+import numpy as np
+
+from gaze_overlay import gaze_to_pixels
+
+
+def neighbourhood_offsets(radius: int) -> np.ndarray:
+    """
+    Returns the (K, 2) dy, dx offsets of a (2r + 1)^2 window, nearest first.
+    """
+    r = np.arange(-radius, radius + 1)
+    dy, dx = np.meshgrid(r, r, indexing='ij')
+    offsets = np.stack([dy.reshape(-1), dx.reshape(-1)], axis=1)
+    order = np.argsort(offsets[:, 0] ** 2 + offsets[:, 1] ** 2, kind='stable')
+    return offsets[order]
+
+
+def lookup_points(clouds: np.ndarray, frame_index: np.ndarray, pixels: np.ndarray,
+                  offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Looks up the point under every gaze pixel. If that point is a hole (zero
+    or non-finite depth), the nearest valid point within the offsets window
+    is taken instead.
+
+    Args:
+        clouds: (F, H, W, 3) organized point clouds, may be memory-mapped
+        frame_index: (N,) cloud of every gaze sample
+        pixels: (N, 2) pixel x, y of every gaze sample in the cloud image
+        offsets: search window from neighbourhood_offsets()
+    Returns:
+        tuple: (N, 3) float32 points, NaN where nothing was found, and (N,) bool found mask
+    """
+    _, height, width = clouds.shape[:3]
+    ys = pixels[:, 1, None] + offsets[None, :, 0]
+    xs = pixels[:, 0, None] + offsets[None, :, 1]
+    inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+    ys = np.clip(ys, 0, height - 1)
+    xs = np.clip(xs, 0, width - 1)
+    z = clouds[frame_index[:, None], ys, xs, 2]
+    valid = inside & np.isfinite(z) & (z != 0)
+
+    nearest = np.argmax(valid, axis=1)
+    rows = np.arange(len(pixels))
+    found = valid[rows, nearest]
+    points = np.full((len(pixels), 3), np.nan, dtype=np.float32)
+    points[found] = clouds[frame_index[found], ys[rows, nearest][found], xs[rows, nearest][found]]
+    return points, found
+
+
+class GazeProjector(object):
+    """
+    Maps normalized 2D gaze to 3D fixation points in the organized point
+    cloud of the camera, whose depth is aligned to the colour image.
+
+    Gaze is normalized like in gaze_gif / gaze_overlay: relative to the
+    colour image rotated by 180 degrees, with y upwards. The rotation and
+    flip are folded into the pixel transform, so clouds are used as the
+    camera delivers them.
+    """
+
+    def __init__(self, width: int, height: int, radius: int = 3, rotate_180: bool = True) -> None:
+        """
+        Args:
+            width: width of the cloud image (colour frame) in pixels
+            height: height of the cloud image in pixels
+            radius: half size of the window searched around a hole, 0 for no search
+            rotate_180: gaze is relative to the rotated image, as recorded by GazeTrackerDevice
+        """
+        self.width = width
+        self.height = height
+        self.rotate_180 = rotate_180
+        self.offsets = neighbourhood_offsets(radius)
+
+    def pixels(self, gaze_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (N, 2) cloud pixel x, y of normalized gaze and the (N,) mask of finite gaze.
+        """
+        # gaze relative to the rotated image is looked up in the unrotated cloud
+        pixels, valid = gaze_to_pixels(gaze_xy, self.width, self.height, rotate_180=not self.rotate_180)
+        np.clip(pixels[:, 0], 0, self.width - 1, out=pixels[:, 0])
+        np.clip(pixels[:, 1], 0, self.height - 1, out=pixels[:, 1])
+        return pixels, valid
+
+    def _as_organized(self, clouds: np.ndarray) -> np.ndarray:
+        return clouds.reshape(-1, self.height, self.width, 3)
+
+    def project(self, cloud: np.ndarray, gaze_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Streaming mode: projects the gaze samples of one frame, e.g. all
+        samples received since the previous frame.
+
+        Args:
+            cloud: (H * W, 3) or (H, W, 3) point cloud, e.g. PointCloudData.getPoints()
+            gaze_xy: (N, 2) or (2,) normalized gaze
+        Returns:
+            tuple: (N, 3) float32 points (NaN if not found) and (N,) bool found mask
+        """
+        gaze_xy = np.asarray(gaze_xy, dtype=np.float64).reshape(-1, 2)
+        return self.project_batch(self._as_organized(cloud), gaze_xy, np.zeros(len(gaze_xy), dtype=np.int64))
+
+    def project_batch(self, clouds: np.ndarray, gaze_xy: np.ndarray, frame_index: np.ndarray = None
+                      ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batch mode: projects the gaze of a whole trajectory at once.
+
+        Args:
+            clouds: (F, H, W, 3) or (F, H * W, 3) point clouds, may be memory-mapped
+            gaze_xy: (N, 2) normalized gaze
+            frame_index: (N,) cloud of every gaze sample, default one sample per cloud
+        Returns:
+            tuple: (N, 3) float32 points (NaN if not found) and (N,) bool found mask
+        """
+        clouds = self._as_organized(clouds)
+        if frame_index is None:
+            frame_index = np.arange(len(clouds))
+        frame_index = np.asarray(frame_index, dtype=np.int64)
+        pixels, finite = self.pixels(gaze_xy)
+        points, found = lookup_points(clouds, frame_index, pixels, self.offsets)
+        found &= finite
+        points[~found] = np.nan
+        return points, found
@@ -1,19 +1,32 @@
-import re
-import socket
-import struct
 import time
 import cv2
+import numpy as np
 import zmq
 import json
-from typing import Optional, Tuple, Any, Dict
+import threading
+from typing import Optional, Tuple, Any, Dict, List, Union
 import sys
 
+from gaze_channel import GAZE_SAMPLE_DTYPE, GazeReceiver
+from gaze_wire import decode_gaze, encode_batch_request, is_binary_gaze
+from image_encoding import EncodingProfile, ImageEncoder
+from frame_change import FrameChangeDetector
+from hololens_sessions import ADDRESS_CACHE_PATH, DiscoveryService, HoloLensSession, SessionManager
+from gaze_logging import get_logger
+from instrumentation import METRICS
+from zmq_transport import TransportOptions, ZmqTransport
+
+
+log = get_logger('PC')
+zmq_log = get_logger('PC.ZMQ')
+udp_log = get_logger('PC.UDP')
+
 
 def get_wlan_ip() -> str:
     ip: str = ""
     if(sys.platform.startswith("win")):
         # Windows version
-        print("[PC] Detecting WLAN IP address on Windows...")
+        log.info("Detecting WLAN IP address on Windows...")
         import subprocess
         result = subprocess.run('ipconfig', stdout=subprocess.PIPE, text=True).stdout.lower()
         scan = 0
@@ -25,7 +38,7 @@ def get_wlan_ip() -> str:
                     ip = i.split(':')[1].strip()
                     break
     elif(sys.platform.startswith("linux")):
-        print("[PC] Detecting WLAN IP address on Linux...")
+        log.info("Detecting WLAN IP address on Linux...")
         import pyric.pyw as pyw
 
         wlan_interfaces: list = pyw.winterfaces()
@@ -39,7 +52,7 @@ def get_wlan_ip() -> str:
         raise Exception("Unsupported platform for WLAN IP detection.")
     if ip == "":
         raise RuntimeError("Could not detect WLAN IP address. Please ensure you are connected to a Wi-Fi network.")
-    print(f"[PC] WLAN-IP address: {ip}")
+    log.info("WLAN-IP address: %s", ip)
     return ip
 
 class GazeServer(object):
@@ -53,123 +66,317 @@ class GazeServer(object):
     # Set False if working on linux, idk why
     bind_to_wifi: bool = False  # Set to False if you want to bind to all interfaces, 
 
-    def __init__(self) -> None:
-        # We'll store the HoloLens's IP once discovered:
+    # Wait this long for the first gaze sample before zmq_get_gaze gives up
+    FIRST_GAZE_TIMEOUT: float = 5.0
+    # Lock-step gaze requests give up (and rebuild the socket) after this long
+    GAZE_REQUEST_TIMEOUT_MS: int = 1000
+
+    def __init__(
+        self,
+        async_gaze: bool = True,
+        encoding: Union[str, EncodingProfile] = 'default',
+        adaptive_encoding: bool = False,
+        camera_hz: float = 30.0,
+        change_threshold: Optional[float] = None,
+        keyframe_interval: float = 1.0,
+        transport: Union[str, TransportOptions] = 'latest',
+        address_cache: Optional[str] = ADDRESS_CACHE_PATH,
+    ) -> None:
+        """
+        Args:
+            async_gaze: fetch gaze in a background receiver and serve the newest
+                sample from memory instead of doing a REQ/REP round-trip per call.
+                Discovery then keeps running in the background and every HoloLens
+                that announces itself gets its own session (see hololens_sessions);
+                without async_gaze a single HoloLens is served.
+            encoding: image encoding profile name (see image_encoding.PROFILES) or an EncodingProfile
+            adaptive_encoding: lower the JPEG quality when publishing falls behind the camera rate
+            camera_hz: frame rate of the camera whose frames are published, the frame budget of adaptive_encoding
+            change_threshold: if set, skip frames whose thumbnail differs less than this from
+                the last published one (see frame_change.FrameChangeDetector)
+            keyframe_interval: with change_threshold, publish at least one frame every this many seconds
+            transport: ZMQ socket profile name (see zmq_transport.TRANSPORT_PROFILES) or TransportOptions;
+                'latest' keeps at most one frame queued per HoloLens, so a slow one gets fresh frames
+            address_cache: with async_gaze, file with the last HoloLens address that is reconnected
+                on startup, None disables the cache
+        """
+        # We'll store the HoloLens's IP once discovered (the primary session's with async_gaze):
         self.hololens_address: Optional[str] = None
+        self.async_gaze: bool = async_gaze
+        self.address_cache: Optional[str] = address_cache
+        self.sessions: Optional[SessionManager] = None
+        self.discovery: Optional[DiscoveryService] = None
+        # one context for all sockets, created on first use
+        self.transport = ZmqTransport(transport)
+        self.encoder = ImageEncoder(encoding, adaptive=adaptive_encoding, camera_hz=camera_hz)
+        self.change_detector: Optional[FrameChangeDetector] = None
+        if change_threshold is not None:
+            self.change_detector = FrameChangeDetector(change_threshold, keyframe_interval)
+        self._encode_time = METRICS.histogram('image_encode', 'Encoding of a published camera frame')
+        self._publish_time = METRICS.histogram('image_publish', 'Sending an encoded frame on the PUB socket')
+        self._gaze_rtt = METRICS.histogram('gaze_rtt', 'Round-trip time of a gaze request to the HoloLens')
+        self._frames_unchanged = METRICS.counter('frames_unchanged', 'Frames not published, too similar to the last one')
+        self._gaze_timeouts = METRICS.counter('gaze_timeouts', 'Lock-step gaze requests without reply')
 
-    def setup_connection(self) -> None:
+    def setup_connection(self, timeout: Optional[float] = None) -> None:
         """
         Sets up the connection by starting the UDP discovery listener.
         This will block until a HoloLens sends a DISCOVER_PC message.
+        With async_gaze, discovery keeps running afterwards: further HoloLenses
+        are added as sessions, the last known HoloLens is reconnected without
+        waiting for its broadcast, and a HoloLens that drops off and comes
+        back is picked up again without restarting the process.
+
+        Args:
+            timeout: seconds to wait for a HoloLens, None waits forever
+        Raises:
+            TimeoutError: no HoloLens connected within timeout
         """
-        self._udp_discovery_listener()
+        if not self.async_gaze:
+            self._udp_discovery_listener(timeout)
+            self._init_img_socket()
+            self._init_gaze_socket()
+            return
+
         self._init_img_socket()
         self._init_gaze_socket()
+        self.sessions.bind_address = self._discovery_bind_address()
+        self.sessions.start_discovery()
+        session = self.sessions.wait_for_session(timeout)
+        if session is None:
+            raise TimeoutError(f"No HoloLens connected within {timeout} s.")
+        self.hololens_address = session.address
 
-    def _udp_discovery_listener(self) -> None:
+    @property
+    def gaze_receiver(self) -> Optional[GazeReceiver]:
         """
-        Listens for a UDP broadcast from HoloLens. When it receives
-        DISCOVER_PC, it replies with PC_HERE, so the HoloLens knows our IP.
+        Gaze channel of the primary session, None before the first HoloLens connected.
         """
-        global hololens_address
+        session = self.sessions.primary if self.sessions is not None else None
+        return None if session is None else session.receiver
 
-        sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        bind_address: Tuple[str, int]
+    @property
+    def clients(self) -> List[str]:
+        """
+        Addresses of all connected HoloLenses.
+        """
+        if self.sessions is None:
+            return [] if self.hololens_address is None else [self.hololens_address]
+        return [session.address for session in self.sessions.sessions()]
+
+    def client_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-HoloLens gaze channel statistics, keyed by address.
+        """
+        return {} if self.sessions is None else self.sessions.stats()
+
+    def _session(self, client: Optional[str]) -> HoloLensSession:
+        if client is not None:
+            session = self.sessions.get(client)
+            if session is None:
+                raise KeyError(f"No HoloLens session for {client}, connected: {self.clients}")
+            return session
+        session = self.sessions.wait_for_session(self.FIRST_GAZE_TIMEOUT)
+        if session is None:
+            raise TimeoutError("No HoloLens connected.")
+        return session
+
+    def _discovery_bind_address(self) -> Tuple[str, int]:
         if self.bind_to_wifi:
             self.PC_WIFI_IP = get_wlan_ip()
-            print(f"[PC][UDP] Binding to WLAN IP: {self.PC_WIFI_IP}")
-            bind_address = (self.PC_WIFI_IP, self.DISCOVERY_PORT)
-        else:
-            bind_address = ('', self.DISCOVERY_PORT)
-
-        print(f"[PC][UDP] Binding to {bind_address} for discovery...")
-        sock.bind(bind_address)
-        print(f"[PC][UDP] Listening for discovery on {bind_address}...")
-        # hacky
-        # self.hololens_address = "10.68.147.179"
-        # sock.sendto(self.DISCOVERY_REPLY, ('10.68.147.179', 55538))
-        # print(f"[PC][UDP] Sent discovery reply to HoloLens @ {self.hololens_address}:{55538}.")
-
-        while True:
-            data: bytes
-            addr: Tuple[str, int]
-            data, addr = sock.recvfrom(self.BUFFER_SIZE)
-            print(f"[PC][UDP] Received data: {data} from {addr}")
-            print(f"[PC][UDP] Received data: {data} from {addr[0]}:{addr[1]}")
-            if data == self.DISCOVERY_MESSAGE:
-                self.hololens_address = addr[0]
-                print(f"[PC][UDP] Received discovery ping from HoloLens @ {addr}.")
-                # Reply back so HoloLens knows our IP
-                for _ in range(10):
-                    sock.sendto(self.DISCOVERY_REPLY, addr)
-                    time.sleep(0.05)
-                break  # we only need one discovery
+            udp_log.info("Binding to WLAN IP: %s", self.PC_WIFI_IP)
+            return (self.PC_WIFI_IP, self.DISCOVERY_PORT)
+        return ('', self.DISCOVERY_PORT)
+
+    def _udp_discovery_listener(self, timeout: Optional[float] = None) -> None:
+        """
+        Listens for a UDP broadcast from HoloLens. When it receives
+        DISCOVER_PC, it replies with PC_HERE, so the HoloLens knows our IP.
+        Returns as soon as the first ping arrived; the discovery service keeps
+        answering later pings (e.g. after the HoloLens app restarted) in the
+        background.
+        """
+        discovered = threading.Event()
+
+        def on_discovery(address: str) -> None:
+            if self.hololens_address is not None and address != self.hololens_address:
+                udp_log.warning("Ignoring HoloLens @ %s, lock-step gaze serves %s only", address, self.hololens_address)
+                return
+            self.hololens_address = address
+            discovered.set()
+
+        self.discovery = DiscoveryService(on_discovery, self._discovery_bind_address(),
+                                          self.DISCOVERY_MESSAGE, self.DISCOVERY_REPLY)
+        self.discovery.start()
+        if not discovered.wait(timeout):
+            self.discovery.stop()
+            self.discovery = None
+            raise TimeoutError(f"No HoloLens discovered within {timeout} s.")
 
     def zmq_publish_image(self, timestamp: str, image: cv2.typing.MatLike) -> None:
         """
-        Captures frames from the default camera (index=0), encodes as JPEG,
-        and publishes them over ZMQ PUB socket at tcp://*:5556.
+        Encodes the frame with the configured encoding profile and publishes
+        it over the ZMQ PUB socket at tcp://*:5006. With a change detector,
+        frames that barely differ from the last published one are dropped
+        before encoding.
+        All HoloLenses subscribe to the same PUB socket, so every frame is
+        encoded and sent once, however many clients are connected.
         """
         try:
+            if self.change_detector is not None and not self.change_detector.should_publish(image):
+                self._frames_unchanged.inc()
+                return
+
+            start = time.perf_counter()
             # Convert the timestamp to bytes
             timestamp_bytes: bytes = timestamp.encode('utf-8')
 
-            # Convert the image to JPEG format and encode it
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 90]  # Quality: 0–100
-            success, img_encoded = cv2.imencode('.jpg', image, encode_param)
-            if not success:
-                print("[PC][ERROR] Image could not be encoded as JPEG.")
+            image_bytes = self.encoder.encode(image)
+            if image_bytes is None:
+                zmq_log.error("Image could not be encoded.")
                 return
-            # Convert the encoded image to bytes
-            image_bytes: bytes = img_encoded.tobytes()
+            encoded = time.perf_counter()
 
-            self.image_pub.send_multipart([timestamp_bytes, image_bytes])
-            print(f"[PC][ZMQ] Published image with step={timestamp} | size={len(image_bytes)} bytes")
+            if self.encoder.profile.format == 'raw':
+                self.image_pub.send_multipart([timestamp_bytes, image_bytes, self.encoder.raw_header()], copy=False)
+            else:
+                self.image_pub.send_multipart([timestamp_bytes, image_bytes], copy=False)
+            published = time.perf_counter()
+            self._encode_time.record(encoded - start)
+            self._publish_time.record(published - encoded)
+            self.encoder.report_publish_time(published - start)
+            zmq_log.debug("Published image with step=%s | size=%d bytes", timestamp, len(image_bytes))
 
         except Exception as e:
-            print(f"[PC][ERROR] Exception in image publisher: {e}")
+            zmq_log.error("Exception in image publisher: %s", e)
             return
 
-    def zmq_get_gaze(self) -> Dict[str, Any]:
+    def zmq_get_gaze(self, client: Optional[str] = None) -> Union[Dict[str, Any], np.void]:
         """
-        Subscribes to gaze‐coordinate messages (as JSON strings) on tcp://*:5557.
+        Returns the latest gaze sample from the HoloLens.
         Each message could look like: { "x": 123, "y": 456, "time": 123325.4545 }
+        With async_gaze this is served from the receiver's ring and does not touch
+        the network; otherwise it does a blocking REQ/REP round-trip.
+
+        Args:
+            client: address of the HoloLens to read (async_gaze only), default the primary session
+        Returns:
+            the sample; with async_gaze a GAZE_SAMPLE_DTYPE record (np.void), otherwise the decoded
+            JSON dict. Both are read by field, gaze['x'], gaze['y'], gaze['time'], but the record has
+            NumPy scalars and no dict methods, convert with float() before e.g. json.dumps.
         """
-        self.gaze_req.send_string("")
-        msg: str = self.gaze_req.recv_string()
+        if self.sessions is not None:
+            receiver = self._session(client).receiver
+            gaze = receiver.latest()
+            if gaze is None:
+                if not receiver.ring.wait_for_sample(self.FIRST_GAZE_TIMEOUT):
+                    raise TimeoutError("No gaze data received from HoloLens.")
+                gaze = receiver.latest()
+            return gaze
+
+        msg: bytes = self._gaze_request(b"")
         gaze = json.loads(msg)
-        print(f"[PC][ZMQ] Received gaze data: {gaze}")
+        zmq_log.debug("Received gaze data: %s", gaze)
         return gaze
 
+    def zmq_get_gaze_since(self, seq: int, client: Optional[str] = None) -> np.ndarray:
+        """
+        Returns every gaze sample with a sequence number above `seq` as a
+        GAZE_SAMPLE_DTYPE array (oldest first). Pass the last returned
+        sample's 'seq' to the next call to get the full-rate stream.
+        With async_gaze the samples come from the receiver's ring (samples
+        older than the ring capacity are lost); otherwise a single batch
+        request is sent to the HoloLens.
+        Sequence numbers are per HoloLens; `client` selects one as in zmq_get_gaze.
+        """
+        if self.sessions is not None:
+            return self._session(client).since_seq(seq)
+
+        send_time = time.time()
+        msg: bytes = self._gaze_request(encode_batch_request(seq))
+        recv_time = time.time()
+        if not is_binary_gaze(msg):
+            # HoloLens without batch support, only the newest sample is available
+            gaze = json.loads(msg)
+            return np.array([(gaze['x'], gaze['y'], gaze['time'], 1, seq + 1, send_time, recv_time)],
+                            dtype=GAZE_SAMPLE_DTYPE)
+        records = decode_gaze(msg)
+        samples = np.zeros(len(records), dtype=GAZE_SAMPLE_DTYPE)
+        for name in records.dtype.names:
+            samples[name] = records[name]
+        samples['send_time'] = send_time
+        samples['recv_time'] = recv_time
+        return samples[samples['seq'] > seq]
+
+    def _gaze_request(self, body: bytes) -> bytes:
+        """
+        Lock-step request to the HoloLens. A lost reply would leave the REQ
+        socket stuck, so after GAZE_REQUEST_TIMEOUT_MS it is rebuilt and a
+        TimeoutError raised; the next call tries again.
+        """
+        start = time.perf_counter()
+        self.gaze_req.send(body)
+        try:
+            reply = self.gaze_req.recv()
+        except zmq.Again:
+            self._gaze_timeouts.inc()
+            self.gaze_req.close(linger=0)
+            self._open_gaze_req()
+            raise TimeoutError(f"No gaze reply from HoloLens @ {self.hololens_address}, reconnected.")
+        self._gaze_rtt.record(time.perf_counter() - start)
+        return reply
+
+    def _open_gaze_req(self) -> None:
+        self.gaze_req = self.transport.socket(zmq.REQ)
+        self.gaze_req.setsockopt(zmq.RCVTIMEO, self.GAZE_REQUEST_TIMEOUT_MS)
+        self.gaze_req.setsockopt(zmq.LINGER, 0)
+        self.gaze_req.connect(f"tcp://{self.hololens_address}:{self.ZMQ_GAZE_PORT}")
+
     def close(self) -> None:
         """
-        Closes the ZeroMQ sockets and contexts.
+        Closes the ZeroMQ sockets and the shared context without waiting
+        for unsent frames.
         """
         self._close_gaze()
         self._close_img()
-        print("[PC][ZMQ] Closed all sockets and contexts.")
+        self.transport.close()
+        zmq_log.info("Closed all sockets and contexts.")
 
 
     def _init_img_socket(self) -> None:
         # init pub for gaze data
-        self.pub_context = zmq.Context()
-        self.image_pub = self.pub_context.socket(zmq.PUB)
+        self.image_pub = self.transport.socket(zmq.PUB)
         self.image_pub.bind(f"tcp://*:{self.ZMQ_IMG_PORT}")
-        print(f"[PC][ZMQ] Image PUB bound on tcp://*:{self.ZMQ_IMG_PORT}")
+        zmq_log.info("Image PUB bound on tcp://*:%d (%s transport)", self.ZMQ_IMG_PORT, self.transport.options.name)
 
 
     def _init_gaze_socket(self) -> None:
         # init sub for gaze data
-        self.sub_context = zmq.Context()
-        self.gaze_req = self.sub_context.socket(zmq.REQ)
-        self.gaze_req.connect(f"tcp://{self.hololens_address}:{self.ZMQ_GAZE_PORT}")
-        print(f"[PC][ZMQ] Gaze SUB bound on tcp://*:{self.ZMQ_GAZE_PORT}")
+        if self.async_gaze:
+            receiver_options = {'socket_options': self.transport.options.socket_options(queues=False)}
+            self.sessions = SessionManager(self.transport.context, gaze_port=self.ZMQ_GAZE_PORT,
+                                           discovery_port=self.DISCOVERY_PORT,
+                                           discovery_message=self.DISCOVERY_MESSAGE,
+                                           discovery_reply=self.DISCOVERY_REPLY,
+                                           receiver_options=receiver_options,
+                                           address_cache=self.address_cache)
+            if self.hololens_address is not None:
+                # address known without discovery
+                self.sessions.add(self.hololens_address)
+            return
+        self._open_gaze_req()
+        zmq_log.info("Gaze REQ connected to tcp://%s:%d", self.hololens_address, self.ZMQ_GAZE_PORT)
 
     def _close_img(self) -> None:
-        self.sub_context.term()
-        self.gaze_req.close()
+        if self.discovery is not None:
+            self.discovery.stop()
+            self.discovery = None
+        if self.sessions is not None:
+            self.sessions.stop()
+            self.sessions = None
+        elif hasattr(self, 'gaze_req'):
+            self.gaze_req.close(linger=0)
 
     def _close_gaze(self) -> None:
-        self.pub_context.term()
-        self.image_pub.close()
+        if hasattr(self, 'image_pub'):
+            self.image_pub.close(linger=self.transport.options.linger_ms)
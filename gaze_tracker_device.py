@@ -5,7 +5,7 @@ import time
 import cv2
 import zmq
 import json
-from typing import Optional, Tuple, Any, Dict
+from typing import Optional, Tuple, Any, Dict, Union
 import sys
 
 
@@ -177,14 +177,26 @@ class GazeServer(object):
 import json
 import cv2
 from gaze_server import GazeServer
+from capture_pipeline import CapturePipeline
+from gaze_alignment import GazeAligner
+import numpy as np
+from gaze_channel import GAZE_SAMPLE_DTYPE, GAZE_STREAM_FILENAME
+from frame_writer_pool import FrameWriterPool
+from gaze_logging import get_logger
+from instrumentation import METRICS, MetricsReporter, MetricsServer
 from real_robot.real_robot_env.robot.hardware_cameras import DiscreteCamera
 from real_robot.real_robot_env.robot.hardware_depthai import DepthAI, DAICameraType
 from real_robot.real_robot_env.robot.hardware_devices import DiscreteDevice
 from pathlib import Path
-from multiprocessing import Process, Event, Pipe
 import datetime
 
+log = get_logger('GazeTrackerDevice')
+
 class GazeTrackerDevice(DiscreteDevice):
+    FRAME_HEIGHT = 512
+    FRAME_WIDTH = 512
+    # OAK-D Lite used when no camera is passed in
+    CAMERA_ID = "1844301021D9BF1200"
 
     def __init__(
         self,
@@ -192,33 +204,74 @@ class GazeTrackerDevice(DiscreteDevice):
         # camera: DiscreteCamera,
         name=None,
         start_frame_latency=0,
-        gaze_server=GazeServer()
+        gaze_server=GazeServer(),
+        pipelined=False,
+        recording_format='png',
+        writer_workers=2,
+        writer_queue_size=64,
+        frame_codec='.png',
+        png_compression=1,
+        shared_frames=True,
+        metrics_interval=0.0,
+        metrics_port=None,
+        camera=None
     ):
         super().__init__(
             device_id,
             name if name else f"GazeTrackerDevice_{device_id}",
             start_frame_latency
         )
-        self.reader, self.writer = Pipe(False)
-        self.stop_frame_storage_event = Event()
-        self.write_process = Process(target=self.__store_frames, args=[self.reader, self.stop_frame_storage_event])
-        self.formats = ['.png', '.json']
+        # 'png': one image + JSON file per sample, 'chunked': see recording.ChunkedRecordingWriter
+        assert recording_format in ('png', 'chunked'), f"Unknown recording format {recording_format}"
+        self.recording_format = recording_format
+        self.frame_writers = FrameWriterPool(
+            workers=writer_workers,
+            queue_size=writer_queue_size,
+            recording_format=recording_format,
+            codec=frame_codec,
+            png_compression=png_compression,
+            # hand frames to the writers through shared memory instead of pickling them
+            frame_shape=(self.FRAME_HEIGHT, self.FRAME_WIDTH, 3) if shared_frames else None
+        )
+        self.formats = [frame_codec, '.json']
         
         self.gaze_server = gaze_server
-        self.camera = DepthAI(
-            device_id = "1844301021D9BF1200",
-            name = "top_cam",
-            height= 512,
-            width= 512,
-            camera_type= DAICameraType.OAK_D_LITE
-        )
+        # any object with connect() / get_sensors() / close(), e.g. fake_camera.FakeCamera for tests
+        self.camera = camera
+        if self.camera is None:
+            self.camera = DepthAI(
+                device_id = self.CAMERA_ID,
+                name = "top_cam",
+                height= self.FRAME_HEIGHT,
+                width= self.FRAME_WIDTH,
+                camera_type= DAICameraType.OAK_D_LITE
+            )
+        self._grab_time = METRICS.histogram('camera_grab', 'Reading one frame from the camera')
+        # periodic stage summary on stdout / Prometheus endpoint on localhost, see instrumentation
+        self.metrics_reporter = MetricsReporter(METRICS, metrics_interval) if metrics_interval > 0 else None
+        self.metrics_server = MetricsServer(METRICS, metrics_port) if metrics_port is not None else None
         self.timestamp = 0
+        # position in the primary receiver's ring up to which the full-rate gaze stream is written
+        self._stream_ring = None
+        self._stream_total = 0
+        # capture, publish and gaze run as separate stages; get_sensors only reads the newest pair
+        self.pipeline = None
+        if pipelined:
+            # timestamp alignment needs the round-trip times of the async gaze receiver
+            aligner = GazeAligner() if self.gaze_server.async_gaze else None
+            self.pipeline = CapturePipeline(self.camera, self.gaze_server, aligner=aligner)
 
     def _setup_connect(self):
         assert self.camera.connect(), "Failed to connect to camera (maybe plug out and in again?)"
         self.gaze_server.setup_connection()
-        self.write_process.start()
-        print("[GazeTrackerDevice] Camera connected successfully.")
+        self.frame_writers.start()
+        if self.pipeline is not None:
+            self.pipeline.start()
+        if self.metrics_reporter is not None:
+            self.metrics_reporter.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        log.info("Camera connected successfully.")
 
 
     
@@ -226,19 +279,28 @@ class GazeTrackerDevice(DiscreteDevice):
         """
         Closes the connection to the device.
         """
-        self.stop_frame_storage_event.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
         self.gaze_server.close()
-        self.write_process.join()
-        self.write_process.close()
-        self.reader.close()
-        self.writer.close()
+        self.frame_writers.stop()
+        if self.metrics_reporter is not None:
+            self.metrics_reporter.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        log.info("Stage timings:\n%s", METRICS.summary())
         return self.camera.close()
     
     def store_last_frame(self, directory: Path, filename: str = None):
         data = self.get_sensors()
         rgb = data["camera_image"]["rgb"]
         gaze = data["gaze_data"]["gaze"]
-        if filename is None:
+        frame_time = float(data["camera_image"]["time"])
+        gaze_time = float(data["gaze_data"]["time"])
+        if self.recording_format == 'chunked':
+            # frames of a directory go into its chunk files, named by index
+            cam_filename = str(directory)
+            gaze_filename = None
+        elif filename is None:
             cam_timestamp = datetime.datetime.fromtimestamp(float(data['camera_image']["time"]))
             gaze_timestamp = datetime.datetime.fromtimestamp(float(data['gaze_data']["time"]))
             cam_filename = str(directory / cam_timestamp.isoformat()) + self.formats[0]
@@ -246,26 +308,31 @@ class GazeTrackerDevice(DiscreteDevice):
         else:
             cam_filename = str(directory / f"{filename}") + self.formats[0]
             gaze_filename = str(directory / f"{filename}") + self.formats[1]
-        self.writer.send((rgb, cam_filename, gaze, gaze_filename))
-
-    @staticmethod
-    def __store_frames(reader, stop_frame_storage_event):
-        try:
-            while not stop_frame_storage_event.is_set():
-
-                if not reader.poll(0.1):
-                    continue
-                (img, img_path, gaze, gaze_path) = reader.recv()
-                cv2.imwrite(
-                    img_path,
-                    img,
-                )
-                with open(gaze_path, 'w') as handle:
-                    # print(f"[GazeTrackerDevice] Storing gaze data: {gaze}")
-                    json.dump(gaze, handle)
-
-        finally:
-            reader.close()
+        # every gaze sample since the last stored frame, not just the one paired with it
+        stream, stream_total = self._gaze_stream()
+        stream_filename = str(directory / GAZE_STREAM_FILENAME)
+        if self.frame_writers.submit((rgb, cam_filename, frame_time, gaze, gaze_filename, gaze_time, stream, stream_filename)):
+            # the samples of a dropped frame go out with the next one
+            self._stream_total = stream_total
+
+    def _gaze_stream(self) -> Tuple[np.ndarray, int]:
+        """
+        Returns the gaze samples received since the last stored frame, oldest
+        first, and the ring total to continue from once the frame was stored.
+
+        Only the async receiver in binary mode records the stream: lock-step
+        gaze would need a second round-trip per frame, and JSON replies carry
+        no sample counter. Samples are taken by arrival in the receiver's
+        ring, so a HoloLens app restart (counter starting over) or a new
+        primary session (fresh ring) does not stop the stream.
+        """
+        receiver = self.gaze_server.gaze_receiver
+        if receiver is None or receiver.wire_format != 'binary':
+            return np.empty(0, dtype=GAZE_SAMPLE_DTYPE), self._stream_total
+        if receiver.ring is not self._stream_ring:
+            self._stream_ring = receiver.ring
+            self._stream_total = 0
+        return receiver.ring.since(self._stream_total)
 
     def get_sensors(self) -> dict:
         """
@@ -276,8 +343,13 @@ class GazeTrackerDevice(DiscreteDevice):
             'camera_image': {'rgb': <array>, 'time': <str>}
         }
         """
+        if self.pipeline is not None:
+            camera_data, gaze = self.pipeline.latest()
+            return self._format_sensors(camera_data, gaze)
+
         # Example structure, adapt to your device's data
-        camera_data = self.camera.get_sensors()
+        with self._grab_time.time():
+            camera_data = self.camera.get_sensors()
 
         if camera_data["rgb"] is None:
             raise RuntimeError("Camera image data is not available. Ensure the camera is connected and capturing images.")
@@ -285,9 +357,14 @@ class GazeTrackerDevice(DiscreteDevice):
 
         self.gaze_server.zmq_publish_image(camera_data['time'], camera_data['rgb'])
         gaze = self.gaze_server.zmq_get_gaze()
+        return self._format_sensors(camera_data, gaze)
+
+    @staticmethod
+    def _format_sensors(camera_data: dict, gaze: Union[Dict[str, Any], np.void]) -> dict:
+        # gaze may be a NumPy record from the async receiver, store plain floats
         gaze_data = {
-            'gaze': {'x': gaze['x'], 'y': gaze['y']},
-            'time': gaze['time']
+            'gaze': {'x': float(gaze['x']), 'y': float(gaze['y'])},
+            'time': float(gaze['time'])
         }
         return {
             'gaze_data': gaze_data,
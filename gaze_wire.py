@@ -0,0 +1,79 @@
+import struct
+from typing import Optional
+
+import numpy as np
+
+
+# Binary gaze message, little-endian:
+#   header: magic b"GZB1", uint16 record count
+#   record: float32 x, float32 y, float64 time, uint8 valid, uint32 seq  (21 bytes, no padding)
+# The PC puts GAZE_WIRE_MAGIC into the request body to announce that it
+# understands the binary format. A HoloLens build that does not know it
+# ignores the body and keeps replying with JSON, which is detected per reply.
+# A request body of GAZE_WIRE_MAGIC followed by a uint32 sequence number asks
+# for every buffered sample with a larger seq (batched transfer) instead of
+# only the newest one.
+GAZE_WIRE_MAGIC: bytes = b"GZB1"
+GAZE_WIRE_HEADER = struct.Struct('<4sH')
+GAZE_WIRE_RECORD = struct.Struct('<ffdBI')
+GAZE_BATCH_REQUEST = struct.Struct('<4sI')
+GAZE_WIRE_DTYPE = np.dtype([
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('time', '<f8'),
+    ('valid', 'u1'),
+    ('seq', '<u4'),
+])
+assert GAZE_WIRE_DTYPE.itemsize == GAZE_WIRE_RECORD.size
+
+
+def is_binary_gaze(payload: bytes) -> bool:
+    return payload[:len(GAZE_WIRE_MAGIC)] == GAZE_WIRE_MAGIC
+
+
+def encode_batch_request(since_seq: int) -> bytes:
+    return GAZE_BATCH_REQUEST.pack(GAZE_WIRE_MAGIC, since_seq)
+
+
+def decode_request(request: bytes) -> Optional[int]:
+    """
+    Returns the requested since-seq of a batch request, or None for a request for the newest sample only.
+    """
+    if len(request) == GAZE_BATCH_REQUEST.size and is_binary_gaze(request):
+        return GAZE_BATCH_REQUEST.unpack(request)[1]
+    return None
+
+
+def encode_gaze(records: np.ndarray) -> bytes:
+    """
+    Packs records (any structured array with the GAZE_WIRE_DTYPE fields) into a binary gaze message.
+    """
+    records = np.atleast_1d(records)
+    packed = np.empty(len(records), dtype=GAZE_WIRE_DTYPE)
+    for name in GAZE_WIRE_DTYPE.names:
+        packed[name] = records[name]
+    return GAZE_WIRE_HEADER.pack(GAZE_WIRE_MAGIC, len(packed)) + packed.tobytes()
+
+
+def decode_gaze(payload: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Decodes a binary gaze message.
+
+    Without `out`, a read-only view on the payload is returned (no copy).
+    With `out`, the records are copied into its first rows, which must have
+    the GAZE_WIRE_DTYPE fields, and that slice is returned.
+    """
+    magic, count = GAZE_WIRE_HEADER.unpack_from(payload)
+    if magic != GAZE_WIRE_MAGIC:
+        raise ValueError("Not a binary gaze message.")
+    expected = GAZE_WIRE_HEADER.size + count * GAZE_WIRE_DTYPE.itemsize
+    if len(payload) < expected:
+        raise ValueError(f"Truncated gaze message: {len(payload)} of {expected} bytes.")
+    records = np.frombuffer(payload, dtype=GAZE_WIRE_DTYPE, count=count, offset=GAZE_WIRE_HEADER.size)
+    if out is None:
+        return records
+    if count > len(out):
+        raise ValueError(f"Gaze message holds {count} records, output buffer only {len(out)}.")
+    for name in GAZE_WIRE_DTYPE.names:
+        out[name][:count] = records[name]
+    return out[:count]
@@ -0,0 +1,344 @@
+import io
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# imageio-ffmpeg ships an ffmpeg binary; only used if there is none on PATH
+try:
+    import imageio_ffmpeg
+except ImportError:
+    imageio_ffmpeg = None
+
+
+EXPORT_FORMATS = ('gif', 'mp4', 'webm')
+# gaze marker colour of gaze_gif, always kept exactly in the GIF palette
+MARKER_RGB: Tuple[int, int, int] = (255, 0, 0)
+# ffmpeg output arguments per container; yuv420p needs even frame sizes
+FFMPEG_CODECS: Dict[str, List[str]] = {
+    'mp4': ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+            '-movflags', '+faststart'],
+    'webm': ['-c:v', 'libvpx-vp9', '-crf', '34', '-b:v', '0', '-deadline', 'good', '-cpu-used', '4',
+             '-row-mt', '1', '-pix_fmt', 'yuv420p'],
+}
+
+
+def export_format(path: str) -> str:
+    fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {EXPORT_FORMATS}")
+    return fmt
+
+
+def find_ffmpeg() -> str:
+    path = shutil.which('ffmpeg')
+    if path is not None:
+        return path
+    if imageio_ffmpeg is not None:
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    raise RuntimeError("MP4/WebM export needs ffmpeg on PATH (or the imageio-ffmpeg package).")
+
+
+def _resize(frame: np.ndarray, scale: float) -> np.ndarray:
+    if scale == 1.0:
+        return frame
+    height, width = frame.shape[:2]
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def shared_palette(frames: Sequence[np.ndarray], colors: int = 256, sample_frames: int = 16,
+                   reserved: Sequence[Tuple[int, int, int]] = (MARKER_RGB,)) -> Image.Image:
+    """
+    Computes one palette for a whole trajectory from evenly spaced sample frames.
+
+    Args:
+        frames: RGB frames
+        colors: palette size, at most 256
+        sample_frames: number of frames the palette is computed from
+        reserved: colours put into the palette exactly, e.g. the gaze marker
+    Returns:
+        PIL.Image: 'P' mode image carrying the palette, for Image.quantize(palette=...)
+    """
+    picks = np.linspace(0, len(frames) - 1, min(sample_frames, len(frames))).round().astype(int)
+    mosaic = Image.fromarray(np.concatenate([frames[i] for i in picks], axis=0))
+    quantized = mosaic.quantize(colors=colors - len(reserved), method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()[:3 * (colors - len(reserved))]
+    for rgb in reserved:
+        palette.extend(rgb)
+    palette.extend([0] * (768 - len(palette)))
+    palette_image = Image.new('P', (1, 1))
+    palette_image.putpalette(palette)
+    return palette_image
+
+
+class _SpilledFrames(object):
+    """
+    Frames of equal shape appended to a temporary file, read back one at a
+    time (resized by factor) as a sequence, so shared_palette() can sample
+    them across the whole trajectory without holding them in memory.
+    """
+
+    def __init__(self) -> None:
+        self.shape: Optional[Tuple[int, ...]] = None
+        self.factor: float = 1.0
+        self._count: int = 0
+        self._file = tempfile.TemporaryFile()
+
+    def append(self, frame: np.ndarray) -> None:
+        if self.shape is None:
+            self.shape = frame.shape
+        elif frame.shape != self.shape:
+            raise ValueError(f"Frame of shape {frame.shape} in a GIF of {self.shape} frames")
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(np.ascontiguousarray(frame).data)
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        frame_bytes = int(np.prod(self.shape))
+        self._file.seek(int(i) * frame_bytes)
+        frame = np.frombuffer(self._file.read(frame_bytes), dtype=np.uint8).reshape(self.shape)
+        return _resize(frame, self.factor)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _GifStream(object):
+    """
+    Writes GIF frames to disk one at a time, all quantized to one palette.
+
+    Each frame is encoded by PIL as a single-frame GIF with the shared
+    palette, so all of them carry the same global colour table; the file is
+    the header of the first one followed by the frame blocks of all.
+    """
+
+    def __init__(self, path: str, fps: float, palette: Image.Image, dither) -> None:
+        self.path = path
+        self.duration = int(round(1000 / fps))
+        self.palette = palette
+        self.dither = dither
+        self.size: Optional[Tuple[int, int]] = None
+        self._handle = None
+
+    def append(self, frame: np.ndarray) -> None:
+        image = Image.fromarray(frame).quantize(palette=self.palette, dither=self.dither)
+        buffer = io.BytesIO()
+        image.save(buffer, format='GIF', duration=self.duration, optimize=False)
+        data = buffer.getvalue()
+        # 13 bytes signature and screen descriptor, then the global colour table
+        header_size = 13
+        if data[10] & 0x80:
+            header_size += 3 * 2 ** ((data[10] & 0x07) + 1)
+        if self._handle is None:
+            self._handle = open(self.path, 'wb')
+            self._handle.write(data[:header_size])
+            # NETSCAPE2.0 application extension: loop forever
+            self._handle.write(b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+            self.size = (frame.shape[1], frame.shape[0])
+        # frame blocks without the trailer
+        self._handle.write(data[header_size:-1])
+
+    def close(self) -> int:
+        """
+        Finishes the file and returns its size in bytes.
+        """
+        if self._handle is None:
+            raise ValueError(f"No frames to write to {self.path}")
+        self._handle.write(b';')
+        self._handle.close()
+        self._handle = None
+        return os.path.getsize(self.path)
+
+
+class GifExporter(object):
+    """
+    Writes a GIF whose frames all share one palette, instead of quantizing
+    every frame on its own.
+
+    Resized frames are spilled to a temporary file as they arrive, so
+    memory use does not grow with the trajectory length. On close() the
+    palette is computed from palette_frames frames spread evenly over the
+    whole trajectory, then the frames are read back, quantized and written
+    one at a time. With max_bytes, a GIF that turns out larger is encoded
+    again from the spilled frames at a smaller scale.
+    """
+
+    def __init__(self, path: str, fps: float = 10.0, scale: float = 1.0, colors: int = 256,
+                 dither: bool = False, max_bytes: Optional[int] = None, max_attempts: int = 4,
+                 palette_frames: int = 16) -> None:
+        """
+        Args:
+            path: output GIF path
+            fps: playback frame rate
+            scale: resize factor applied to every frame
+            colors: palette size, at most 256
+            dither: Floyd-Steinberg dithering, smoother gradients but larger files
+            max_bytes: upper bound on the file size, None for no bound
+            max_attempts: encodings tried to get below max_bytes
+            palette_frames: number of frames, evenly spaced, the shared palette is computed from
+        """
+        self.path = path
+        self.fps = fps
+        self.scale = scale
+        self.colors = colors
+        self.dither = Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+        self.palette_frames = palette_frames
+        self._frames = _SpilledFrames()
+
+    def append(self, frame: np.ndarray) -> None:
+        """
+        Args:
+            frame: RGB uint8 frame
+        """
+        self._frames.append(_resize(frame, self.scale))
+
+    def _encode(self, factor: float) -> Tuple[int, Tuple[int, int]]:
+        """
+        Encodes the spilled frames resized by factor, returns the file size and the frame size.
+        """
+        frames = self._frames
+        frames.factor = factor
+        if len(frames) == 0:
+            raise ValueError(f"No frames to write to {self.path}")
+        palette = shared_palette(frames, self.colors, sample_frames=self.palette_frames)
+        stream = _GifStream(self.path, self.fps, palette, self.dither)
+        for i in range(len(frames)):
+            stream.append(frames[i])
+        return stream.close(), stream.size
+
+    def close(self) -> Tuple[int, int]:
+        """
+        Encodes the GIF.
+
+        Returns:
+            tuple: (width, height) of the written frames
+        """
+        try:
+            size, frame_size = self._encode(1.0)
+            attempt = 1
+            factor = 1.0
+            while self.max_bytes is not None and size > self.max_bytes and attempt < self.max_attempts:
+                # the size grows roughly with the pixel count
+                factor *= max(0.5, math.sqrt(self.max_bytes / size) * 0.95)
+                size, frame_size = self._encode(factor)
+                attempt += 1
+            if self.max_bytes is not None and size > self.max_bytes:
+                print(f'[WARN] {self.path} is {size} bytes, above the bound of {self.max_bytes}')
+        finally:
+            self._frames.close()
+        return frame_size
+
+
+class FfmpegExporter(object):
+    """
+    Streams frames into an ffmpeg process as raw RGB and lets it encode an
+    MP4 (H.264) or WebM (VP9) video, which is much faster to write and much
+    smaller than a GIF of the same frames.
+    """
+
+    def __init__(self, path: str, fps: float = 10.0, scale: float = 1.0) -> None:
+        """
+        Args:
+            path: output path, the extension selects the container ('.mp4' or '.webm')
+            fps: playback frame rate
+            scale: resize factor applied to every frame
+        """
+        self.path = path
+        self.fps = fps
+        self.scale = scale
+        self.codec_args = FFMPEG_CODECS[export_format(path)]
+        self.ffmpeg = find_ffmpeg()
+        self.size: Optional[Tuple[int, int]] = None
+        self._process: Optional[subprocess.Popen] = None
+
+    def _start(self, width: int, height: int) -> None:
+        command = [
+            self.ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+        ] + self.codec_args + [self.path]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def append(self, frame: np.ndarray) -> None:
+        """
+        Args:
+            frame: RGB uint8 frame, all frames of one video must have the same size
+        """
+        frame = _resize(frame, self.scale)
+        if self._process is None:
+            self.size = (frame.shape[1], frame.shape[0])
+            self._start(*self.size)
+        self._process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self) -> Tuple[int, int]:
+        """
+        Waits for ffmpeg to finish the file.
+
+        Returns:
+            tuple: (width, height) of the written frames
+        """
+        if self._process is None:
+            raise ValueError(f"No frames to write to {self.path}")
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to write {self.path} (exit code {self._process.returncode})")
+        return self.size
+
+
+def open_exporter(path: str, fps: float = 10.0, scale: float = 1.0, colors: int = 256,
+                  max_bytes: Optional[int] = None):
+    """
+    Returns a GifExporter or FfmpegExporter depending on the extension of path.
+    max_bytes and colors only apply to GIFs.
+    """
+    if export_format(path) == 'gif':
+        return GifExporter(path, fps=fps, scale=scale, colors=colors, max_bytes=max_bytes)
+    return FfmpegExporter(path, fps=fps, scale=scale)
+
+
+class ExportTimer(object):
+    """
+    Wraps an exporter and measures the time spent encoding, i.e. in
+    append() and close(), separately from reading and drawing the frames.
+    """
+
+    def __init__(self, exporter) -> None:
+        self.exporter = exporter
+        self.frames: int = 0
+        self.encode_seconds: float = 0.0
+
+    def append(self, frame: np.ndarray) -> None:
+        start = time.perf_counter()
+        self.exporter.append(frame)
+        self.encode_seconds += time.perf_counter() - start
+        self.frames += 1
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Returns:
+            dict: format, frames, width, height, bytes and encode_seconds of the written file
+        """
+        start = time.perf_counter()
+        width, height = self.exporter.close()
+        self.encode_seconds += time.perf_counter() - start
+        return {
+            'format': export_format(self.exporter.path),
+            'frames': self.frames,
+            'width': width,
+            'height': height,
+            'bytes': os.path.getsize(self.exporter.path),
+            'encode_seconds': round(self.encode_seconds, 3),
+        }
@@ -0,0 +1,454 @@
+import heapq
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from gaze_channel import GazeReceiver
+from gaze_logging import get_logger
+
+
+zmq_log = get_logger('PC.ZMQ')
+udp_log = get_logger('PC.UDP')
+
+# Address of the last HoloLens that answered, tried first on the next start
+# so a reconnect does not have to wait for its discovery broadcast.
+ADDRESS_CACHE_PATH: str = os.path.join(os.path.expanduser('~'), '.hololens2gazepublisher.json')
+
+
+def load_cached_address(path: str = ADDRESS_CACHE_PATH) -> Optional[str]:
+    try:
+        with open(path, 'r') as handle:
+            return json.load(handle).get('hololens_address')
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_address(address: str, path: str = ADDRESS_CACHE_PATH) -> None:
+    try:
+        with open(path, 'w') as handle:
+            json.dump({'hololens_address': address, 'time': time.time()}, handle)
+    except OSError as e:
+        zmq_log.warning("Could not cache HoloLens address in %s: %s", path, e)
+
+
+class DiscoveryService(object):
+    """
+    Answers HoloLens discovery broadcasts on a background thread.
+
+    The UDP socket is non-blocking and served by a selector, so nothing in
+    the loop sleeps: the repeated PC_HERE replies are scheduled on a timer
+    queue instead of being sent with sleeps in between, a new HoloLens is
+    reported right after its first ping, and the `on_tick` callback runs
+    every `tick` seconds for housekeeping such as liveness checks.
+    """
+
+    def __init__(
+        self,
+        on_discovery: Callable[[str], None],
+        bind_address: Tuple[str, int] = ('', 5005),
+        discovery_message: bytes = b"DISCOVER_PC",
+        discovery_reply: bytes = b"PC_HERE",
+        reply_repeats: int = 10,
+        reply_interval: float = 0.05,
+        on_tick: Optional[Callable[[], None]] = None,
+        tick: float = 0.1,
+    ) -> None:
+        """
+        Args:
+            on_discovery: called with the HoloLens IP for every discovery ping
+            bind_address: (ip, port) the UDP socket binds to, ip '' for all interfaces
+            discovery_message: broadcast payload of a HoloLens looking for the PC
+            discovery_reply: payload of the answer
+            reply_repeats: the answer is sent this often, UDP may drop some
+            reply_interval: seconds between the repeated answers
+            on_tick: called periodically from the service thread
+            tick: seconds between on_tick calls
+        """
+        self.on_discovery = on_discovery
+        self.bind_address = bind_address
+        self.discovery_message = discovery_message
+        self.discovery_reply = discovery_reply
+        self.reply_repeats = reply_repeats
+        self.reply_interval = reply_interval
+        self.on_tick = on_tick
+        self.tick = tick
+
+        self._replies: List[Tuple[float, int, Tuple[str, int]]] = []  # heap of (due, remaining, addr)
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._sock: Optional[socket.socket] = None
+        self._wakeup: Optional[Tuple[socket.socket, socket.socket]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self.bind_address)
+        self._sock.setblocking(False)
+        # lets stop() interrupt select() immediately
+        self._wakeup = socket.socketpair()
+        self._wakeup[0].setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._sock, selectors.EVENT_READ)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="HoloLensDiscovery", daemon=True)
+        self._thread.start()
+        udp_log.info("Listening for discovery on %s in the background...", self.bind_address)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._wakeup is not None:
+            self._wakeup[1].send(b"\0")
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+        if self._selector is not None:
+            self._selector.close()
+            self._sock.close()
+            for sock in self._wakeup:
+                sock.close()
+            self._selector = self._sock = self._wakeup = None
+
+    def _run(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            due = min(next_tick, self._replies[0][0]) if self._replies else next_tick
+            for key, _ in self._selector.select(max(0.0, due - now)):
+                if key.fileobj is self._sock:
+                    self._receive()
+                else:
+                    key.fileobj.recv(64)
+
+            now = time.monotonic()
+            while self._replies and self._replies[0][0] <= now:
+                _, remaining, addr = heapq.heappop(self._replies)
+                self._reply(addr, remaining)
+            if now >= next_tick:
+                next_tick = now + self.tick
+                if self.on_tick is not None:
+                    self.on_tick()
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            if data != self.discovery_message:
+                udp_log.debug("Ignoring %r from %s:%d", data, addr[0], addr[1])
+                continue
+            udp_log.info("Received discovery ping from HoloLens @ %s.", addr)
+            # Reply back so HoloLens knows our IP; repeats are sent from the timer queue
+            self._reply(addr, self.reply_repeats)
+            self.on_discovery(addr[0])
+
+    def _reply(self, addr: Tuple[str, int], remaining: int) -> None:
+        try:
+            self._sock.sendto(self.discovery_reply, addr)
+        except OSError as e:
+            udp_log.warning("Could not reply to %s: %s", addr, e)
+            return
+        if remaining > 1:
+            heapq.heappush(self._replies, (time.monotonic() + self.reply_interval, remaining - 1, addr))
+
+
+class HoloLensSession(object):
+    """
+    One connected HoloLens: its gaze channel, liveness and connection statistics.
+
+    The gaze requests double as heartbeat: a session is 'alive' while
+    replies keep arriving, 'lost' once none arrived for the heartbeat
+    timeout, and 'probing' while an address from the cache has not answered
+    yet.
+    """
+
+    def __init__(self, address: str, context: zmq.Context, gaze_port: int, state: str = 'alive',
+                 **receiver_options: Any) -> None:
+        """
+        Args:
+            address: IP address of the HoloLens
+            context: ZMQ context the gaze channel is created in
+            gaze_port: port of the HoloLens gaze REP socket
+            state: initial state, 'alive' if discovered, 'probing' if taken from the address cache
+            receiver_options: further GazeReceiver arguments
+        """
+        self.address = address
+        self.receiver = GazeReceiver(context, f"tcp://{address}:{gaze_port}", **receiver_options)
+        self.state = state
+        self.created: float = time.time()
+        self.state_since: float = self.created
+        self.last_discovery: float = self.created
+        self.discoveries: int = 1 if state == 'alive' else 0
+        self.losses: int = 0
+
+    def start(self) -> None:
+        self.receiver.start()
+
+    def stop(self) -> None:
+        self.receiver.stop()
+
+    def latest(self) -> Optional[np.void]:
+        return self.receiver.latest()
+
+    def since_seq(self, seq: int) -> np.ndarray:
+        return self.receiver.ring.since_seq(seq)
+
+    def last_heard(self) -> float:
+        """
+        Time of the last gaze reply, or of the discovery if there was none yet.
+        """
+        return max(self.receiver.last_reply, self.last_discovery)
+
+    def set_state(self, state: str) -> None:
+        if state != self.state:
+            zmq_log.info("HoloLens %s: %s -> %s", self.address, self.state, state)
+            self.state = state
+            self.state_since = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        latest = self.receiver.latest()
+        return {
+            'address': self.address,
+            'state': self.state,
+            'connected_for': round(time.time() - self.created, 1),
+            'discoveries': self.discoveries,
+            'losses': self.losses,
+            'wire_format': self.receiver.wire_format,
+            'samples': self.receiver.ring.total_received,
+            'last_sample_age': None if latest is None else round(time.time() - float(latest['recv_time']), 3),
+            'requests_sent': self.receiver.requests_sent,
+            'replies_lost': self.receiver.replies_lost,
+            'reconnects': self.receiver.reconnects,
+        }
+
+
+class SessionManager(object):
+    """
+    Keeps discovery running in the background and holds one HoloLensSession
+    per HoloLens, so several headsets can be served at once.
+
+    Sessions are watched through their gaze replies: a HoloLens that stops
+    answering is marked lost (its gaze channel keeps rebuilding its socket
+    and recovers by itself if the HoloLens comes back under the same IP),
+    a discovery ping from a lost HoloLens replaces its session with a fresh
+    one, and sessions lost for longer than session_expiry are closed.
+
+    On start, the last HoloLens address that answered is probed right away
+    from a cache file, so a restart does not wait for the next broadcast.
+
+    The primary session is used when a caller does not ask for a specific
+    client. It is sticky: it only changes when the primary HoloLens is lost
+    or closed, then the most recently discovered alive session takes over,
+    so a recording does not switch headsets whenever another one pings.
+    """
+
+    def __init__(
+        self,
+        context: zmq.Context,
+        gaze_port: int = 5007,
+        discovery_port: int = 5005,
+        bind_ip: str = '',
+        discovery_message: bytes = b"DISCOVER_PC",
+        discovery_reply: bytes = b"PC_HERE",
+        reply_repeats: int = 10,
+        receiver_options: Optional[Dict[str, Any]] = None,
+        heartbeat_timeout: float = 2.0,
+        probe_timeout: float = 1.0,
+        session_expiry: float = 60.0,
+        address_cache: Optional[str] = ADDRESS_CACHE_PATH,
+    ) -> None:
+        """
+        Args:
+            context: ZMQ context shared by the gaze channels of all sessions
+            gaze_port: port of the HoloLens gaze REP socket
+            discovery_port: UDP port the discovery broadcast arrives on
+            bind_ip: address the discovery socket binds to, '' for all interfaces
+            discovery_message: broadcast payload of a HoloLens looking for the PC
+            discovery_reply: payload of the answer
+            reply_repeats: the answer is sent this often, UDP may drop some
+            receiver_options: GazeReceiver arguments for every session
+            heartbeat_timeout: seconds without gaze reply after which a HoloLens counts as lost
+            probe_timeout: seconds a cached address gets to answer before it is dropped
+            session_expiry: seconds after which a lost session is closed
+            address_cache: file with the last HoloLens address, None disables the cache
+        """
+        self.context = context
+        self.gaze_port = gaze_port
+        self.bind_address: Tuple[str, int] = (bind_ip, discovery_port)
+        self.discovery_message = discovery_message
+        self.discovery_reply = discovery_reply
+        self.reply_repeats = reply_repeats
+        self.receiver_options: Dict[str, Any] = receiver_options or {}
+        self.heartbeat_timeout = heartbeat_timeout
+        self.probe_timeout = probe_timeout
+        self.session_expiry = session_expiry
+        self.address_cache = address_cache
+
+        self._sessions: Dict[str, HoloLensSession] = {}
+        self._primary: Optional[str] = None
+        self._cached_address: Optional[str] = None
+        self._lock = threading.Lock()
+        self._session_added = threading.Condition(self._lock)
+        self._discovery: Optional[DiscoveryService] = None
+
+    def start_discovery(self) -> None:
+        """
+        Probes the cached HoloLens address and starts answering discovery broadcasts in the background.
+        """
+        if self.address_cache is not None:
+            cached = self._cached_address = load_cached_address(self.address_cache)
+            if cached is not None and self.get(cached) is None:
+                zmq_log.info("Trying last known HoloLens @ %s", cached)
+                self._start_session(cached, state='probing')
+        self._discovery = DiscoveryService(
+            self.add, self.bind_address, self.discovery_message, self.discovery_reply,
+            reply_repeats=self.reply_repeats, on_tick=self.check_liveness)
+        self._discovery.start()
+
+    def _start_session(self, address: str, state: str) -> HoloLensSession:
+        session = HoloLensSession(address, self.context, self.gaze_port, state=state, **self.receiver_options)
+        session.start()
+        with self._lock:
+            old = self._sessions.get(address)
+            self._sessions[address] = session
+            if state == 'alive':
+                self._claim_primary(address)
+                self._session_added.notify_all()
+        if old is not None:
+            # fresh socket and ring for a HoloLens that came back
+            old.stop()
+        return session
+
+    def add(self, address: str) -> HoloLensSession:
+        """
+        Returns the session of `address`, creating and starting it if it is
+        new or was lost. Called by discovery; can also be used directly for a
+        known address.
+        """
+        session = self.get(address)
+        if session is None or session.state == 'lost':
+            session = self._start_session(address, 'alive')
+            zmq_log.info("New HoloLens session %s, %d connected", address, len(self._sessions))
+            return session
+        with self._lock:
+            session.last_discovery = time.time()
+            session.discoveries += 1
+            session.set_state('alive')
+            self._claim_primary(address)
+            self._session_added.notify_all()
+        return session
+
+    def _claim_primary(self, address: str) -> None:
+        """
+        Makes `address` the primary session unless the current primary is still alive. Call with the lock held.
+        """
+        primary = self._sessions.get(self._primary) if self._primary is not None else None
+        if primary is None or primary.state != 'alive':
+            self._primary = address
+
+    def _elect_primary(self) -> None:
+        """
+        Replaces a primary session that is gone or not alive by the most
+        recently discovered alive one, if any. Call with the lock held.
+        """
+        primary = self._sessions.get(self._primary) if self._primary is not None else None
+        if primary is not None and primary.state == 'alive':
+            return
+        alive = [s for s in self._sessions.values() if s.state == 'alive']
+        if alive:
+            self._primary = max(alive, key=lambda s: s.last_discovery).address
+        elif primary is None:
+            self._primary = None
+
+    def check_liveness(self) -> None:
+        """
+        Updates the state of every session from its gaze replies. Runs
+        periodically on the discovery thread.
+        """
+        now = time.time()
+        expired = []
+        with self._lock:
+            for session in self._sessions.values():
+                silent = now - session.last_heard()
+                if session.state == 'probing':
+                    if session.receiver.last_reply > 0:
+                        session.set_state('alive')
+                        self._claim_primary(session.address)
+                    elif now - session.created > self.probe_timeout:
+                        expired.append(session.address)
+                elif session.state == 'alive' and silent > self.heartbeat_timeout:
+                    session.set_state('lost')
+                    session.losses += 1
+                elif session.state == 'lost':
+                    if silent <= self.heartbeat_timeout:
+                        session.set_state('alive')  # the receiver reconnected by itself
+                    elif now - session.state_since > self.session_expiry:
+                        expired.append(session.address)
+
+                if (self.address_cache is not None and session.state == 'alive'
+                        and session.receiver.last_reply > 0 and session.address != self._cached_address):
+                    self._cached_address = session.address
+                    save_cached_address(session.address, self.address_cache)
+
+            self._elect_primary()
+            self._session_added.notify_all()
+        for address in expired:
+            self.remove(address)
+
+    def remove(self, address: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(address, None)
+            if self._primary == address:
+                self._primary = None
+                self._elect_primary()
+        if session is not None:
+            session.stop()
+            zmq_log.info("Closed HoloLens session %s, %d connected", address, len(self._sessions))
+
+    def get(self, address: str) -> Optional[HoloLensSession]:
+        with self._lock:
+            return self._sessions.get(address)
+
+    @property
+    def primary(self) -> Optional[HoloLensSession]:
+        with self._lock:
+            return None if self._primary is None else self._sessions[self._primary]
+
+    def sessions(self) -> List[HoloLensSession]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def wait_for_session(self, timeout: Optional[float] = None) -> Optional[HoloLensSession]:
+        """
+        Returns the primary session, waiting up to timeout (None: forever) for
+        a discovered or answering HoloLens.
+        """
+        def ready() -> bool:
+            return self._primary is not None and self._sessions[self._primary].state == 'alive'
+
+        with self._lock:
+            if not self._session_added.wait_for(ready, timeout):
+                return None
+            return self._sessions[self._primary]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {session.address: session.stats() for session in self.sessions()}
+
+    def stop(self) -> None:
+        """
+        Stops discovery and the gaze channels of all sessions.
+        """
+        if self._discovery is not None:
+            self._discovery.stop()
+            self._discovery = None
+        for session in self.sessions():
+            self.remove(session.address)
@@ -0,0 +1,225 @@
+import json
+import time
+from typing import Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY, TJSAMP_420, TJSAMP_GRAY
+except ImportError:  # optional, cv2 is used instead
+    TurboJPEG = None
+
+from gaze_logging import get_logger
+
+
+log = get_logger('PC')
+
+
+class EncodingProfile(object):
+    """
+    How frames are encoded before they are published to the HoloLens.
+    """
+
+    FORMATS = ('jpeg', 'raw')
+    BACKENDS = ('auto', 'cv2', 'turbojpeg')
+
+    def __init__(
+        self,
+        name: str,
+        format: str = 'jpeg',
+        quality: int = 90,
+        scale: float = 1.0,
+        grayscale: bool = False,
+        backend: str = 'auto',
+    ) -> None:
+        """
+        Args:
+            name: profile name, used in logs and benchmarks
+            format: 'jpeg', or 'raw' to send the pixel buffer as-is (loopback only, the HoloLens expects JPEG)
+            quality: JPEG quality 0-100
+            scale: resize factor applied before encoding
+            grayscale: drop color before encoding
+            backend: 'cv2', 'turbojpeg', or 'auto' to use TurboJPEG when it is installed
+        """
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown encoding format '{format}', expected one of {self.FORMATS}")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown encoding backend '{backend}', expected one of {self.BACKENDS}")
+        self.name = name
+        self.format = format
+        self.quality = quality
+        self.scale = scale
+        self.grayscale = grayscale
+        self.backend = backend
+
+    def __repr__(self) -> str:
+        return (f"EncodingProfile({self.name!r}, format={self.format!r}, quality={self.quality}, "
+                f"scale={self.scale}, grayscale={self.grayscale}, backend={self.backend!r})")
+
+
+PROFILES: Dict[str, EncodingProfile] = {
+    'default': EncodingProfile('default', quality=90),
+    'fast': EncodingProfile('fast', quality=75, scale=0.5),
+    'gray': EncodingProfile('gray', quality=80, grayscale=True),
+    'low_bandwidth': EncodingProfile('low_bandwidth', quality=60, scale=0.5, grayscale=True),
+    'raw': EncodingProfile('raw', format='raw'),
+}
+
+
+def get_profile(profile: Union[str, EncodingProfile]) -> EncodingProfile:
+    if isinstance(profile, EncodingProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown encoding profile '{profile}', expected one of {list(PROFILES)}")
+    return PROFILES[profile]
+
+
+class AdaptiveQuality(object):
+    """
+    Lowers the JPEG quality while encoding + sending a frame takes longer
+    than the camera frame interval, and slowly raises it again once there
+    is headroom.
+    """
+
+    def __init__(
+        self,
+        max_quality: int,
+        min_quality: int = 40,
+        camera_hz: float = 30.0,
+        step: int = 5,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.max_quality = max_quality
+        self.min_quality = min(min_quality, max_quality)
+        self.frame_budget: float = 1.0 / camera_hz
+        self.step = step
+        self.smoothing = smoothing
+        self.quality: int = max_quality
+        self.avg_publish_time: Optional[float] = None
+
+    def update(self, publish_time: float) -> int:
+        """
+        Feeds the duration of the last encode + send and returns the quality for the next frame.
+        """
+        if self.avg_publish_time is None:
+            self.avg_publish_time = publish_time
+        else:
+            self.avg_publish_time += self.smoothing * (publish_time - self.avg_publish_time)
+
+        if self.avg_publish_time > self.frame_budget:
+            self.quality = max(self.min_quality, self.quality - self.step)
+        elif self.avg_publish_time < 0.5 * self.frame_budget:
+            self.quality = min(self.max_quality, self.quality + 1)
+        return self.quality
+
+
+class ImageEncoder(object):
+    """
+    Encodes frames according to an EncodingProfile. Encoder parameters are
+    built once per quality change instead of once per frame.
+    """
+
+    def __init__(
+        self,
+        profile: Union[str, EncodingProfile] = 'default',
+        adaptive: bool = False,
+        min_quality: int = 40,
+        camera_hz: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            profile: profile name from PROFILES or an EncodingProfile
+            adaptive: lower the quality when publishing can not keep up with camera_hz
+            min_quality: lowest quality the adaptive mode goes down to
+            camera_hz: camera frame rate the publisher has to keep up with
+        """
+        self.profile = get_profile(profile)
+        self.adaptive: Optional[AdaptiveQuality] = None
+        if adaptive and self.profile.format == 'jpeg':
+            self.adaptive = AdaptiveQuality(self.profile.quality, min_quality, camera_hz)
+
+        self._turbo = None
+        self._last_raw_header: bytes = b""
+        if self.profile.backend == 'turbojpeg' and TurboJPEG is None:
+            raise ImportError("TurboJPEG backend requested but PyTurboJPEG is not installed.")
+        if self.profile.backend in ('auto', 'turbojpeg') and TurboJPEG is not None:
+            try:
+                self._turbo = TurboJPEG()
+            except (OSError, RuntimeError) as e:
+                # PyTurboJPEG is installed but libturbojpeg can not be loaded
+                if self.profile.backend == 'turbojpeg':
+                    raise
+                log.warning("TurboJPEG unavailable (%s), encoding with cv2", e)
+        self._set_quality(self.profile.quality)
+
+    @property
+    def backend(self) -> str:
+        if self.profile.format == 'raw':
+            return 'raw'
+        return 'turbojpeg' if self._turbo is not None else 'cv2'
+
+    def _set_quality(self, quality: int) -> None:
+        self.quality = quality
+        self._cv2_params: List[int] = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+
+    def _prepare(self, image: np.ndarray) -> np.ndarray:
+        if self.profile.scale != 1.0:
+            image = cv2.resize(image, None, fx=self.profile.scale, fy=self.profile.scale,
+                               interpolation=cv2.INTER_AREA)
+        if self.profile.grayscale and image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def encode(self, image: np.ndarray) -> Optional[bytes]:
+        """
+        Returns the encoded frame as a bytes-like object, or None if encoding failed.
+        """
+        image = self._prepare(image)
+        if self.profile.format == 'raw':
+            image = np.ascontiguousarray(image)
+            self._last_raw_header = json.dumps({'shape': image.shape, 'dtype': str(image.dtype)}).encode('utf-8')
+            return image.reshape(-1).view(np.uint8).data
+
+        if self._turbo is not None:
+            if image.ndim == 2:
+                return self._turbo.encode(image, quality=self.quality, pixel_format=TJPF_GRAY,
+                                          jpeg_subsample=TJSAMP_GRAY)
+            return self._turbo.encode(image, quality=self.quality, pixel_format=TJPF_BGR,
+                                      jpeg_subsample=TJSAMP_420)
+
+        success, encoded = cv2.imencode('.jpg', image, self._cv2_params)
+        if not success:
+            return None
+        # the encoded ndarray's buffer is sent directly, without a tobytes() copy
+        return encoded.reshape(-1).data
+
+    def raw_header(self) -> bytes:
+        """
+        Shape/dtype message frame that accompanies the last 'raw' frame.
+        """
+        return self._last_raw_header
+
+    def report_publish_time(self, publish_time: float) -> None:
+        """
+        Tells the adaptive controller how long the last encode + send took.
+        """
+        if self.adaptive is None:
+            return
+        quality = self.adaptive.update(publish_time)
+        if quality != self.quality:
+            self._set_quality(quality)
+
+
+def measure_profile(profile: Union[str, EncodingProfile], image: np.ndarray, repeats: int = 50) -> Dict[str, float]:
+    """
+    Encodes the image `repeats` times and returns the mean encode time and output size.
+    """
+    encoder = ImageEncoder(profile)
+    encoder.encode(image)  # warm-up
+    start = time.perf_counter()
+    size = 0
+    for _ in range(repeats):
+        size = len(encoder.encode(image))
+    elapsed = time.perf_counter() - start
+    return {'encode_ms': elapsed / repeats * 1000.0, 'bytes': float(size)}
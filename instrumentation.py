@@ -0,0 +1,434 @@
+"""
+Latency and throughput instrumentation of the capture pipeline.
+
+Every stage (camera grab, image encode, publish, gaze round-trip, hand-off
+to the writer processes, disk write) records its durations into a
+Histogram of the process-wide registry METRICS; drops are Counters and
+queue depths Gauges sampled when read. The numbers are available as
+
+    METRICS.snapshot()      dict, e.g. for tests or a status line
+    MetricsReporter         periodic summary on stdout
+    MetricsServer           Prometheus text format on http://127.0.0.1:<port>/metrics
+
+Recording does not take a lock: every thread writes into its own shard of a
+histogram or counter, and readers sum the shards. Writer processes record
+into shards in shared memory (Histogram.add_process_shards).
+"""
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.sharedctypes import RawArray
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from gaze_logging import get_logger
+
+
+# upper bucket bounds in seconds, 10 us .. ~2 min in steps of sqrt(2); one more bucket for everything above
+BUCKET_BOUNDS: Tuple[float, ...] = tuple(1e-5 * 2 ** (k / 2) for k in range(48))
+NUM_BUCKETS: int = len(BUCKET_BOUNDS) + 1
+METRIC_PREFIX: str = "gazepub"
+
+log = get_logger('PC.METRICS')
+
+
+class HistogramSnapshot(object):
+    """
+    Merged bucket counts of a histogram at one point in time.
+    """
+
+    def __init__(self, counts: List[float], total: float, maximum: float) -> None:
+        self.counts = counts
+        self.total = total
+        # math.inf if unknown (difference of two snapshots)
+        self.maximum = maximum
+
+    @property
+    def count(self) -> int:
+        return int(sum(self.counts))
+
+    @property
+    def mean(self) -> float:
+        count = self.count
+        return self.total / count if count > 0 else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the q-quantile in seconds, interpolating linearly inside the bucket.
+        """
+        count = self.count
+        if count == 0:
+            return 0.0
+        rank = q * count
+        cumulative = 0.0
+        for i, n in enumerate(self.counts):
+            if n == 0 or cumulative + n < rank:
+                cumulative += n
+                continue
+            lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+            upper = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else lower * 2
+            if not math.isinf(self.maximum):
+                upper = min(upper, self.maximum)
+            return lower + (upper - lower) * max(0.0, rank - cumulative) / n
+        return self.maximum
+
+    def __sub__(self, earlier: 'HistogramSnapshot') -> 'HistogramSnapshot':
+        counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+        return HistogramSnapshot(counts, self.total - earlier.total, math.inf)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean_ms': self.mean * 1000.0,
+            'p50_ms': self.quantile(0.5) * 1000.0,
+            'p90_ms': self.quantile(0.9) * 1000.0,
+            'p99_ms': self.quantile(0.99) * 1000.0,
+            'max_ms': (self.maximum if not math.isinf(self.maximum) else self.quantile(1.0)) * 1000.0,
+        }
+
+
+class _ThreadShard(object):
+    __slots__ = ('counts', 'total', 'maximum')
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * NUM_BUCKETS
+        self.total: float = 0.0
+        self.maximum: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def read(self) -> Tuple[List[float], float, float]:
+        return list(self.counts), self.total, self.maximum
+
+
+class ProcessShard(object):
+    """
+    Histogram shard in shared memory, written by exactly one process.
+    Layout of the array: NUM_BUCKETS counts, sum, maximum.
+    """
+
+    def __init__(self, array) -> None:
+        self.array = array
+
+    def record(self, seconds: float) -> None:
+        array = self.array
+        array[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        array[NUM_BUCKETS] += seconds
+        if seconds > array[NUM_BUCKETS + 1]:
+            array[NUM_BUCKETS + 1] = seconds
+
+    def read(self) -> Tuple[List[float], float, float]:
+        values = self.array[:]
+        return values[:NUM_BUCKETS], values[NUM_BUCKETS], values[NUM_BUCKETS + 1]
+
+
+class Histogram(object):
+    """
+    Distribution of the durations of one stage, in seconds.
+    """
+
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self._local = threading.local()
+        self._shards: List[Any] = []
+        self._lock = threading.Lock()
+
+    def _thread_shard(self) -> _ThreadShard:
+        shard = _ThreadShard()
+        self._local.shard = shard
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def record(self, seconds: float) -> None:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._thread_shard()
+        shard.record(seconds)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def add_process_shards(self, processes: int) -> list:
+        """
+        Adds one shared-memory shard per process and returns their arrays; a
+        process records with ProcessShard(array).record(seconds).
+        """
+        arrays = [RawArray('d', NUM_BUCKETS + 2) for _ in range(processes)]
+        with self._lock:
+            self._shards.extend(ProcessShard(array) for array in arrays)
+        return arrays
+
+    def read(self) -> HistogramSnapshot:
+        with self._lock:
+            shards = list(self._shards)
+        counts = [0.0] * NUM_BUCKETS
+        total = 0.0
+        maximum = 0.0
+        for shard in shards:
+            shard_counts, shard_total, shard_maximum = shard.read()
+            for i, n in enumerate(shard_counts):
+                counts[i] += n
+            total += shard_total
+            maximum = max(maximum, shard_maximum)
+        return HistogramSnapshot(counts, total, maximum)
+
+
+class Counter(object):
+    """
+    Monotonic event count, e.g. dropped frames.
+    """
+
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self._local = threading.local()
+        self._cells: List[List[int]] = []
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._local.cell = [0]
+            with self._lock:
+                self._cells.append(cell)
+        cell[0] += amount
+
+    @property
+    def value(self) -> int:
+        with self._lock:
+            cells = list(self._cells)
+        return sum(cell[0] for cell in cells)
+
+
+class Metrics(object):
+    """
+    Registry of the histograms, counters and gauges of one process.
+
+    Call sites look their metrics up once (histogram(), counter()) and keep
+    the objects, so the hot path is a single record() or inc().
+    """
+
+    def __init__(self, prefix: str = METRIC_PREFIX) -> None:
+        self.prefix = prefix
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Counter] = {}
+        self._gauges: Dict[str, Tuple[Callable[[], float], str]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, help)
+            return self.histograms[name]
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        with self._lock:
+            if name not in self.counters:
+                self.counters[name] = Counter(name, help)
+            return self.counters[name]
+
+    def gauge(self, name: str, read: Callable[[], float], help: str = "") -> None:
+        """
+        Registers a value sampled whenever the metrics are read, e.g. a queue
+        depth; replaces an earlier gauge of the same name.
+        """
+        with self._lock:
+            self._gauges[name] = (read, help)
+
+    def remove_gauge(self, name: str) -> None:
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.histogram(name).record(seconds)
+
+    def timer(self, name: str):
+        """
+        Context manager recording the duration of the block into histogram `name`.
+        """
+        return self.histogram(name).time()
+
+    def read_gauges(self) -> Dict[str, float]:
+        with self._lock:
+            gauges = dict(self._gauges)
+        values = {}
+        for name, (read, _) in gauges.items():
+            try:
+                values[name] = float(read())
+            except Exception:
+                # the object behind the gauge is gone or closed
+                values[name] = math.nan
+        return values
+
+    def read_histograms(self) -> Dict[str, HistogramSnapshot]:
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {name: histogram.read() for name, histogram in histograms.items()}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns {'stages': {name: count, mean/p50/p90/p99/max in ms}, 'counters': {...}, 'gauges': {...}}.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'stages': {name: snap.to_dict() for name, snap in self.read_histograms().items()},
+            'counters': {name: counter.value for name, counter in counters.items()},
+            'gauges': self.read_gauges(),
+        }
+
+    def summary(self, since: Optional[Dict[str, HistogramSnapshot]] = None) -> str:
+        """
+        One line per stage, counter and gauge. With `since` (an earlier
+        read_histograms()), the stage statistics cover only the time in between.
+        """
+        lines = []
+        for name, snap in sorted(self.read_histograms().items()):
+            if since is not None and name in since:
+                snap = snap - since[name]
+            if snap.count == 0:
+                continue
+            stats = snap.to_dict()
+            lines.append(f"{name:<16} n={stats['count']:<6} mean={stats['mean_ms']:7.2f} ms "
+                         f"p50={stats['p50_ms']:7.2f} p99={stats['p99_ms']:7.2f} max={stats['max_ms']:7.2f} ms")
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{name:<16} {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{name:<16} {value:g}")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+            gauge_help = {name: help for name, (_, help) in self._gauges.items()}
+        lines = []
+        for name, histogram in sorted(histograms.items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            snap = histogram.read()
+            lines.append(f"# HELP {metric} {histogram.help or name}")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0.0
+            for bound, n in zip(BUCKET_BOUNDS, snap.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {int(cumulative)}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {snap.count}')
+            lines.append(f"{metric}_sum {snap.total:.9g}")
+            lines.append(f"{metric}_count {snap.count}")
+        for name, counter in sorted(counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# HELP {metric} {counter.help or name}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {counter.value}")
+        for name, value in sorted(self.read_gauges().items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {metric} {gauge_help.get(name) or name}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# process-wide registry used by GazeServer, the capture pipeline and the frame writers
+METRICS = Metrics()
+
+
+class MetricsReporter(object):
+    """
+    Prints the stage statistics of the last interval every `interval` seconds.
+    """
+
+    def __init__(self, metrics: Metrics = METRICS, interval: float = 10.0) -> None:
+        self.metrics = metrics
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsReporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        previous = self.metrics.read_histograms()
+        while not self._stop_event.wait(self.interval):
+            current = self.metrics.read_histograms()
+            log.info("last %g s:\n%s", self.interval, self.metrics.summary(since=previous))
+            previous = current
+
+
+class MetricsServer(object):
+    """
+    Serves the metrics over HTTP: /metrics in the Prometheus text format,
+    /metrics.json as snapshot(). Binds to localhost only by default.
+    """
+
+    def __init__(self, metrics: Metrics = METRICS, port: int = 9464, host: str = "127.0.0.1") -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == '/metrics':
+                    body = metrics.prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(metrics.snapshot()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        # port 0 picks a free port
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        log.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
@@ -0,0 +1,77 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import open3d as o3d
+
+
+class LivePointCloud(object):
+    """
+    Turns live DepthAI point clouds and colour frames into an Open3D
+    PointCloud without per-frame full-size allocations.
+
+    All intermediate arrays are allocated once for the first frame size and
+    reused: invalid (zero depth) points and the decimated-away pixels are
+    dropped with np.compress into a scratch buffer, converted into the
+    float64 buffers Open3D needs, and the BGR -> RGB swap and scaling to
+    0..1 are done while converting, instead of with cv2.cvtColor.
+    """
+
+    def __init__(self, decimation: int = 1, scale: float = 1.0) -> None:
+        """
+        Args:
+            decimation: keep every n-th pixel in both image directions
+            scale: factor applied to the points, e.g. 0.001 for metres
+        """
+        self.decimation = decimation
+        self.scale = scale
+        self.pcd = o3d.geometry.PointCloud()
+        self.shape: Optional[Tuple[int, int]] = None
+        self.count: int = 0
+
+    def _allocate(self, height: int, width: int) -> None:
+        n = height * width
+        self.shape = (height, width)
+        self._keep = np.empty(n, dtype=bool)
+        self._decimated = np.zeros((height, width), dtype=bool)
+        self._decimated[::self.decimation, ::self.decimation] = True
+        self._decimated = self._decimated.reshape(-1)
+        self._points32 = np.empty((n, 3), dtype=np.float32)
+        self._colors8 = np.empty((n, 3), dtype=np.uint8)
+        self.points = np.empty((n, 3), dtype=np.float64)
+        self.colors = np.empty((n, 3), dtype=np.float64)
+        print(f"[INFO] live point cloud buffers for {width}x{height}, decimation {self.decimation}")
+
+    def convert(self, points: np.ndarray, bgr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Filters and converts one frame into the reused buffers.
+
+        Args:
+            points: (H * W, 3) float32 points from PointCloudData.getPoints(), aligned to the colour frame
+            bgr: (H, W, 3) uint8 colour frame
+        Returns:
+            tuple: float64 (points, colors) views, valid until the next call
+        """
+        height, width = bgr.shape[:2]
+        if self.shape != (height, width):
+            self._allocate(height, width)
+        if len(points) != height * width:
+            raise ValueError(f"{len(points)} points for a {width}x{height} colour frame, depth must be aligned to it")
+
+        np.not_equal(points[:, 2], 0, out=self._keep)
+        np.logical_and(self._keep, self._decimated, out=self._keep)
+        n = int(np.count_nonzero(self._keep))
+        np.compress(self._keep, points, axis=0, out=self._points32[:n])
+        np.compress(self._keep, bgr.reshape(-1, 3), axis=0, out=self._colors8[:n])
+
+        np.multiply(self._points32[:n], self.scale, out=self.points[:n])
+        np.multiply(self._colors8[:n, ::-1], 1.0 / 255.0, out=self.colors[:n])
+        self.count = n
+        return self.points[:n], self.colors[:n]
+
+    def upload(self) -> o3d.geometry.PointCloud:
+        """
+        Copies the last converted frame into the PointCloud geometry.
+        """
+        self.pcd.points = o3d.utility.Vector3dVector(self.points[:self.count])
+        self.pcd.colors = o3d.utility.Vector3dVector(self.colors[:self.count])
+        return self.pcd
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Binary point-cloud storage.
+
+Point clouds are (N, 3) arrays in millimetres, the unit DepthAI delivers
+them in. They are stored as
+
+    <name>.npy   float32 or int16 (whole millimetres, +-32 m), memory-mappable
+    <name>.npz   the same, zip-compressed; smaller but always read completely
+
+instead of <name>.txt files written with np.savetxt, which take seconds per
+frame to parse. Run this module to convert existing .txt recordings.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+
+POINT_DTYPES = ('float32', 'int16')
+# preferred first
+POINT_EXTENSIONS = ('.npy', '.npz', '.txt')
+NPZ_KEY = 'points'
+INT16_RANGE = np.iinfo(np.int16)
+
+
+def quantize_points(points: np.ndarray) -> np.ndarray:
+    """
+    Rounds millimetre points to int16; values beyond +-32 m are clipped.
+    """
+    return np.clip(np.rint(points), INT16_RANGE.min, INT16_RANGE.max).astype(np.int16)
+
+
+def save_points(path: str, points: np.ndarray, dtype: str = 'float32', compress: bool = False) -> str:
+    """
+    Writes a point cloud.
+
+    Args:
+        path: output path; the extension is replaced by .npy or .npz
+        points: (N, 3) points in millimetres
+        dtype: 'float32' or 'int16' (quantized to whole millimetres)
+        compress: write a compressed .npz instead of a memory-mappable .npy
+    Returns:
+        str: path of the written file
+    """
+    if dtype not in POINT_DTYPES:
+        raise ValueError(f"Unsupported point dtype '{dtype}', expected one of {POINT_DTYPES}")
+    points = np.asarray(points).reshape(-1, 3)
+    stored = quantize_points(points) if dtype == 'int16' else points.astype(np.float32, copy=False)
+    root = os.path.splitext(path)[0]
+    if compress:
+        path = root + '.npz'
+        np.savez_compressed(path, **{NPZ_KEY: stored})
+    else:
+        path = root + '.npy'
+        np.save(path, stored)
+    return path
+
+
+def read_points_txt(path: str) -> np.ndarray:
+    """
+    Reads a legacy np.savetxt point file. Splits the whole text at once and
+    converts it in one call, which is much faster than np.loadtxt; falls
+    back to it for unusual layouts.
+    """
+    with open(path, 'r') as handle:
+        try:
+            values = np.array(handle.read().split(), dtype=np.float64)
+        except ValueError:
+            values = None
+    if values is None or values.size % 3 != 0:
+        values = np.loadtxt(path, dtype=np.float64)
+    return values.reshape(-1, 3)
+
+
+def load_points(path: str, mmap: bool = False, as_float: bool = True) -> np.ndarray:
+    """
+    Reads a point cloud written by save_points() or a legacy .txt file.
+
+    Args:
+        path: .npy, .npz or .txt file
+        mmap: map a .npy file instead of reading it; pages are loaded on access
+        as_float: convert int16 points to float32, otherwise the stored dtype is returned
+    Returns:
+        np.ndarray: (N, 3) points in millimetres
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == '.npy':
+        points = np.load(path, mmap_mode='r' if mmap else None)
+    elif ext == '.npz':
+        with np.load(path) as archive:
+            points = archive[NPZ_KEY]
+    elif ext == '.txt':
+        points = read_points_txt(path)
+    else:
+        raise ValueError(f"Unsupported point cloud file '{path}', expected one of {POINT_EXTENSIONS}")
+    if as_float and points.dtype == np.int16:
+        points = points.astype(np.float32)
+    return points
+
+
+def find_points(directory: str, name: str) -> Optional[str]:
+    """
+    Returns the point file of frame `name` in its preferred format, or None.
+    """
+    for ext in POINT_EXTENSIONS:
+        path = os.path.join(directory, name + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def convert_txt_file(path: str, dtype: str = 'float32', compress: bool = False, remove_txt: bool = False) -> int:
+    """
+    Converts one .txt point file. Returns the number of bytes saved.
+    """
+    target = save_points(path, read_points_txt(path), dtype=dtype, compress=compress)
+    saved = os.path.getsize(path) - os.path.getsize(target)
+    if remove_txt:
+        os.remove(path)
+    return saved
+
+
+def convert_txt_recording(directory: str, dtype: str = 'float32', compress: bool = False, remove_txt: bool = False,
+                          recursive: bool = False, jobs: int = 1) -> int:
+    """
+    Converts every .txt point file of a recording directory.
+
+    Args:
+        directory: recording or trajectory directory
+        dtype: 'float32' or 'int16'
+        compress: write .npz instead of .npy
+        remove_txt: delete the .txt files after converting them
+        recursive: also convert the subdirectories
+        jobs: number of files converted in parallel processes
+    Returns:
+        int: number of converted files
+    """
+    paths: List[str] = []
+    for root, dirs, files in os.walk(directory):
+        paths.extend(os.path.join(root, f) for f in files if f.endswith('.txt'))
+        if not recursive:
+            break
+    if len(paths) == 0:
+        print(f'[WARN] no .txt point clouds found in {directory}')
+        return 0
+
+    print(f'[INFO] converting {len(paths)} point clouds in {directory} to {dtype}{" (compressed)" if compress else ""}')
+    start = time.perf_counter()
+    if jobs <= 1:
+        saved = sum(convert_txt_file(path, dtype, compress, remove_txt) for path in paths)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            saved = sum(executor.map(convert_txt_file, paths, [dtype] * len(paths), [compress] * len(paths),
+                                     [remove_txt] * len(paths), chunksize=8))
+    print(f'[INFO] converted {len(paths)} files in {time.perf_counter() - start:.1f}s, saved {saved / 2 ** 20:.1f} MiB')
+    return len(paths)
+
+
+def main():
+    """Convert .txt point-cloud recordings to binary files."""
+    parser = argparse.ArgumentParser(
+        description='Convert np.savetxt point clouds to binary .npy/.npz files',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('directory', type=str, help='Recording directory containing .txt point clouds')
+    parser.add_argument('--dtype', choices=POINT_DTYPES, default='float32',
+                        help='Stored point type, int16 keeps whole millimetres')
+    parser.add_argument('--compress', action='store_true', help='Write compressed .npz files (not memory-mappable)')
+    parser.add_argument('--remove-txt', action='store_true', help='Delete the .txt files after converting them')
+    parser.add_argument('--recursive', '-r', action='store_true', help='Also convert all subdirectories')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Number of files converted in parallel')
+    args = parser.parse_args()
+
+    convert_txt_recording(args.directory, dtype=args.dtype, compress=args.compress, remove_txt=args.remove_txt,
+                          recursive=args.recursive, jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Point-cloud player: steps through all frames of a recording in 3D.
+
+Every frame is a colour image <name>.png and a point cloud <name>.npy
+(memory-mapped), <name>.npz or <name>.txt, see pointcloud_io. One Open3D
+PointCloud is reused for all frames, and large clouds are downsampled on
+the fly so stepping stays interactive.
+
+Keys: D next, A previous, E / W ten frames forward / back, space play/pause,
+V toggle voxel/stride downsampling, C center view, Q quit.
+"""
+import argparse
+import os
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+import open3d as o3d
+
+from pointcloud_io import POINT_EXTENSIONS, load_points
+from trajectory_index import IMAGE_EXTENSIONS, name_time
+
+
+def scan_pointcloud_recording(directory: str) -> List[Tuple[str, str]]:
+    """
+    Returns the (image path, point path) of every frame in recording order.
+    """
+    images = {}
+    points = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name, ext = os.path.splitext(entry.name)
+            if ext in IMAGE_EXTENSIONS:
+                images[name] = entry.path
+            elif ext in POINT_EXTENSIONS:
+                # keep the preferred format if a frame was converted but the .txt kept
+                current = points.get(name)
+                if current is None or POINT_EXTENSIONS.index(ext) < POINT_EXTENSIONS.index(os.path.splitext(current)[1]):
+                    points[name] = entry.path
+    names = [name for name in images if name in points]
+    names.sort(key=lambda name: (name_time(name) is None, name_time(name) or 0.0, name))
+    return [(images[name], points[name]) for name in names]
+
+
+def voxel_downsample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """
+    Returns the indices of one point per occupied voxel.
+    """
+    if len(points) == 0:
+        return np.empty(0, np.int64)
+    cells = np.floor(points / voxel_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, first = np.unique(keys, return_index=True)
+    return first
+
+
+class PointCloudPlayer(object):
+    """
+    Shows the frames of a point-cloud recording in one Open3D window.
+    """
+
+    def __init__(self, directory: str, max_points: int = 250000, voxel_size: float = 0.0,
+                 coordinate_frame: float = 1.0) -> None:
+        """
+        Args:
+            directory: recording directory
+            max_points: clouds with more valid points are downsampled by a stride
+            voxel_size: voxel edge in point units (mm); if > 0, voxel downsampling is used instead of a stride
+            coordinate_frame: size of the drawn coordinate frame, 0 for none
+        """
+        self.directory = directory
+        self.frames = scan_pointcloud_recording(directory)
+        if len(self.frames) == 0:
+            raise ValueError(f"No frames with image and point cloud found in {directory}")
+        self.max_points = max_points
+        self.voxel_size = voxel_size
+        self.use_voxels = voxel_size > 0
+        self.coordinate_frame = coordinate_frame
+        self.index = 0
+        self.playing = False
+        self._last_step = 0.0
+        self.pcd = o3d.geometry.PointCloud()
+        # float64 staging buffers handed to Open3D, grown on demand and reused
+        self._points = np.empty((0, 3), dtype=np.float64)
+        self._colors = np.empty((0, 3), dtype=np.float64)
+        self.vis: Optional[o3d.visualization.VisualizerWithKeyCallback] = None
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def _buffers(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self._points) < n:
+            self._points = np.empty((n, 3), dtype=np.float64)
+            self._colors = np.empty((n, 3), dtype=np.float64)
+        return self._points[:n], self._colors[:n]
+
+    def load_frame(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the downsampled (points, colors) of frame i as float64 views on the staging buffers.
+        """
+        image_path, point_path = self.frames[i]
+        points = load_points(point_path, mmap=True, as_float=False)
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        colors = image.reshape(-1, 3)
+        n = min(len(points), len(colors))
+        if len(points) != len(colors):
+            print(f"[WARN] frame {i}: {len(colors)} colors for {len(points)} points, truncating")
+
+        # drop invalid (zero depth) points, then downsample
+        keep = np.flatnonzero(points[:n, 2] != 0)
+        if self.use_voxels:
+            keep = keep[voxel_downsample(np.asarray(points[keep], dtype=np.float32), self.voxel_size)]
+        elif len(keep) > self.max_points:
+            keep = keep[::int(np.ceil(len(keep) / self.max_points))]
+
+        out_points, out_colors = self._buffers(len(keep))
+        out_points[:] = points[keep]
+        # BGR -> RGB, 0..1
+        np.multiply(colors[keep][:, ::-1], 1.0 / 255.0, out=out_colors)
+        return out_points, out_colors
+
+    def show(self, i: int) -> bool:
+        self.index = int(np.clip(i, 0, len(self) - 1))
+        start = time.perf_counter()
+        points, colors = self.load_frame(self.index)
+        self.pcd.points = o3d.utility.Vector3dVector(points)
+        self.pcd.colors = o3d.utility.Vector3dVector(colors)
+        if self.vis is not None:
+            self.vis.update_geometry(self.pcd)
+        mode = f"voxel {self.voxel_size}" if self.use_voxels else f"max {self.max_points}"
+        print(f"[INFO] frame {self.index + 1} / {len(self)}: {len(points)} points ({mode}), "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        return True
+
+    def _step(self, delta: int):
+        return lambda vis: self.show(self.index + delta)
+
+    def _toggle_play(self, vis) -> bool:
+        self.playing = not self.playing
+        return False
+
+    def _toggle_voxels(self, vis) -> bool:
+        if self.voxel_size <= 0:
+            print("[WARN] no voxel size set, start with --voxel-size")
+            return False
+        self.use_voxels = not self.use_voxels
+        return self.show(self.index)
+
+    def _animate(self, vis) -> bool:
+        if not self.playing or time.perf_counter() - self._last_step < 1.0 / 30:
+            return False
+        self._last_step = time.perf_counter()
+        if self.index >= len(self) - 1:
+            self.playing = False
+            return False
+        return self.show(self.index + 1)
+
+    def run(self) -> None:
+        self.vis = o3d.visualization.VisualizerWithKeyCallback()
+        self.vis.create_window(window_name=f"Point Cloud Player - {self.directory}")
+        if self.coordinate_frame > 0:
+            self.vis.add_geometry(o3d.geometry.TriangleMesh.create_coordinate_frame(size=self.coordinate_frame))
+        self.show(0)
+        self.vis.add_geometry(self.pcd)
+
+        self.vis.register_key_callback(ord('D'), self._step(1))
+        self.vis.register_key_callback(ord('A'), self._step(-1))
+        self.vis.register_key_callback(ord('E'), self._step(10))
+        self.vis.register_key_callback(ord('W'), self._step(-10))
+        self.vis.register_key_callback(ord(' '), self._toggle_play)
+        self.vis.register_key_callback(ord('V'), self._toggle_voxels)
+        self.vis.register_key_callback(ord('C'), lambda vis: vis.reset_view_point(True))
+        self.vis.register_key_callback(ord('Q'), lambda vis: vis.close())
+        self.vis.register_animation_callback(self._animate)
+
+        self.vis.run()
+        self.vis.destroy_window()
+        self.vis = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Step through the point clouds of a recording',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('directory', type=str, help='Recording directory with <name>.png and <name>.npy/.npz/.txt')
+    parser.add_argument('--max-points', type=int, default=250000,
+                        help='Clouds with more valid points are downsampled by a stride')
+    parser.add_argument('--voxel-size', type=float, default=0.0,
+                        help='Voxel edge in point units (mm) for voxel downsampling, 0 uses the stride')
+    parser.add_argument('--coordinate-frame', type=float, default=1.0, help='Size of the coordinate frame, 0 hides it')
+    args = parser.parse_args()
+
+    player = PointCloudPlayer(args.directory, max_points=args.max_points, voxel_size=args.voxel_size,
+                              coordinate_frame=args.coordinate_frame)
+    print(f"[INFO] found {len(player)} point-cloud frames in {args.directory}")
+    player.run()
+
+
+if __name__ == "__main__":
+    main()
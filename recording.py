@@ -0,0 +1,299 @@
+import glob
+import json
+import os
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from trajectory_index import IMAGE_EXTENSIONS, load_trajectory_index
+
+
+# Chunked recording layout, one directory per trajectory:
+#   frames_00000.gzc, frames_00001.gzc, ...  append-only frame chunks; with several
+#                                            writers frames_w<id>_00000.gzc, ...
+#   gaze.npy                                 per-frame gaze columns of the whole trajectory,
+#                                            written by finalize_recording()
+#   gaze_stream.bin                          full-rate gaze stream (see gaze_channel)
+#
+# A chunk is a sequence of records, each a RECORD_HEADER followed by the
+# encoded frame, and is closed with an index footer: FRAME_INDEX_DTYPE rows
+# followed by CHUNK_FOOTER. Readers use the footer for O(1) access; a chunk
+# without footer (recording interrupted) is recovered by scanning the records.
+CHUNK_PATTERN: str = "frames{}_{:05d}.gzc"
+CHUNK_GLOB: str = "frames_*.gzc"
+GAZE_COLUMNS_FILENAME: str = "gaze.npy"
+CHUNK_MAGIC: bytes = b"GZCI"
+RECORD_HEADER = struct.Struct('<Idddd')  # length, frame time, gaze x, gaze y, gaze time
+CHUNK_FOOTER = struct.Struct('<4sIQ')  # magic, frame count, index offset
+FRAME_INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('time', '<f8'),
+    ('gaze_x', '<f8'),
+    ('gaze_y', '<f8'),
+    ('gaze_time', '<f8'),
+])
+
+
+class ChunkedRecordingWriter(object):
+    """
+    Appends frames and their gaze to a chunked recording directory instead
+    of writing one PNG and one JSON file per sample. Several writers can
+    record into the same directory if each has its own writer_id; call
+    finalize_recording() once all of them are closed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        frames_per_chunk: int = 256,
+        codec: str = '.png',
+        encode_params: Optional[List[int]] = None,
+        writer_id: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            directory: trajectory directory, created if missing
+            frames_per_chunk: frames per chunk file before a new one is started
+            codec: cv2.imencode extension used for frames, should be lossless ('.png', '.bmp', '.tiff')
+            encode_params: cv2.imencode parameters, e.g. [cv2.IMWRITE_PNG_COMPRESSION, 1]
+            writer_id: distinguishes the chunk files of concurrent writers
+        """
+        self.directory = directory
+        self.frames_per_chunk = frames_per_chunk
+        self.codec = codec
+        self.encode_params: List[int] = encode_params or []
+        self._prefix: str = "" if writer_id is None else f"_w{writer_id}"
+        os.makedirs(directory, exist_ok=True)
+
+        # continue after chunks of an earlier session in the same directory
+        self._chunk_number: int = len(glob.glob(os.path.join(directory, f"frames{self._prefix}_[0-9]*.gzc")))
+        self._chunk = None
+        self._index: List[tuple] = []
+
+    def append(self, image: np.ndarray, frame_time: float, gaze: Dict[str, Any], gaze_time: float) -> None:
+        success, encoded = cv2.imencode(self.codec, image, self.encode_params)
+        if not success:
+            raise RuntimeError(f"Frame could not be encoded as {self.codec}.")
+        payload = encoded.reshape(-1).data
+        if self._chunk is None:
+            self._open_chunk()
+        offset = self._chunk.tell()
+        self._chunk.write(RECORD_HEADER.pack(len(payload), frame_time, gaze['x'], gaze['y'], gaze_time))
+        self._chunk.write(payload)
+        self._index.append((offset, len(payload), frame_time, gaze['x'], gaze['y'], gaze_time))
+        if len(self._index) >= self.frames_per_chunk:
+            self._close_chunk()
+
+    def close(self) -> None:
+        self._close_chunk()
+
+    def _open_chunk(self) -> None:
+        path = os.path.join(self.directory, CHUNK_PATTERN.format(self._prefix, self._chunk_number))
+        self._chunk = open(path, 'wb')
+        self._chunk_number += 1
+        self._index = []
+
+    def _close_chunk(self) -> None:
+        if self._chunk is None:
+            return
+        index_offset = self._chunk.tell()
+        self._chunk.write(np.array(self._index, dtype=FRAME_INDEX_DTYPE).tobytes())
+        self._chunk.write(CHUNK_FOOTER.pack(CHUNK_MAGIC, len(self._index), index_offset))
+        self._chunk.close()
+        self._chunk = None
+
+
+def read_chunk_index(path: str) -> np.ndarray:
+    """
+    Returns the FRAME_INDEX_DTYPE index of a chunk file.
+    """
+    with open(path, 'rb') as handle:
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell()
+        if size >= CHUNK_FOOTER.size:
+            handle.seek(size - CHUNK_FOOTER.size)
+            magic, count, index_offset = CHUNK_FOOTER.unpack(handle.read(CHUNK_FOOTER.size))
+            if magic == CHUNK_MAGIC:
+                handle.seek(index_offset)
+                return np.frombuffer(handle.read(count * FRAME_INDEX_DTYPE.itemsize), dtype=FRAME_INDEX_DTYPE)
+
+        print(f'[WARN] chunk {path} has no index footer, recovering by scanning')
+        rows = []
+        offset = 0
+        handle.seek(0)
+        while offset + RECORD_HEADER.size <= size:
+            length, frame_time, x, y, gaze_time = RECORD_HEADER.unpack(handle.read(RECORD_HEADER.size))
+            if offset + RECORD_HEADER.size + length > size:
+                break  # frame was cut off
+            rows.append((offset, length, frame_time, x, y, gaze_time))
+            offset += RECORD_HEADER.size + length
+            handle.seek(offset)
+        return np.array(rows, dtype=FRAME_INDEX_DTYPE)
+
+
+def _gaze_columns(index: np.ndarray) -> np.ndarray:
+    gaze = np.empty(len(index), dtype=[('time', '<f8'), ('x', '<f8'), ('y', '<f8'), ('gaze_time', '<f8')])
+    gaze['time'] = index['time']
+    gaze['x'] = index['gaze_x']
+    gaze['y'] = index['gaze_y']
+    gaze['gaze_time'] = index['gaze_time']
+    return gaze
+
+
+class Trajectory(object):
+    """
+    Common read interface for recorded trajectories, independent of the
+    storage format. Frames are indexed 0..len-1 in recording order.
+    read_image and read_gaze may be called from several threads.
+    """
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def read_image(self, i: int) -> np.ndarray:
+        """
+        Returns frame i as BGR image.
+        """
+        raise NotImplementedError
+
+    def read_gaze(self, i: int) -> Dict[str, float]:
+        """
+        Returns the normalized gaze {'x', 'y'} of frame i.
+        """
+        raise NotImplementedError
+
+    def gaze_of(self, indices: Sequence[int]) -> np.ndarray:
+        """
+        Returns the normalized gaze of the given frames as (K, 2) array of x, y.
+        """
+        gaze = np.empty((len(indices), 2), dtype=np.float64)
+        for k, i in enumerate(indices):
+            sample = self.read_gaze(i)
+            gaze[k] = sample['x'], sample['y']
+        return gaze
+
+    def gaze_array(self, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Returns the normalized gaze as (N, 2) array of x, y, indexed by frame.
+
+        Args:
+            indices: frames to read, default all; the rows of the other frames
+                are NaN, which GazeOverlay draws as no gaze. Reading only the
+                frames that are shown avoids parsing every JSON file of a
+                PNG/JSON trajectory up front.
+        """
+        gaze = np.full((len(self), 2), np.nan, dtype=np.float64)
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.int64)
+        if len(indices) > 0:
+            gaze[indices] = self.gaze_of(indices)
+        return gaze
+
+    def close(self) -> None:
+        pass
+
+
+class PngJsonTrajectory(Trajectory):
+    """
+    Legacy layout: one image (any of IMAGE_EXTENSIONS) and one JSON gaze
+    file per frame, named by frame number or by ISO timestamp. The pairing
+    is cached in the directory, see trajectory_index.
+    """
+
+    def __init__(self, directory: str, use_cache: bool = True) -> None:
+        self.directory = directory
+        self.pairs: List[Tuple[str, str]] = load_trajectory_index(directory, use_cache=use_cache)
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def image_file(self, i: int) -> str:
+        return os.path.join(self.directory, self.pairs[i][0])
+
+    def gaze_file(self, i: int) -> str:
+        return os.path.join(self.directory, self.pairs[i][1])
+
+    def read_image(self, i: int) -> np.ndarray:
+        return cv2.imread(self.image_file(i))
+
+    def read_gaze(self, i: int) -> Dict[str, float]:
+        with open(self.gaze_file(i), 'r') as handle:
+            return json.load(handle)
+
+
+class ChunkedTrajectory(Trajectory):
+    """
+    Chunked layout written by ChunkedRecordingWriter. Frames of all writers
+    are merged and ordered by frame time.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.chunk_files: List[str] = sorted(glob.glob(os.path.join(directory, CHUNK_GLOB)))
+        indexes = [read_chunk_index(path) for path in self.chunk_files]
+        index = np.concatenate(indexes) if indexes else np.empty(0, dtype=FRAME_INDEX_DTYPE)
+        chunk_of_frame = np.repeat(np.arange(len(indexes)), [len(i) for i in indexes])
+        order = np.argsort(index['time'], kind='stable')
+        self.index: np.ndarray = index[order]
+        self.chunk_of_frame: np.ndarray = chunk_of_frame[order]
+        self._handles: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def gaze(self) -> np.ndarray:
+        """
+        Per-frame gaze columns ('time', 'x', 'y', 'gaze_time') of the whole trajectory.
+        """
+        return _gaze_columns(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def read_image(self, i: int) -> np.ndarray:
+        chunk = int(self.chunk_of_frame[i])
+        row = self.index[i]
+        # seek + read must not interleave between threads, decoding can
+        with self._lock:
+            handle = self._handles.get(chunk)
+            if handle is None:
+                handle = self._handles[chunk] = open(self.chunk_files[chunk], 'rb')
+            handle.seek(int(row['offset']) + RECORD_HEADER.size)
+            data = handle.read(int(row['length']))
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def read_gaze(self, i: int) -> Dict[str, float]:
+        row = self.index[i]
+        return {'x': float(row['gaze_x']), 'y': float(row['gaze_y'])}
+
+    def gaze_of(self, indices: Sequence[int]) -> np.ndarray:
+        rows = self.index[np.asarray(indices, dtype=np.int64)]
+        return np.stack([rows['gaze_x'], rows['gaze_y']], axis=1).astype(np.float64)
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+
+
+def finalize_recording(directory: str) -> None:
+    """
+    Writes the per-trajectory gaze columns (gaze.npy) from the chunk indexes.
+    """
+    trajectory = ChunkedTrajectory(directory)
+    np.save(os.path.join(directory, GAZE_COLUMNS_FILENAME), trajectory.gaze)
+
+
+def is_chunked_recording(directory: str) -> bool:
+    return len(glob.glob(os.path.join(directory, CHUNK_GLOB))) > 0
+
+
+def open_trajectory(directory: str) -> Trajectory:
+    """
+    Opens a trajectory directory in whichever format it was recorded.
+    """
+    if is_chunked_recording(directory):
+        return ChunkedTrajectory(directory)
+    return PngJsonTrajectory(directory)
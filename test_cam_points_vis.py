@@ -19,36 +19,15 @@ except ImportError:
 
     sys.exit("Critical dependency missing: Open3D. Please install it using the command: '{} -m pip install open3d' and then rerun the script.".format(sys.executable))
 
+from fps_counter import FPSCounter
 
-FPS = 30
-
-class FPSCounter:
-
-    def __init__(self):
-
-        self.frameCount = 0
-
-        self.fps = 0
-
-        self.startTime = time.time()
-
-
-    def tick(self):
-
-        self.frameCount += 1
-
-        if self.frameCount % 10 == 0:
-
-            elapsedTime = time.time() - self.startTime
-
-            self.fps = self.frameCount / elapsedTime
-
-            self.frameCount = 0
+from live_pointcloud import LivePointCloud
 
-            self.startTime = time.time()
 
-        return self.fps
+FPS = 30
 
+# keep every n-th pixel in both directions, 1 shows the full cloud
+DECIMATION = 1
 
 pipeline = dai.Pipeline()
 
@@ -143,7 +122,9 @@ vis.create_window()
 
 vis.register_key_action_callback(81, key_callback)
 
-pcd = o3d.geometry.PointCloud()
+livePcd = LivePointCloud(decimation=DECIMATION)
+
+pcd = livePcd.pcd
 
 coordinateFrame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=1000, origin=[0,0,0])
 
@@ -156,7 +137,9 @@ fpsCounter = FPSCounter()
 
 while isRunning:
 
-    inMessage = q.get()
+    with fpsCounter.stage("dequeue"):
+
+        inMessage = q.get()
 
     inColor = inMessage["rgb"]
 
@@ -164,49 +147,50 @@ while isRunning:
 
     cvColorFrame = inColor.getCvFrame()
 
-    # Convert the frame to RGB
+    fps = fpsCounter.tick()
 
-    cvRGBFrame = cv2.cvtColor(cvColorFrame, cv2.COLOR_BGR2RGB)
+    if inPointCloud:
 
-    fps = fpsCounter.tick()
+        with fpsCounter.stage("convert"):
 
-    # Display the FPS on the frame
+            # BGR -> RGB is done while converting, no cvtColor copy
 
-    cv2.putText(cvColorFrame, f"FPS: {fps:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            livePcd.convert(inPointCloud.getPoints(), cvColorFrame)
 
-    cv2.imshow("color", cvColorFrame)
+        with fpsCounter.stage("upload"):
 
-    key = cv2.waitKey(1)
+            livePcd.upload()
 
-    if key == ord('q'):
+            if first:
 
-        break
+                vis.add_geometry(pcd)
 
-    if inPointCloud:
+                first = False
 
-        t_before = time.time()
+            else:
 
-        points = inPointCloud.getPoints().astype(np.float64)
-        
+                vis.update_geometry(pcd)
 
-        pcd.points = o3d.utility.Vector3dVector(points)
+    with fpsCounter.stage("render"):
 
-        colors = (cvRGBFrame.reshape(-1, 3) / 255.0).astype(np.float64)
+        # Display the FPS on the frame
 
-        pcd.colors = o3d.utility.Vector3dVector(colors)
+        cv2.putText(cvColorFrame, f"FPS: {fps:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
 
-        if first:
+        cv2.imshow("color", cvColorFrame)
 
-            vis.add_geometry(pcd)
+        key = cv2.waitKey(1)
 
-            first = False
+        vis.poll_events()
 
-        else:
+        vis.update_renderer()
 
-            vis.update_geometry(pcd)
+    if key == ord('q'):
+
+        break
 
-    vis.poll_events()
+    if fpsCounter.totalFrames % FPS == 0:
 
-    vis.update_renderer()
+        print(f"[INFO] {fpsCounter.summary()} | {livePcd.count} points")
 
-vis.destroy_window()
\ No newline at end of file
+vis.destroy_window()
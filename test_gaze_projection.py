@@ -0,0 +1,98 @@
+"""
+Synthetic checks for gaze_projection, no camera or HoloLens needed.
+Run with pytest or directly: python test_gaze_projection.py
+"""
+import numpy as np
+
+from gaze_overlay import gaze_to_pixels
+from gaze_projection import GazeProjector
+
+WIDTH, HEIGHT = 64, 48
+
+
+def synthetic_cloud(frame: int = 0) -> np.ndarray:
+    """
+    Organized (H, W, 3) cloud of a plane whose depth encodes the pixel:
+    z = 1000 + 10 * frame + v * W + u, so every lookup can be checked exactly.
+    """
+    v, u = np.mgrid[0:HEIGHT, 0:WIDTH].astype(np.float32)
+    z = 1000.0 + 10.0 * frame + v * WIDTH + u
+    return np.stack([u - WIDTH / 2, v - HEIGHT / 2, z], axis=-1)
+
+
+def gaze_of_pixel(u: int, v: int) -> np.ndarray:
+    """
+    Normalized gaze (relative to the 180 degree rotated image, y upwards) that hits cloud pixel (u, v).
+    """
+    return np.array([(WIDTH - 1 - u + 0.5) / WIDTH, 1.0 - (HEIGHT - 1 - v + 0.5) / HEIGHT])
+
+
+def test_direct_hit():
+    projector = GazeProjector(WIDTH, HEIGHT)
+    cloud = synthetic_cloud()
+    for u, v in [(0, 0), (10, 5), (WIDTH - 1, HEIGHT - 1), (WIDTH // 2, HEIGHT // 2)]:
+        points, found = projector.project(cloud, gaze_of_pixel(u, v))
+        assert found[0]
+        np.testing.assert_array_equal(points[0], cloud[v, u])
+
+
+def test_hole_uses_nearest_neighbour():
+    projector = GazeProjector(WIDTH, HEIGHT, radius=2)
+    cloud = synthetic_cloud()
+    cloud[20, 30] = 0.0
+    cloud[20, 31] = 0.0
+    points, found = projector.project(cloud, gaze_of_pixel(30, 20))
+    assert found[0]
+    # one of the valid 4-neighbours at distance 1
+    assert points[0, 2] in {cloud[19, 30, 2], cloud[21, 30, 2], cloud[20, 29, 2]}
+
+
+def test_hole_without_neighbours_is_nan():
+    projector = GazeProjector(WIDTH, HEIGHT, radius=1)
+    cloud = synthetic_cloud()
+    cloud[10:15, 10:15] = 0.0
+    points, found = projector.project(cloud, gaze_of_pixel(12, 12))
+    assert not found[0]
+    assert np.isnan(points[0]).all()
+
+
+def test_invalid_gaze_is_nan():
+    projector = GazeProjector(WIDTH, HEIGHT)
+    points, found = projector.project(synthetic_cloud(), np.array([[np.nan, 0.5]]))
+    assert not found[0]
+    assert np.isnan(points[0]).all()
+
+
+def test_batch_matches_streaming():
+    rng = np.random.default_rng(0)
+    frames = 20
+    clouds = np.stack([synthetic_cloud(f) for f in range(frames)])
+    clouds[rng.random(clouds.shape[:3]) < 0.2] = 0.0
+    gaze = rng.random((frames * 3, 2))
+    frame_index = np.repeat(np.arange(frames), 3)
+
+    projector = GazeProjector(WIDTH, HEIGHT)
+    batch_points, batch_found = projector.project_batch(clouds.reshape(frames, -1, 3), gaze, frame_index)
+    for f in range(frames):
+        points, found = projector.project(clouds[f].reshape(-1, 3), gaze[frame_index == f])
+        np.testing.assert_array_equal(found, batch_found[frame_index == f])
+        np.testing.assert_array_equal(points, batch_points[frame_index == f])
+    assert batch_found.mean() > 0.9
+
+
+def test_overlay_and_projector_agree():
+    rng = np.random.default_rng(1)
+    gaze = rng.random((200, 2))
+    projector = GazeProjector(WIDTH, HEIGHT)
+    pixels, _ = projector.pixels(gaze)
+    overlay_pixels, _ = gaze_to_pixels(gaze, WIDTH, HEIGHT, rotate_180=False)
+    np.testing.assert_array_equal(pixels, overlay_pixels)
+    rotated, _ = gaze_to_pixels(gaze, WIDTH, HEIGHT, rotate_180=True)
+    np.testing.assert_array_equal(pixels, np.array([WIDTH - 1, HEIGHT - 1]) - rotated)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"[TEST] {name} passed")
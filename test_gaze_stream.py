@@ -0,0 +1,84 @@
+"""
+Checks that the recorded gaze stream has no holes when the frame writers
+drop frames. No camera, HoloLens or writer processes needed.
+Run with pytest or directly: python test_gaze_stream.py
+"""
+import queue
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from frame_writer_pool import FrameWriterPool
+from gaze_channel import GazeRing
+from gaze_tracker_device import GazeTrackerDevice
+from gaze_wire import GAZE_WIRE_DTYPE
+
+
+class StubReceiver(object):
+    wire_format = 'binary'
+
+    def __init__(self) -> None:
+        self.ring = GazeRing(256)
+
+
+class StubServer(object):
+    def __init__(self) -> None:
+        self.gaze_receiver = StubReceiver()
+
+
+def make_device(frame_writers: FrameWriterPool) -> GazeTrackerDevice:
+    device = GazeTrackerDevice.__new__(GazeTrackerDevice)
+    device.recording_format = 'png'
+    device.formats = ['.png', '.json']
+    device.frame_writers = frame_writers
+    device.gaze_server = StubServer()
+    device._stream_ring = None
+    device._stream_total = 0
+    device.get_sensors = lambda: {
+        'camera_image': {'rgb': np.zeros((4, 4, 3), dtype=np.uint8), 'time': '1.0'},
+        'gaze_data': {'gaze': {'x': 0.5, 'y': 0.5}, 'time': 1.0},
+    }
+    return device
+
+
+def add_samples(ring: GazeRing, first_seq: int, count: int) -> None:
+    records = np.zeros(count, dtype=GAZE_WIRE_DTYPE)
+    records['seq'] = np.arange(first_seq, first_seq + count)
+    ring.extend(records, 0.0, 0.0)
+
+
+def test_dropped_frame_keeps_its_gaze():
+    # the writers are not started, so the queue is full after one frame
+    writers = FrameWriterPool(workers=1, queue_size=1, put_timeout=0.01)
+    device = make_device(writers)
+    ring = device.gaze_server.gaze_receiver.ring
+    # nothing is written, the writers never run
+    directory = Path(tempfile.gettempdir())
+
+    add_samples(ring, 1, 5)
+    device.store_last_frame(directory, 'frame0')
+    add_samples(ring, 6, 5)
+    device.store_last_frame(directory, 'frame1')
+    assert writers.dropped == 1
+
+    first = writers.queue.get(timeout=1.0)
+    add_samples(ring, 11, 5)
+    device.store_last_frame(directory, 'frame2')
+    second = writers.queue.get(timeout=1.0)
+
+    np.testing.assert_array_equal(first[6]['seq'], np.arange(1, 6))
+    # the samples of the dropped frame are stored with the next one
+    np.testing.assert_array_equal(second[6]['seq'], np.arange(6, 16))
+    try:
+        writers.queue.get_nowait()
+        assert False, "only two frames should have been queued"
+    except queue.Empty:
+        pass
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"[TEST] {name} passed")
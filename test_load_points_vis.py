@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """
-Point cloud viewer: loads a PNG for color and a text file for the point cloud,
-then visualizes in 3D using Open3D.
+Point cloud viewer: loads a PNG for color and a point cloud file (.npy, .npz
+or legacy .txt, see pointcloud_io), then visualizes in 3D using Open3D.
 """
 import sys
 import argparse
 import numpy as np
 import cv2
 import open3d as o3d
+from pointcloud_io import load_points
 
 def load_color_image(path, ispng=False):
     if not ispng and not path.endswith('.png'):
@@ -34,7 +35,7 @@ def load_color_image(path, ispng=False):
 
 def load_point_cloud(path):
     try:
-        pts = np.loadtxt(path, dtype=np.float64)
+        pts = load_points(path).astype(np.float64)
     except Exception as e:
         sys.exit(f"Error: Could not load point cloud from '{path}': {e}")
     if pts.ndim != 2 or pts.shape[1] != 3:
@@ -0,0 +1,135 @@
+import datetime
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Per-trajectory cache of the frame index of a PNG/JSON recording. It is only
+# trusted while the directory mtime matches the one stored in it, i.e. as
+# long as no file was added, removed or renamed since it was written.
+INDEX_FILENAME: str = ".trajectory_index.json"
+INDEX_VERSION: int = 1
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.tiff')
+GAZE_EXTENSION: str = '.json'
+
+
+def name_time(name: str) -> Optional[float]:
+    """
+    Returns the sort key of a frame file name: integer names ('0', '1', ...)
+    as their value, ISO timestamps as seconds since the epoch, None otherwise.
+    """
+    try:
+        return float(int(name))
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(name).timestamp()
+    except ValueError:
+        return None
+
+
+def _sorted_by_time(names: List[str]) -> Tuple[List[str], np.ndarray]:
+    keyed = [(name_time(name), name) for name in names]
+    # names that are neither an integer nor a timestamp go last, in lexical order
+    keyed.sort(key=lambda item: (item[0] is None, item[0] or 0.0, item[1]))
+    return [name for _, name in keyed], np.array([t if t is not None else np.nan for t, _ in keyed])
+
+
+def _pair_by_time(images: List[str], gazes: List[str]) -> List[Tuple[str, str]]:
+    """
+    Pairs images and gaze files whose names differ. GazeTrackerDevice names
+    the image after the camera time and the gaze file after the HoloLens
+    time, so both lists are in the same order but the names never match.
+    """
+    images, image_times = _sorted_by_time(images)
+    gazes, gaze_times = _sorted_by_time(gazes)
+    if len(images) == len(gazes):
+        return list(zip(images, gazes))
+    if len(images) == 0 or len(gazes) == 0 or np.isnan(image_times).any() or np.isnan(gaze_times).any():
+        return []
+
+    # some files are missing: remove the clock offset between both devices,
+    # then take the nearest gaze file for every image
+    n = min(len(images), len(gazes))
+    offset = float(np.median(gaze_times[:n] - image_times[:n]))
+    shifted = gaze_times - offset
+    right = np.clip(np.searchsorted(shifted, image_times), 0, len(gazes) - 1)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(image_times - shifted[left]) <= np.abs(shifted[right] - image_times), left, right)
+    return [(image, gazes[j]) for image, j in zip(images, nearest)]
+
+
+def scan_trajectory(directory: str) -> List[Tuple[str, str]]:
+    """
+    Lists the (image file, gaze file) pairs of a PNG/JSON trajectory in
+    recording order, with a single pass over the directory.
+
+    Files with the same name are paired directly; the rest is paired by
+    the time encoded in their names.
+    """
+    images: Dict[str, str] = {}
+    gazes = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name, ext = os.path.splitext(entry.name)
+            if ext in IMAGE_EXTENSIONS:
+                images[name] = ext
+            elif ext == GAZE_EXTENSION:
+                gazes.add(name)
+
+    paired = [name for name in images if name in gazes]
+    names, _ = _sorted_by_time(paired)
+    pairs = [(name + images[name], name + GAZE_EXTENSION) for name in names]
+
+    paired_set = set(paired)
+    unpaired_images = [name for name in images if name not in paired_set]
+    unpaired_gazes = [name for name in gazes if name not in paired_set]
+    if unpaired_images and unpaired_gazes:
+        if pairs:
+            print(f'[WARN] {directory}: {len(unpaired_images)} images without gaze file of the same name')
+        else:
+            pairs = [(name + images[name], gaze + GAZE_EXTENSION)
+                     for name, gaze in _pair_by_time(unpaired_images, unpaired_gazes)]
+    return pairs
+
+
+def load_trajectory_index(directory: str, use_cache: bool = True) -> List[Tuple[str, str]]:
+    """
+    Returns the (image file, gaze file) pairs of a trajectory, from the
+    index file if it is still valid, otherwise by scanning the directory
+    and rewriting the index file.
+
+    Args:
+        directory: trajectory directory
+        use_cache: read and write the index file; read-only directories are scanned every time
+    """
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    if use_cache:
+        try:
+            with open(index_path, 'r') as handle:
+                cached = json.load(handle)
+            if (cached.get('version') == INDEX_VERSION
+                    and cached.get('mtime_ns') == os.stat(directory).st_mtime_ns):
+                return [tuple(pair) for pair in cached['frames']]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        try:
+            # creating the index file changes the directory mtime, so it has to
+            # exist before the mtime is taken; rewriting it later does not
+            if not os.path.exists(index_path):
+                open(index_path, 'a').close()
+        except OSError:
+            use_cache = False
+
+    mtime_ns = os.stat(directory).st_mtime_ns
+    pairs = scan_trajectory(directory)
+    if use_cache:
+        try:
+            with open(index_path, 'w') as handle:
+                json.dump({'version': INDEX_VERSION, 'mtime_ns': mtime_ns, 'frames': pairs}, handle)
+        except OSError as e:
+            print(f'[WARN] could not write trajectory index {index_path}: {e}')
+    return pairs
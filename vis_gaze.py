@@ -1,54 +1,44 @@
-import json
 import cv2
-import os
+from recording import open_trajectory
+from frame_reader import PrefetchingFrameReader
+from gaze_overlay import GazeOverlay
 
 fold_dir:str = 'F:/bachelor_thesis/data/3d/pear_banana_in_sink/2025_07_03-13_15_54/sensors/continuous_device_'
-files = sorted(os.listdir(fold_dir))
+trajectory = open_trajectory(fold_dir)
 
-# get union of image and gaze files that have the same name, ignore the extension
-paired_files = []
-for f in files:
-    if f.endswith('.png'):
-        gaze_file = f.replace('.png', '.json')
-        if gaze_file in files:
-            paired_files.append(f.replace('.png', ''))
-    
-# sort paired files by their float value in the name
-paired_files = sorted(paired_files, key=lambda x: int(x))
-
-image_files = [os.path.join(fold_dir, f"{f}.png") for f in paired_files]
-gaze_files = [os.path.join(fold_dir, f"{f}.json") for f in paired_files]
-
-print(f'[INFO] found {len(image_files)} image files and {len(gaze_files)} gaze files'
-      f' in {fold_dir}')
+print(f'[INFO] found {len(trajectory)} frames with gaze in {fold_dir}')
+# decodes the neighbouring frames in the background, so stepping is instant
+reader = PrefetchingFrameReader(trajectory)
+TRAIL = 10
+# gaze is read for the frames around the shown one only, so the viewer starts right away
+gaze_loaded = set()
+overlay = None
 
 curr_idx = 0
 break_flag = False
 cv2.namedWindow('window', cv2.WINDOW_NORMAL)
 # resize window to 16:9 aspect ratio
 cv2.resizeWindow('window', 1280, 720)
-while (curr_idx < len(paired_files) and break_flag is not True):
-    image_file_path = image_files[curr_idx]
-    image = cv2.imread(image_file_path)
-    # rotate image 180 degrees
-    image = cv2.rotate(image, cv2.ROTATE_180)
-
-    gaze_file_path = gaze_files[curr_idx]
-    gaze_pos_rel = json.load(open(gaze_file_path, 'r'))
-    gaze_pos_abs = (gaze_pos_rel['x'] * image.shape[1],
-                    (1 - gaze_pos_rel['y']) * image.shape[0])
-
-    # draw gaze point
-    cv2.circle(image, (int(gaze_pos_abs[0]), int(gaze_pos_abs[1])), 5, (0, 255, 0), -1)
+while (curr_idx < len(trajectory) and break_flag is not True):
+    image, _ = reader.get(curr_idx)
+    if overlay is None:
+        # rotates the image 180 degrees and draws the gaze point with a short trail
+        overlay = GazeOverlay(trajectory.gaze_array([]), image.shape[1], image.shape[0], color=(0, 255, 0),
+                              trail=TRAIL)
+    missing = [i for i in range(max(0, curr_idx - TRAIL), curr_idx + 1) if i not in gaze_loaded]
+    if missing:
+        overlay.update_gaze(missing, trajectory.gaze_of(missing))
+        gaze_loaded.update(missing)
+    image = overlay.render(image, curr_idx)
     cv2.imshow('window', image)
     while True:
         key = cv2.waitKey(0)
 
         # d: next
         if key == 100:
-            if curr_idx < len(image_files) - 1:
+            if curr_idx < len(trajectory) - 1:
                 curr_idx += 1
-                print(f'[INFO] next {curr_idx} / {len(image_files)}')
+                print(f'[INFO] next {curr_idx} / {len(trajectory)}')
             else:
                 print(f'[WARN] already at the last image')
             break
@@ -56,7 +46,7 @@ while (curr_idx < len(paired_files) and break_flag is not True):
         elif key == 97:
             if curr_idx > 0:
                 curr_idx -= 1
-                print(f'[INFO] previous {curr_idx} / {len(image_files)}')
+                print(f'[INFO] previous {curr_idx} / {len(trajectory)}')
                 break
             else:
                 print(f'[WARN] already at the first image')
@@ -69,4 +59,7 @@ while (curr_idx < len(paired_files) and break_flag is not True):
             break
         # other: just log it.
         else:
-            print(f'[WARN] input {key} unknown')
\ No newline at end of file
+            print(f'[WARN] input {key} unknown')
+
+reader.close()
+trajectory.close()
@@ -0,0 +1,148 @@
+import threading
+from typing import Dict, List, Optional, Union
+
+import zmq
+
+
+class TransportOptions(object):
+    """
+    Socket and context settings of the ZMQ transport between PC and HoloLens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        io_threads: int = 1,
+        sndhwm: int = 1000,
+        rcvhwm: int = 1000,
+        sndbuf: int = -1,
+        rcvbuf: int = -1,
+        linger_ms: int = 0,
+        tcp_keepalive: bool = True,
+        keepalive_idle: int = 5,
+        keepalive_interval: int = 1,
+        keepalive_count: int = 3,
+    ) -> None:
+        """
+        Args:
+            name: profile name, used in logs and benchmarks
+            io_threads: ZMQ IO threads of the shared context
+            sndhwm: messages queued per peer before a PUB socket drops new ones
+            rcvhwm: messages queued on the receiving side
+            sndbuf: kernel send buffer in bytes, -1 for the OS default
+            rcvbuf: kernel receive buffer in bytes, -1 for the OS default
+            linger_ms: how long close() may wait to flush pending messages, 0 drops them
+            tcp_keepalive: let the OS detect dead peers (e.g. HoloLens off Wi-Fi)
+            keepalive_idle: seconds of silence before the first keepalive probe
+            keepalive_interval: seconds between keepalive probes
+            keepalive_count: unanswered probes before the connection is dropped
+        """
+        self.name = name
+        self.io_threads = io_threads
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.linger_ms = linger_ms
+        self.tcp_keepalive = tcp_keepalive
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+
+    def __repr__(self) -> str:
+        return (f"TransportOptions({self.name!r}, io_threads={self.io_threads}, sndhwm={self.sndhwm}, "
+                f"rcvhwm={self.rcvhwm}, sndbuf={self.sndbuf}, rcvbuf={self.rcvbuf}, linger_ms={self.linger_ms}, "
+                f"tcp_keepalive={self.tcp_keepalive})")
+
+    def socket_options(self, queues: bool = True) -> Dict[int, int]:
+        """
+        Returns the options as {zmq option: value}, to be set before connect/bind.
+
+        Args:
+            queues: include HWM and buffer sizes; request sockets that keep
+                several requests in flight (GazeReceiver) must not get a HWM of one
+        """
+        options = {
+            zmq.LINGER: self.linger_ms,
+            zmq.TCP_KEEPALIVE: 1 if self.tcp_keepalive else 0,
+        }
+        if queues:
+            options.update({
+                zmq.SNDHWM: self.sndhwm,
+                zmq.RCVHWM: self.rcvhwm,
+                zmq.SNDBUF: self.sndbuf,
+                zmq.RCVBUF: self.rcvbuf,
+            })
+        if self.tcp_keepalive:
+            options[zmq.TCP_KEEPALIVE_IDLE] = self.keepalive_idle
+            options[zmq.TCP_KEEPALIVE_INTVL] = self.keepalive_interval
+            options[zmq.TCP_KEEPALIVE_CNT] = self.keepalive_count
+        return options
+
+
+# ZMQ_CONFLATE would be the obvious way to keep only the newest frame, but it
+# does not support multipart messages, and the image message is multipart
+# (timestamp, image[, raw header]) on the HoloLens side. "Latest frame only"
+# is therefore a send HWM of one frame plus a small kernel buffer: a slow
+# subscriber gets the frame that is current when it catches up instead of
+# working through a queue of stale ones.
+TRANSPORT_PROFILES: Dict[str, TransportOptions] = {
+    'default': TransportOptions('default', tcp_keepalive=False),
+    'latest': TransportOptions('latest', sndhwm=1, rcvhwm=1, sndbuf=256 * 1024),
+    'buffered': TransportOptions('buffered', sndhwm=4, rcvhwm=4, sndbuf=1024 * 1024),
+}
+
+
+def get_transport_options(options: Union[str, TransportOptions]) -> TransportOptions:
+    if isinstance(options, TransportOptions):
+        return options
+    if options not in TRANSPORT_PROFILES:
+        raise ValueError(f"Unknown transport profile '{options}', expected one of {list(TRANSPORT_PROFILES)}")
+    return TRANSPORT_PROFILES[options]
+
+
+class ZmqTransport(object):
+    """
+    One ZMQ context shared by all sockets of a GazeServer, with the socket
+    options of a TransportOptions profile applied to every socket it creates.
+
+    The context is created on first use and can be closed and reopened.
+    close() closes every socket with the profile's linger (0 by default), so
+    terminating the context never blocks on messages a HoloLens will not
+    pick up anymore.
+    """
+
+    def __init__(self, options: Union[str, TransportOptions] = 'latest') -> None:
+        self.options = get_transport_options(options)
+        self._context: Optional[zmq.Context] = None
+        self._sockets: List[zmq.Socket] = []
+        self._lock = threading.Lock()
+
+    @property
+    def context(self) -> zmq.Context:
+        with self._lock:
+            if self._context is None:
+                self._context = zmq.Context(io_threads=self.options.io_threads)
+            return self._context
+
+    def socket(self, socket_type: int, queues: bool = True) -> zmq.Socket:
+        """
+        Creates a socket with the transport options set; connect or bind it afterwards.
+        """
+        sock = self.context.socket(socket_type)
+        for option, value in self.options.socket_options(queues).items():
+            sock.setsockopt(option, value)
+        with self._lock:
+            self._sockets = [s for s in self._sockets if not s.closed]
+            self._sockets.append(sock)
+        return sock
+
+    def close(self) -> None:
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+            context, self._context = self._context, None
+        for sock in sockets:
+            if not sock.closed:
+                sock.close(linger=self.options.linger_ms)
+        if context is not None:
+            context.term()